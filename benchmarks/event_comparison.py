@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+"""
+    Micro-benchmark of the per-call cost of `Event` construction, comparison and attribute access.
+
+    Usage:
+        python benchmarks/event_comparison.py [-n NUMBER]
+"""
+
+from __future__ import print_function
+
+import argparse
+import timeit
+
+SETUP = """
+from pysvtools.models import Event
+a = Event("chr1", 1000, "chr1", 5000, sv_type="DEL", cp_flank=100)
+b = Event("chr1", 1040, "chr1", 5050, sv_type="DEL", cp_flank=100)
+c = Event("chr1", 9000, "chr1", 9500, sv_type="DEL", cp_flank=100)
+d = Event("chr1", 1040, "chr2", 5050, sv_type="TRA", cp_flank=100)
+"""
+
+STATEMENTS = [
+    ("construct", "Event('chr1', 1000, 'chr1', 5000, sv_type='DEL', cp_flank=100)"),
+    ("eq_match", "a == b"),
+    ("eq_miss_flank", "a == c"),
+    ("eq_miss_chromosome", "a == d"),
+    ("size", "a.size"),
+    ("centerpoint", "a.centerpoint"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=200000,
+                        help='Number of evaluations per repeat [200000]')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='Number of repeats, the fastest is reported [5]')
+    args = parser.parse_args()
+
+    for name, statement in STATEMENTS:
+        best = min(timeit.repeat(statement, setup=SETUP, number=args.number, repeat=args.repeat))
+        print("{:<20}{:>10.1f} ns".format(name, best / args.number * 1e9))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+"""
+    Benchmark of the phases of `startMerge` on synthetic cohorts, over a sweep of cohort sizes.
+
+    For each combination of sample count and calls per sample a cohort is generated with `synthetic.py`
+    and the phases are timed separately:
+
+        load       parsing the VCF files into an `EventTable`, without exclusion regions
+        exclusion  building the exclusion index and looking up every loaded call in it
+        match      clustering the events of all samples
+        write      writing the TSV, BED, VCF and regions reports
+        total      `startMerge` from start to end, with the exclusion regions
+
+    The fastest of the repeats is reported per phase. Results are written as JSON, a previous result file
+    can be given to compare against.
+
+    Usage:
+        python benchmarks/merge_phases.py [-s 2 10 50] [-n 1000 10000] [-o results.json] [--compare old.json]
+"""
+
+from __future__ import print_function
+
+import argparse
+import datetime
+import itertools
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+from synthetic import generateCohort, parseMix, DEFAULT_MIX
+
+import pysvtools
+from pysvtools import merge
+from pysvtools.models import EventTable, ExclusionIndex
+
+PHASES = ('load', 'exclusion', 'match', 'write', 'total')
+
+
+def gitCommit():
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=devnull,
+                                           cwd=os.path.dirname(os.path.abspath(__file__))).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def timePhases(vcf_files, bed, outdir, flanking=100, processes=1):
+    """
+        Time the phases of a merge once
+
+        :return: (timings, events, clusters) with the seconds per phase
+    """
+    timings = {}
+    outputs = [os.path.join(outdir, name) for name in ('merged.tsv', 'merged.bed', 'merged.vcf', 'regions.bed')]
+
+    start = time.time()
+    table = EventTable()
+    loaderSettings = (ExclusionIndex(), flanking, False, False, 'native', None, None)
+    merge.loadSamples(table, vcf_files, loaderSettings, processes)
+    timings['load'] = time.time() - start
+
+    # the loader looks up the first breakpoint of every call
+    start = time.time()
+    edb = merge.loadExclusionRegions([bed])
+    excluded = 0
+    for i in range(len(table)):
+        if edb.overlaps(table.contigs[table.chrA[i]], table.posA[i]):
+            excluded += 1
+    timings['exclusion'] = time.time() - start
+
+    start = time.time()
+    commonhits, rowLabels, next_label = merge.clusterTable(table, flanking, processes)
+    timings['match'] = time.time() - start
+
+    start = time.time()
+    merge.writeReports(commonhits, vcf_files, *outputs)
+    timings['write'] = time.time() - start
+
+    start = time.time()
+    merge.startMerge(vcf_files, [bed], outputs[0], flanking, outputs[1], False, outputs[3], outputs[2],
+                     processes=processes)
+    timings['total'] = time.time() - start
+
+    clusters = sum(len(hits) for hits in commonhits.values())
+    return timings, len(table), clusters
+
+
+def runSweep(samples, calls, repeat=3, flanking=100, processes=1, mix=None, shared=0.5, jitter=50, seed=1,
+             workdir=None):
+    """
+        Benchmark every combination of `samples` and `calls`
+
+        :return: list of result dicts
+    """
+    results = []
+    for n_samples, n_calls in itertools.product(samples, calls):
+        directory = tempfile.mkdtemp(dir=workdir)
+        try:
+            vcf_files, bed = generateCohort(directory, n_samples, n_calls, mix, shared, jitter, seed=seed)
+            best = dict((phase, None) for phase in PHASES)
+            for _ in range(repeat):
+                timings, events, clusters = timePhases(vcf_files, bed, directory, flanking, processes)
+                for phase in PHASES:
+                    if best[phase] is None or timings[phase] < best[phase]:
+                        best[phase] = timings[phase]
+        finally:
+            shutil.rmtree(directory)
+
+        result = {
+            'samples': n_samples,
+            'calls': n_calls,
+            'events': events,
+            'clusters': clusters,
+            'seconds': best,
+            'events_per_second': events / best['total'] if best['total'] else None,
+        }
+        results.append(result)
+        print(formatResult(result))
+    return results
+
+
+def formatResult(result):
+    return "samples={samples:<5} calls={calls:<7} events={events:<8} clusters={clusters:<7} ".format(**result) + \
+           " ".join("{}={:.3f}s".format(phase, result['seconds'][phase]) for phase in PHASES)
+
+
+def compareResults(baseline, results):
+    """
+        Print the ratio of the timings against a baseline result file, > 1 is slower than the baseline
+    """
+    previous = dict(((r['samples'], r['calls']), r) for r in baseline['results'])
+    print("Compared to {}:".format(baseline.get('commit') or baseline.get('created')))
+    for result in results:
+        old = previous.get((result['samples'], result['calls']))
+        if old is None:
+            continue
+        ratios = []
+        for phase in PHASES:
+            if old['seconds'].get(phase):
+                ratios.append("{}={:.2f}x".format(phase, result['seconds'][phase] / old['seconds'][phase]))
+        print("samples={:<5} calls={:<7} {}".format(result['samples'], result['calls'], " ".join(ratios)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--samples', type=int, nargs='+', default=[2, 10, 50],
+                        help='Sample counts to sweep [2 10 50]')
+    parser.add_argument('-n', '--calls', type=int, nargs='+', default=[1000, 5000],
+                        help='Calls per sample to sweep [1000 5000]')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='Number of repeats, the fastest is reported [3]')
+    parser.add_argument('-f', '--flanking', type=int, default=100,
+                        help='Centerpoint flanking [100]')
+    parser.add_argument('-p', '--processes', type=int, default=1,
+                        help='Number of worker processes [1]')
+    parser.add_argument('--mix', type=parseMix, default=DEFAULT_MIX,
+                        help='SV type mix as relative weights [DEL=40,DUP=15,INV=15,INS=10,TRA=10,bITX=10]')
+    parser.add_argument('--shared', type=float, default=0.5,
+                        help='Fraction of the calls shared between samples [0.5]')
+    parser.add_argument('--jitter', type=int, default=50,
+                        help='Maximum shift of the breakpoints of a shared call [50]')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='Random seed [1]')
+    parser.add_argument('--workdir', default=None,
+                        help='Directory for the generated cohorts [system temporary directory]')
+    parser.add_argument('-o', '--output', default=None,
+                        help='Write the results as JSON to this file')
+    parser.add_argument('--compare', default=None,
+                        help='JSON results of an earlier run to compare with')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    results = runSweep(args.samples, args.calls, args.repeat, args.flanking, args.processes, args.mix,
+                       args.shared, args.jitter, args.seed, args.workdir)
+
+    report = {
+        'version': pysvtools.__version__,
+        'commit': gitCommit(),
+        'python': platform.python_version(),
+        'created': datetime.datetime.now().isoformat(),
+        'settings': {
+            'repeat': args.repeat,
+            'flanking': args.flanking,
+            'processes': args.processes,
+            'mix': args.mix,
+            'shared': args.shared,
+            'jitter': args.jitter,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(report, fh, indent=2)
+
+    if args.compare:
+        with open(args.compare) as fh:
+            compareResults(json.load(fh), results)
+
+
+if __name__ == "__main__":
+    main()
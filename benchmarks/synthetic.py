@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+    Generator of synthetic SV call sets, one VCF per sample plus an exclusion BED file.
+
+    A pool of shared calls is drawn once, each sample carries a shared call with probability `shared`
+    (with its breakpoints moved by up to `jitter`) and fills up with private calls.
+
+    Usage:
+        python benchmarks/synthetic.py -o OUTDIR [-s SAMPLES] [-n CALLS] [--mix DEL=40,DUP=15,...]
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import os
+import random
+
+# GRCh37 lengths of the simulated contigs
+CONTIGS = collections.OrderedDict([
+    ('1', 249250621), ('2', 243199373), ('3', 198022430), ('4', 191154276), ('5', 180915260),
+    ('6', 171115067), ('7', 159138663), ('8', 146364022), ('9', 141213431), ('10', 135534747),
+    ('11', 135006516), ('12', 133851895), ('13', 115169878), ('14', 107349540), ('15', 102531392),
+    ('16', 90354753), ('17', 81195210), ('18', 78077248), ('19', 59128983), ('20', 63025520),
+    ('21', 48129895), ('22', 51304566), ('X', 155270560),
+])
+
+# fraction of each SV type among the calls
+DEFAULT_MIX = collections.OrderedDict([
+    ('DEL', 0.40), ('DUP', 0.15), ('INV', 0.15), ('INS', 0.10), ('TRA', 0.10), ('bITX', 0.10),
+])
+
+HEADER = """##fileformat=VCFv4.1
+##source=synthetic
+{contigs}
+##ALT=<ID=DEL,Description="Deletion">
+##ALT=<ID=DUP,Description="Duplication">
+##ALT=<ID=INV,Description="Inversion">
+##ALT=<ID=INS,Description="Insertion">
+##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of structural variant">
+##INFO=<ID=END,Number=1,Type=Integer,Description="End position of the variant">
+##INFO=<ID=SVEND,Number=.,Type=Integer,Description="End position of the intrachromosomal translocation">
+##INFO=<ID=SVLEN,Number=1,Type=Integer,Description="Length of the variant">
+##INFO=<ID=CHR2,Number=1,Type=String,Description="Chromosome for END coordinate in case of a translocation">
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Read Depth">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t{sample}
+"""
+
+
+def parseMix(value):
+    """
+        Parse a SV type mix as "DEL=40,DUP=15,..." to normalized fractions
+    """
+    mix = collections.OrderedDict()
+    for item in value.split(','):
+        svtype, weight = item.split('=')
+        if svtype not in DEFAULT_MIX:
+            raise ValueError("Unknown SV type {}, expected one of {}".format(svtype, ", ".join(DEFAULT_MIX)))
+        mix[svtype] = float(weight)
+    total = sum(mix.values())
+    return collections.OrderedDict((svtype, weight / total) for svtype, weight in mix.items())
+
+
+def weightedChoice(rnd, values, weights):
+    x = rnd.random() * sum(weights)
+    for value, weight in zip(values, weights):
+        x -= weight
+        if x < 0:
+            return value
+    return values[-1]
+
+
+def randomCall(rnd, svtypes, weights):
+    """
+        Draw a call as (svtype, chrom, pos, chrom2, pos2)
+    """
+    svtype = weightedChoice(rnd, svtypes, weights)
+    chrom = rnd.choice(list(CONTIGS))
+    # log-uniform sizes between 50bp and 100kb
+    size = int(10 ** rnd.uniform(1.7, 5))
+    pos = rnd.randint(1, CONTIGS[chrom] - size - 1)
+    if svtype == 'TRA':
+        chrom2 = rnd.choice([contig for contig in CONTIGS if contig != chrom])
+        return svtype, chrom, pos, chrom2, rnd.randint(1, CONTIGS[chrom2])
+    return svtype, chrom, pos, chrom, pos + size
+
+
+def formatRecord(call, dp):
+    svtype, chrom, pos, chrom2, pos2 = call
+    if svtype == 'TRA':
+        alt = 'N[{}:{}['.format(chrom2, pos2)
+        info = 'SVTYPE=TRA;CHR2={};END={}'.format(chrom2, pos2)
+    elif svtype == 'bITX':
+        alt = '<bITX>'
+        info = 'SVTYPE=bITX;SVEND={}'.format(pos2)
+    elif svtype == 'INS':
+        alt = '<INS>'
+        info = 'SVTYPE=INS;END={};SVLEN={}'.format(pos + 1, pos2 - pos)
+    else:
+        alt = '<{}>'.format(svtype)
+        info = 'SVTYPE={};END={};SVLEN={}'.format(svtype, pos2, pos2 - pos)
+    return '\t'.join([chrom, str(pos), '.', 'N', alt, '.', 'PASS', info, 'GT:DP', '0/1:{}'.format(dp)])
+
+
+def jitterCall(rnd, call, jitter):
+    svtype, chrom, pos, chrom2, pos2 = call
+    pos = max(1, pos + rnd.randint(-jitter, jitter))
+    pos2 = max(1, pos2 + rnd.randint(-jitter, jitter))
+    if chrom == chrom2 and pos2 <= pos:
+        pos2 = pos + 1
+    return svtype, chrom, pos, chrom2, pos2
+
+
+def generateCohort(directory, samples=10, calls=1000, mix=None, shared=0.5, jitter=50, exclusions=200, seed=1):
+    """
+        Write `samples` VCF files of about `calls` calls each, and an exclusion BED file
+
+        :param mix: fraction per SV type, `DEFAULT_MIX` when None
+        :param shared: probability that a sample carries each call of the shared pool
+        :param jitter: maximum shift of each breakpoint of a shared call in a sample
+        :param exclusions: number of excluded regions of 10kb
+        :return: (list of VCF paths, BED path)
+    """
+    rnd = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    svtypes = list(mix.keys())
+    weights = list(mix.values())
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    pool = [randomCall(rnd, svtypes, weights) for _ in range(calls)]
+    contigs = "\n".join("##contig=<ID={},length={}>".format(name, length) for name, length in CONTIGS.items())
+    order = dict((name, i) for i, name in enumerate(CONTIGS))
+
+    paths = []
+    for n in range(samples):
+        sample = 'sample{}'.format(n)
+        records = [jitterCall(rnd, call, jitter) for call in pool if rnd.random() < shared]
+        records.extend(randomCall(rnd, svtypes, weights) for _ in range(calls - len(records)))
+        records.sort(key=lambda call: (order[call[1]], call[2]))
+
+        path = os.path.join(directory, '{}.vcf'.format(sample))
+        with open(path, 'w') as fh:
+            fh.write(HEADER.format(contigs=contigs, sample=sample))
+            for call in records:
+                fh.write(formatRecord(call, rnd.randint(5, 100)) + '\n')
+        paths.append(path)
+
+    bed = os.path.join(directory, 'exclusion.bed')
+    with open(bed, 'w') as fh:
+        for _ in range(exclusions):
+            chrom = rnd.choice(list(CONTIGS))
+            start = rnd.randint(0, CONTIGS[chrom] - 10000)
+            fh.write('{}\t{}\t{}\n'.format(chrom, start, start + 10000))
+    return paths, bed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--outdir', required=True,
+                        help='Output directory of the VCF and BED files')
+    parser.add_argument('-s', '--samples', type=int, default=10,
+                        help='Number of samples [10]')
+    parser.add_argument('-n', '--calls', type=int, default=1000,
+                        help='Number of calls per sample [1000]')
+    parser.add_argument('--mix', type=parseMix, default=DEFAULT_MIX,
+                        help='SV type mix as relative weights [DEL=40,DUP=15,INV=15,INS=10,TRA=10,bITX=10]')
+    parser.add_argument('--shared', type=float, default=0.5,
+                        help='Fraction of the calls shared between samples [0.5]')
+    parser.add_argument('--jitter', type=int, default=50,
+                        help='Maximum shift of the breakpoints of a shared call [50]')
+    parser.add_argument('--exclusions', type=int, default=200,
+                        help='Number of excluded regions of 10kb [200]')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='Random seed [1]')
+    args = parser.parse_args()
+
+    paths, bed = generateCohort(args.outdir, args.samples, args.calls, args.mix, args.shared, args.jitter,
+                                args.exclusions, args.seed)
+    print("Wrote {} VCF files and {}".format(len(paths), bed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function
+
+__desc__ = """
+    Reading of BGZF (blocked gzip) files by virtual offset, as used by tabix indexes, and writing of BGZF files
+    with the blocks compressed in parallel.
+"""
+__author__ = "Wai Yi Leung <w.y.leung@lumc.nl>"
+
+import collections
+import gzip
+import struct
+import zlib
+from multiprocessing.pool import ThreadPool
+
+import six
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+# fixed part of the gzip header of a BGZF block, up to and including XLEN
+BLOCK_HEADER = struct.Struct('<4BI2BH')
+
+# gzip header of a written block with the BC subfield holding the total block size - 1, and the trailing CRC32/ISIZE
+WRITE_HEADER = struct.Struct('<4BI2BH2BHH')
+WRITE_TRAILER = struct.Struct('<2I')
+
+# uncompressed size of a written block, as bgzip, small enough for the compressed block to fit in 64kb
+BLOCK_SIZE = 0xff00
+MAX_BLOCK_SIZE = 0x10000
+
+# empty block marking the end of a BGZF file
+EOF_BLOCK = b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00\x42\x43\x02\x00\x1b\x00\x03\x00' \
+            b'\x00\x00\x00\x00\x00\x00\x00\x00'
+
+
+def isGzipped(path):
+    with open(path, 'rb') as fh:
+        return fh.read(2) == GZIP_MAGIC
+
+
+def openText(path):
+    """
+        Open a plain or gzip/BGZF compressed text file for reading lines
+    """
+    if isGzipped(path):
+        if six.PY2:
+            return gzip.open(path, 'rb')
+        return gzip.open(path, 'rt')
+    return open(path, 'r')
+
+
+def compressBlock(data, level=6):
+    """
+        Compress `data`, at most `BLOCK_SIZE` bytes, to one BGZF block
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    cdata = compressor.compress(data) + compressor.flush()
+    if len(cdata) + WRITE_HEADER.size + WRITE_TRAILER.size > MAX_BLOCK_SIZE:
+        # incompressible data, stored without compression
+        compressor = zlib.compressobj(0, zlib.DEFLATED, -15)
+        cdata = compressor.compress(data) + compressor.flush()
+    bsize = len(cdata) + WRITE_HEADER.size + WRITE_TRAILER.size - 1
+    return WRITE_HEADER.pack(31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, bsize) + cdata + \
+        WRITE_TRAILER.pack(zlib.crc32(data) & 0xffffffff, len(data))
+
+
+def makeVirtualOffset(block_offset, within_block):
+    return (block_offset << 16) | within_block
+
+
+def splitVirtualOffset(virtual_offset):
+    return virtual_offset >> 16, virtual_offset & 0xFFFF
+
+
+class BgzfReader(object):
+    """
+        Line reader of a BGZF file with random access by virtual offset
+
+        A virtual offset is the file offset of a compressed block shifted left 16 bits,
+        plus the offset in the uncompressed data of that block.
+    """
+
+    def __init__(self, path):
+        self._fh = open(path, 'rb')
+        self._block_offset = 0
+        self._next_offset = 0
+        self._data = b''
+        self._within = 0
+        self._loadBlock(0)
+
+    def _loadBlock(self, block_offset):
+        self._fh.seek(block_offset)
+        header = self._fh.read(BLOCK_HEADER.size)
+        if not header:
+            # end of file
+            self._block_offset = self._next_offset = block_offset
+            self._data = b''
+            self._within = 0
+            return
+        if len(header) < BLOCK_HEADER.size or header[:2] != GZIP_MAGIC:
+            raise ValueError("No BGZF block at offset {}".format(block_offset))
+        xlen = BLOCK_HEADER.unpack(header)[-1]
+        extra = self._fh.read(xlen)
+
+        # search the BC subfield holding the total block size - 1
+        bsize = None
+        i = 0
+        while i + 4 <= len(extra):
+            si1, si2, slen = struct.unpack_from('<2BH', extra, i)
+            if si1 == 66 and si2 == 67 and slen == 2:
+                bsize = struct.unpack_from('<H', extra, i + 4)[0]
+                break
+            i += 4 + slen
+        if bsize is None:
+            raise ValueError("Gzip block at offset {} is not BGZF".format(block_offset))
+
+        cdata = self._fh.read(bsize - xlen - 19)
+        # trailing CRC32 and ISIZE
+        self._fh.read(8)
+        self._block_offset = block_offset
+        self._next_offset = block_offset + bsize + 1
+        self._data = zlib.decompress(cdata, -15)
+        self._within = 0
+
+    def seek(self, virtual_offset):
+        block_offset, within = splitVirtualOffset(virtual_offset)
+        if block_offset != self._block_offset or not self._data:
+            self._loadBlock(block_offset)
+        self._within = within
+
+    def tell(self):
+        if self._within >= len(self._data) and self._data:
+            # the position at the end of a block equals the start of the next one
+            return makeVirtualOffset(self._next_offset, 0)
+        return makeVirtualOffset(self._block_offset, self._within)
+
+    def readline(self):
+        """
+            Read one line as bytes, including the newline. Returns an empty string at the end of the file.
+        """
+        parts = []
+        while True:
+            if self._within >= len(self._data):
+                if self._next_offset == self._block_offset:
+                    break
+                self._loadBlock(self._next_offset)
+                continue
+            end = self._data.find(b'\n', self._within)
+            if end < 0:
+                parts.append(self._data[self._within:])
+                self._within = len(self._data)
+                continue
+            parts.append(self._data[self._within:end + 1])
+            self._within = end + 1
+            break
+        return b''.join(parts)
+
+    def close(self):
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class BgzfWriter(object):
+    """
+        Writer of a BGZF file, readable by gzip, bgzip and tabix
+
+        The data is cut in blocks of `BLOCK_SIZE`, with `threads` > 1 the blocks are compressed in a thread pool
+        (zlib releases the GIL) and written in order. `tell` gives the offset in the uncompressed data,
+        which `virtualOffset` converts to a virtual offset once the data is written.
+
+        :param threads: number of compression threads
+        :param level: zlib compression level
+    """
+
+    def __init__(self, path, threads=1, level=6):
+        self.path = path
+        self.level = level
+        self.threads = threads
+        self._fh = open(path, 'wb')
+        self._buffer = []
+        self._buffered = 0
+        self._offset = 0
+        # file offset of each written block
+        self._block_offsets = []
+        self._file_offset = 0
+        self._pending = collections.deque()
+        self._pool = ThreadPool(threads) if threads > 1 else None
+
+    def write(self, data):
+        if isinstance(data, six.text_type):
+            data = data.encode('utf-8')
+        self._buffer.append(data)
+        self._buffered += len(data)
+        self._offset += len(data)
+        if self._buffered >= BLOCK_SIZE:
+            self._cutBlocks()
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def tell(self):
+        return self._offset
+
+    def virtualOffset(self, offset):
+        """
+            Virtual offset of `offset` in the uncompressed data, for written data only
+        """
+        block, within = divmod(offset, BLOCK_SIZE)
+        if block < len(self._block_offsets):
+            return makeVirtualOffset(self._block_offsets[block], within)
+        # the end of the data, at the start of the next block
+        return makeVirtualOffset(self._file_offset, 0)
+
+    def _cutBlocks(self, final=False):
+        data = b''.join(self._buffer)
+        end = len(data) if final else len(data) - len(data) % BLOCK_SIZE
+        for start in range(0, end, BLOCK_SIZE):
+            self._compress(data[start:start + BLOCK_SIZE])
+        rest = data[end:]
+        self._buffer = [rest] if rest else []
+        self._buffered = len(rest)
+
+    def _compress(self, data):
+        if self._pool is None:
+            self._writeBlock(compressBlock(data, self.level))
+            return
+        self._pending.append(self._pool.apply_async(compressBlock, (data, self.level)))
+        # bound the number of blocks in memory
+        while len(self._pending) > 4 * self.threads:
+            self._writeBlock(self._pending.popleft().get())
+
+    def _writeBlock(self, block):
+        self._block_offsets.append(self._file_offset)
+        self._fh.write(block)
+        self._file_offset += len(block)
+
+    def close(self):
+        if self._fh is None:
+            return
+        try:
+            self._cutBlocks(final=True)
+            while self._pending:
+                self._writeBlock(self._pending.popleft().get())
+            self._fh.write(EOF_BLOCK)
+        finally:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+            self._fh.close()
+            self._fh = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function
+
+__desc__ = """
+    On-disk cache of the events loaded from VCF files, so re-runs over the same input skip parsing.
+"""
+__author__ = "Wai Yi Leung <w.y.leung@lumc.nl>"
+
+import errno
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from pysvtools.models import EventTable
+
+logger = logging.getLogger(__name__)
+
+CACHE_SUFFIX = '.events'
+
+# default bound of the cache directory, in bytes
+DEFAULT_CACHE_SIZE = 1024 * 1024 * 1024
+
+
+def fileFingerprint(path):
+    """
+        Identity of a file as (absolute path, size, modification time)
+    """
+    st = os.stat(path)
+    mtime = getattr(st, 'st_mtime_ns', None)
+    if mtime is None:
+        mtime = repr(st.st_mtime)
+    return os.path.abspath(path), st.st_size, mtime
+
+
+class EventCache(object):
+    """
+        Directory of dumped `EventTable`, one file per input file and loader settings
+
+        The cache is bounded in size: after storing a table the least recently used files are removed
+        until the total size fits. Reading a table marks it as used.
+
+        :param directory: cache directory, created when missing
+        :param max_size: maximum total size in bytes of the cached tables
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        # the bound may have been lowered since the last run
+        self.evict()
+
+    def key(self, path, settings):
+        """
+            Cache key of `path` loaded with `settings`, any change of the file or the settings gives a new key
+
+            :param settings: JSON serializable loader settings which affect the loaded events
+        """
+        # the path as given is also the sample name stored in the table
+        data = json.dumps([path, fileFingerprint(path), settings], sort_keys=True)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def load(self, key):
+        """
+            :return: (sv_caller, skipped_events, `EventTable`), or None when not cached
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fh:
+                info = json.loads(fh.readline().decode('utf-8'))
+                table = EventTable.load(fh)
+        except (IOError, OSError):
+            return None
+        except ValueError as e:
+            logger.warning("Ignoring unreadable cache file {}: {}".format(path, e))
+            return None
+
+        try:
+            # mark as recently used
+            os.utime(path, None)
+        except OSError:
+            pass
+        return info['sv_caller'], info['skipped_events'], table
+
+    def store(self, key, sv_caller, skipped_events, table):
+        """
+            Write the table to the cache and evict the least recently used tables when over size
+        """
+        # write to a temporary file first, concurrent runs never see a partial table
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                info = {'sv_caller': sv_caller, 'skipped_events': skipped_events}
+                fh.write(json.dumps(info).encode('utf-8') + b'\n')
+                table.dump(fh)
+            os.rename(tmp_path, self._path(key))
+        except:
+            os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def entries(self):
+        """
+            Cached files as (last used, size, path), least recently used first
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(CACHE_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for used, size, path in entries)
+        for used, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            logger.debug("Evicted {} from the event cache".format(path))
+
+    def __repr__(self):
+        return "<EventCache {}>".format(self.directory)
+
+
+def addCacheArguments(parser):
+    """
+        Add the event cache options to an `argparse.ArgumentParser`, the size is in MB
+    """
+    parser.add_argument('--cache_dir', default=None,
+                        help='Cache the events loaded from each VCF file in this directory, '
+                             'a re-run over unchanged files skips parsing')
+    parser.add_argument('--cache_size', type=int, default=DEFAULT_CACHE_SIZE // (1024 * 1024),
+                        help='Maximum size of the cache directory in MB, least recently used files are removed '
+                             '[%(default)s]')
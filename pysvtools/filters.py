@@ -0,0 +1,183 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function
+
+__desc__ = """
+    Load-time filters of SV calls, checked on the raw text of a record before parsing and on the parsed call
+    before an `Event` is made.
+"""
+__author__ = "Wai Yi Leung <w.y.leung@lumc.nl>"
+
+# SVTYPE values of the VCF records loaded as another event type
+EVENT_SVTYPES = {'CTX': 'TRA', 'bITX': 'TRA'}
+
+# FILTER values of records which passed all filters, or to which no filters were applied
+PASS_FILTERS = frozenset(['PASS', '.'])
+
+
+class LoadFilter(object):
+    """
+        Declarative filter of the calls to load
+
+        `acceptsFields` checks the CHROM, FILTER and INFO text of a record before it is parsed, `acceptsFilter` the
+        FILTER of the parsed record and `accepts` the parsed call. Every raw check is repeated by the typed checks,
+        so records of a reader without the raw check are dropped all the same, and the raw check only saves the
+        parsing of records which would be dropped anyway.
+
+        :param svtypes: event types to load, translocations (CTX, bITX) are loaded as TRA
+        :param min_size: minimal size of intrachromosomal events, translocations between contigs have no size
+        :param max_size: maximal size of intrachromosomal events
+        :param min_dp: minimal read depth, calls without read depth are dropped
+        :param pass_only: only load the records with FILTER PASS or missing (.)
+        :param contigs: only load the calls of which both breakpoints are on these contigs
+    """
+
+    def __init__(self, svtypes=None, min_size=None, max_size=None, min_dp=None, pass_only=False, contigs=None):
+        self.svtypes = None
+        if svtypes:
+            self.svtypes = frozenset(EVENT_SVTYPES.get(svtype, svtype) for svtype in svtypes)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.min_dp = min_dp
+        self.pass_only = pass_only
+        self.contigs = frozenset(contigs) if contigs else None
+
+        self._text = {}
+        if self.contigs is not None:
+            self._text['contigs'] = self.contigs
+        if self.pass_only:
+            self._text['filters'] = PASS_FILTERS
+        if self.svtypes is not None:
+            # the SVTYPE values of the records loaded as one of the types
+            self._text['svtypes'] = tuple('SVTYPE={}'.format(svtype) for svtype in
+                                          self.svtypes.union(raw for raw, svtype in EVENT_SVTYPES.items()
+                                                             if svtype in self.svtypes))
+        self._bytes = dict((name, type(values)(value.encode('utf-8') for value in values))
+                           for name, values in self._text.items())
+
+    @classmethod
+    def fromArgs(cls, args):
+        """
+            The filter of the options added by `addFilterArguments`, None without filter options
+        """
+        loadFilter = cls(args.svtypes, args.min_size, args.max_size, args.min_dp, args.pass_only, args.contigs)
+        if not loadFilter.settings():
+            return None
+        return loadFilter
+
+    def settings(self):
+        """
+            The options of the filter which are set, part of the cache key and the merge state settings
+        """
+        settings = {}
+        for name in ('svtypes', 'contigs'):
+            if getattr(self, name) is not None:
+                settings[name] = sorted(getattr(self, name))
+        for name in ('min_size', 'max_size', 'min_dp'):
+            if getattr(self, name) is not None:
+                settings[name] = getattr(self, name)
+        if self.pass_only:
+            settings['pass_only'] = True
+        return settings
+
+    @property
+    def checksText(self):
+        """
+            Whether `acceptsFields` can drop records
+        """
+        return bool(self._text)
+
+    def acceptsFields(self, chrom, filters, info):
+        """
+            Raw check of the CHROM, FILTER and INFO column of a record, all as text or all as bytes
+
+            The SVTYPE is searched as substring of the INFO column, the typed check is decisive.
+        """
+        checks = self._bytes if isinstance(info, bytes) else self._text
+        if 'contigs' in checks and chrom not in checks['contigs']:
+            return False
+        if 'filters' in checks and filters not in checks['filters']:
+            return False
+        if 'svtypes' in checks and not any(token in info for token in checks['svtypes']):
+            return False
+        return True
+
+    def acceptsLine(self, line):
+        """
+            Raw check of a data line of a VCF file
+        """
+        fields = line.split(b'\t' if isinstance(line, bytes) else '\t', 8)
+        if len(fields) < 8:
+            # left to the parser to report
+            return True
+        return self.acceptsFields(fields[0], fields[6], fields[7].rstrip())
+
+    def acceptsFilter(self, filters):
+        """
+            Typed check of the FILTER of a parsed record, as parsed by PyVCF: None when missing, an empty list for
+            PASS, else the failed filters
+        """
+        return not self.pass_only or not filters
+
+    def accepts(self, chrA, chrApos, chrB, chrBpos, sv_type, dp):
+        """
+            Typed check of a parsed call, before it becomes an `Event`
+        """
+        if self.contigs is not None and (chrA not in self.contigs or chrB not in self.contigs):
+            return False
+        if self.svtypes is not None and sv_type not in self.svtypes:
+            return False
+        if chrA == chrB and (self.min_size is not None or self.max_size is not None):
+            size = abs(int(chrBpos) - int(chrApos))
+            if self.min_size is not None and size < self.min_size:
+                return False
+            if self.max_size is not None and size > self.max_size:
+                return False
+        if self.min_dp is not None:
+            if type(dp) == type([]):
+                dp = dp[0]
+            if dp is None or dp < self.min_dp:
+                return False
+        return True
+
+    def __repr__(self):
+        return "<LoadFilter {}>".format(self.settings())
+
+
+class FilteredLines(object):
+    """
+        The lines of a VCF file without the data lines failing the raw check of `loadFilter`, header lines are kept
+
+        The number of dropped lines is kept as `prefiltered`, as on `pysvtools.reader.SVReader`.
+    """
+
+    def __init__(self, lines, loadFilter):
+        self.lines = lines
+        self.loadFilter = loadFilter
+        self.prefiltered = 0
+
+    def __iter__(self):
+        for line in self.lines:
+            if line[:1] in ('#', b'#') or self.loadFilter.acceptsLine(line):
+                yield line
+            else:
+                self.prefiltered += 1
+
+
+def addFilterArguments(parser):
+    """
+        Add the load filter options to an `argparse.ArgumentParser`, see `LoadFilter.fromArgs`
+    """
+    parser.add_argument('--svtype', dest='svtypes', action='append', default=None,
+                        help='Only load the events of this type (DEL, DUP, INV, INS, TRA), can be given multiple '
+                             'times. CTX and bITX calls are loaded as TRA')
+    parser.add_argument('--min_size', type=int, default=None,
+                        help='Only load intrachromosomal events of at least this size')
+    parser.add_argument('--max_size', type=int, default=None,
+                        help='Only load intrachromosomal events of at most this size')
+    parser.add_argument('--min_dp', type=int, default=None,
+                        help='Only load the calls with at least this read depth')
+    parser.add_argument('--pass_only', action='store_true', default=False,
+                        help='Only load the records with FILTER PASS or missing (.)')
+    parser.add_argument('--contigs', nargs='+', default=None,
+                        help='Only load the calls with both breakpoints on these contigs')
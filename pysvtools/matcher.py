@@ -0,0 +1,427 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function
+
+__desc__ = """
+    Matching engines for Structural Variation events.
+    Calls are ordered by centerpoint once, candidates are looked up in a window around the centerpoint.
+"""
+__author__ = "Wai Yi Leung <w.y.leung@lumc.nl>"
+
+import array
+import bisect
+import collections
+import heapq
+import itertools
+import time
+
+from six.moves import zip
+
+if hasattr(time, 'process_time'):
+    _processTime = time.process_time
+else:
+    _processTime = time.clock
+
+
+class DisjointSet(object):
+    """
+        Union-find over the integer ids 0..n-1, with path compression and union by rank
+
+        Each id starts in a set of its own, `union` joins the sets of two ids and `find` gives the root id
+        identifying the set of an id, both in near constant time.
+    """
+
+    def __init__(self, n=0):
+        self.parent = array.array('l', range(n))
+        self.rank = bytearray(n)
+
+    def __len__(self):
+        return len(self.parent)
+
+    def add(self):
+        """
+            Add an id in a set of its own
+
+            :return: the new id
+        """
+        i = len(self.parent)
+        self.parent.append(i)
+        self.rank.append(0)
+        return i
+
+    def find(self, i):
+        parent = self.parent
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    def union(self, i, j):
+        """
+            Join the sets of `i` and `j`
+
+            :return: the root of the joined set
+        """
+        a, b = self.find(i), self.find(j)
+        if a == b:
+            return a
+        if self.rank[a] < self.rank[b]:
+            a, b = b, a
+        self.parent[b] = a
+        if self.rank[a] == self.rank[b]:
+            self.rank[a] += 1
+        return a
+
+
+def iterClusters(entries, flanking, stats=None):
+    """
+        Single sweep clustering of (centerpoint, sample, payload) entries sorted by centerpoint
+
+        Entries of different samples with centerpoints at most `flanking` apart are linked,
+        linked entries form one cluster. A cluster is yielded, as list of its entries in input order,
+        as soon as none of its members is within reach of the sweep anymore.
+        Clusters with a single sample are yielded as well.
+
+        :param stats: dict in which the number of compared ('comparisons') and linked ('matches') entry pairs
+                      are added up, when the sweep is complete
+    """
+    # the entries are identified by their arrival, the window holds (centerpoint, sample, id)
+    window = collections.deque()
+    clusters = DisjointSet()
+    parent = clusters.parent
+    # the (id, entry) members and the number of members in the window per cluster root
+    members = {}
+    active = {}
+    comparisons = 0
+    matches = 0
+
+    for entry in entries:
+        centerpoint, sample = entry[0], entry[1]
+
+        while window and window[0][0] < centerpoint - flanking:
+            root = parent[window.popleft()[2]]
+            if parent[root] != root:
+                root = clusters.find(root)
+            active[root] -= 1
+            if not active[root]:
+                del active[root]
+                yield [member[1] for member in sorted(members.pop(root))]
+
+        n = root = clusters.add()
+        members[root] = [(n, entry)]
+        active[root] = 1
+        comparisons += len(window)
+        for w in window:
+            if w[1] != sample:
+                matches += 1
+                # the parent of an entry is mostly the root of its cluster
+                other = parent[w[2]]
+                if parent[other] != other:
+                    other = clusters.find(other)
+                if other == root:
+                    continue
+                # a new entry joins the cluster it links to
+                joined = clusters.union(other, root)
+                if joined != root:
+                    root, other = other, root
+                # the members of the smaller cluster are moved
+                if len(members[root]) < len(members[other]):
+                    members[root], members[other] = members[other], members[root]
+                members[root].extend(members.pop(other))
+                active[root] += active.pop(other)
+        window.append((centerpoint, sample, n))
+
+    while window:
+        root = parent[window.popleft()[2]]
+        if parent[root] != root:
+            root = clusters.find(root)
+        active[root] -= 1
+        if not active[root]:
+            del active[root]
+            yield [member[1] for member in sorted(members.pop(root))]
+
+    if stats is not None:
+        stats['comparisons'] = stats.get('comparisons', 0) + comparisons
+        stats['matches'] = stats.get('matches', 0) + matches
+
+
+def clusterMembers(cluster):
+    """
+        Per sample member of a cluster, the first (lowest centerpoint) event of each sample is taken
+
+        :return: OrderedDict of sample -> payload
+    """
+    members = collections.OrderedDict()
+    for entry in cluster:
+        if entry[1] not in members:
+            members[entry[1]] = entry[2]
+    return members
+
+
+def iterSortedEvents(streams, contigKey):
+    """
+        K-way merge of coordinate sorted streams of intrachromosomal `Event` by (contig, centerpoint)
+
+        Each stream must be sorted by contig (following `contigKey`) and position. As no later event of
+        a stream can have a centerpoint before the position of the last event read from it, every buffered
+        event up to the lowest read position is final and is yielded.
+
+        :param streams: list of iterables of `Event`, one per sample
+        :param contigKey: function giving the sort key of a contig name
+        :return: generator of (stream index, `Event`)
+    """
+    iterators = [iter(stream) for stream in streams]
+    last = [None] * len(streams)
+    heads = []
+    pending = []
+    seq = itertools.count()
+
+    def advance(i):
+        for event in iterators[i]:
+            key = (contigKey(event.chrA), event.chrApos)
+            if last[i] is not None and key < last[i]:
+                raise ValueError("Input {} is not coordinate sorted at {}".format(i, event))
+            last[i] = key
+            heapq.heappush(pending, ((key[0], event.centerpoint), i, next(seq), event))
+            heapq.heappush(heads, (key, i))
+            return
+
+    for i in range(len(iterators)):
+        advance(i)
+
+    while heads:
+        watermark, i = heapq.heappop(heads)
+        while pending and pending[0][0] <= watermark:
+            entry = heapq.heappop(pending)
+            yield entry[1], entry[3]
+        advance(i)
+
+    while pending:
+        entry = heapq.heappop(pending)
+        yield entry[1], entry[3]
+
+
+def splitAtGaps(centerpoints, flanking, chunk_size):
+    """
+        Split sorted centerpoints in slices of at least `chunk_size`, cut only where the gap exceeds `flanking`
+
+        No cluster can span such a gap, the slices can be clustered independently.
+
+        :return: list of (start, end) slices
+    """
+    slices = []
+    start = 0
+    for k in range(1, len(centerpoints)):
+        if k - start >= chunk_size and centerpoints[k] - centerpoints[k - 1] > flanking:
+            slices.append((start, k))
+            start = k
+    if start < len(centerpoints):
+        slices.append((start, len(centerpoints)))
+    return slices
+
+
+def labelClusters(centerpoints, samples, flanking, stats=None):
+    """
+        Cluster label of each entry, numbered from 0 in order of the first member of the cluster
+
+        :param centerpoints: centerpoints sorted ascending
+        :param samples: sample of each entry
+        :param stats: dict for the comparison counters, see `iterClusters`
+        :return: `array.array` of labels
+    """
+    labels = array.array('l', [0] * len(centerpoints))
+    clusters = iterClusters(zip(centerpoints, samples, itertools.count()), flanking, stats)
+    for label, members in enumerate(sorted(clusters, key=lambda cluster: cluster[0][2])):
+        for entry in members:
+            labels[entry[2]] = label
+    return labels
+
+
+def clustersFromLabels(labels, samples):
+    """
+        Reported clusters of labeled entries sorted by centerpoint: the clusters with more than one sample,
+        with the first entry of each sample, in order of the first member of the cluster
+
+        :return: list of `array.array` of entry indexes
+    """
+    members = collections.OrderedDict()
+    for k, (label, sample) in enumerate(zip(labels, samples)):
+        cluster = members.setdefault(label, collections.OrderedDict())
+        if sample not in cluster:
+            cluster[sample] = k
+    return [array.array('l', cluster.values()) for cluster in members.values() if len(cluster) > 1]
+
+
+def updateLabels(centerpoints, samples, labels, flanking, next_label, stats=None):
+    """
+        Add entries to existing clusters, giving the same clusters as labeling all entries with `labelClusters`
+
+        Only the new entries, labeled -1, are linked to the entries within `flanking` of another sample.
+        Linked clusters are merged, as adding entries can only join clusters. The cost is that of a lookup per
+        new entry, plus one pass to relabel.
+
+        :param centerpoints: centerpoints sorted ascending
+        :param samples: sample of each entry
+        :param labels: cluster label of each entry, -1 for new entries
+        :param next_label: first unused label, new clusters are numbered from here
+        :param stats: dict for the comparison counters, see `iterClusters`
+        :return: (labels, next_label) with the updated labels as a new `array.array`
+    """
+    comparisons = 0
+    matches = 0
+
+    labels = array.array('l', labels)
+    new = [k for k, label in enumerate(labels) if label < 0]
+    for k in new:
+        labels[k] = next_label
+        next_label += 1
+
+    # the labels in use are numbered 0..n-1 as ids of the disjoint set
+    ids = {}
+    for label in labels:
+        if label not in ids:
+            ids[label] = len(ids)
+    clusters = DisjointSet(len(ids))
+
+    for k in new:
+        lo = bisect.bisect_left(centerpoints, centerpoints[k] - flanking)
+        hi = bisect.bisect_right(centerpoints, centerpoints[k] + flanking)
+        comparisons += hi - lo - 1
+        for j in range(lo, hi):
+            if samples[j] != samples[k]:
+                matches += 1
+                clusters.union(ids[labels[k]], ids[labels[j]])
+
+    # a joined cluster keeps the oldest label
+    oldest = {}
+    for label, i in ids.items():
+        root = clusters.find(i)
+        if label < oldest.get(root, label + 1):
+            oldest[root] = label
+    for k in range(len(labels)):
+        labels[k] = oldest[clusters.find(ids[labels[k]])]
+    if stats is not None:
+        stats['comparisons'] = stats.get('comparisons', 0) + comparisons
+        stats['matches'] = stats.get('matches', 0) + matches
+    return labels, next_label
+
+
+def labelGridClusters(centerpoints, sizes, samples, flanking, sizeFlanking, stats=None):
+    """
+        Cluster label of each entry, linking entries of different samples with centerpoints at most `flanking`
+        and sizes at most `sizeFlanking` apart. Labels are numbered from 0 in order of the first member.
+
+        Entries are bucketed in a grid of centerpoint bins of `flanking` by size bins of `sizeFlanking`,
+        all candidates of an entry are in the 3x3 cells around its own cell.
+
+        :param centerpoints: centerpoints sorted ascending
+        :param sizes: size of each entry
+        :param samples: sample of each entry
+        :param stats: dict for the comparison counters, see `iterClusters`
+        :return: `array.array` of labels
+    """
+    clusters = DisjointSet(len(centerpoints))
+    comparisons = 0
+    matches = 0
+
+    cpBin = max(flanking, 1)
+    sizeBin = max(sizeFlanking, 1)
+    # centerpoint bin -> size bin -> entries, the size bins are only looked up in occupied centerpoint bins
+    grid = {}
+    parent = clusters.parent
+    for k in range(len(centerpoints)):
+        centerpoint, size, sample = centerpoints[k], sizes[k], samples[k]
+        cpCell, sizeCell = centerpoint // cpBin, size // sizeBin
+        # root of the cluster of k, candidates pointing to it directly need no union
+        root = k
+        for dc in (-1, 0, 1):
+            column = grid.get(cpCell + dc)
+            if column is None:
+                continue
+            for ds in (-1, 0, 1):
+                candidates = column.get(sizeCell + ds, ())
+                comparisons += len(candidates)
+                for j in candidates:
+                    if samples[j] != sample and abs(centerpoints[j] - centerpoint) <= flanking and \
+                            abs(sizes[j] - size) <= sizeFlanking:
+                        matches += 1
+                        if parent[j] != root:
+                            root = clusters.union(j, root)
+        grid.setdefault(cpCell, {}).setdefault(sizeCell, []).append(k)
+
+    # numbered in order of the first member
+    labels = array.array('l', [0] * len(centerpoints))
+    roots = {}
+    for k in range(len(centerpoints)):
+        root = clusters.find(k)
+        if root not in roots:
+            roots[root] = len(roots)
+        labels[k] = roots[root]
+    if stats is not None:
+        stats['comparisons'] = stats.get('comparisons', 0) + comparisons
+        stats['matches'] = stats.get('matches', 0) + matches
+    return labels
+
+
+def labelBreakendClusters(positionsA, positionsB, samples, flanking, stats=None):
+    """
+        Cluster label of each interchromosomal entry, linking entries of different samples of which both breakends
+        are at most `flanking` apart. Labels are numbered from 0 in order of the first member.
+
+        The centerpoint of a translocation lies between positions on different contigs, instead both breakends
+        are bucketed in a grid of `flanking` bins per breakend, all candidates are in the 3x3 cells around the
+        cell of an entry.
+
+        :param positionsA: position of the first breakend of each entry
+        :param positionsB: position of the second breakend of each entry, on the other contig
+        :param samples: sample of each entry
+        :param stats: dict for the comparison counters, see `iterClusters`
+        :return: `array.array` of labels
+    """
+    return labelGridClusters(positionsA, positionsB, samples, flanking, flanking, stats)
+
+
+def iterBreakendClusters(entries, flanking, stats=None):
+    """
+        Clustering of (centerpoint, sample, `Event`) entries of interchromosomal events on both breakends,
+        see `labelBreakendClusters`. Like `iterClusters` clusters with a single sample are included.
+
+        :return: list of clusters in order of the first member, each as list of its entries in input order
+    """
+    entries = list(entries)
+    labels = labelBreakendClusters([entry[2].chrApos for entry in entries], [entry[2].chrBpos for entry in entries],
+                                   [entry[1] for entry in entries], flanking, stats)
+    clusters = collections.OrderedDict()
+    for label, entry in zip(labels, entries):
+        clusters.setdefault(label, []).append(entry)
+    return list(clusters.values())
+
+
+def clusterPartition(partition):
+    """
+        Cluster one partition shipped as compact arrays, used as worker function for a process pool
+
+        :param partition: (key, centerpoints, samples, flanking, sizes, sizeFlanking, breakends) with the
+                          centerpoints, sample indexes and sizes as `array.array`, sorted by centerpoint. Without
+                          `sizeFlanking` (None) events are matched on centerpoint only and the sizes are not used.
+                          With `breakends`, the (positionsA, positionsB) arrays of interchromosomal events, events
+                          are matched on both breakends, see `labelBreakendClusters`.
+        :return: (key, clusters, labels, stats) with each cluster of more than 1 sample as an `array.array` of
+                 member indexes, the cluster label of every entry, and the comparison counters and wall/cpu time
+    """
+    wall = time.time()
+    cpu = _processTime()
+    stats = {}
+    key, centerpoints, samples, flanking, sizes, sizeFlanking, breakends = partition
+    if breakends is not None:
+        labels = labelBreakendClusters(breakends[0], breakends[1], samples, flanking, stats)
+    elif sizeFlanking is None:
+        labels = labelClusters(centerpoints, samples, flanking, stats)
+    else:
+        labels = labelGridClusters(centerpoints, sizes, samples, flanking, sizeFlanking, stats)
+    clusters = clustersFromLabels(labels, samples)
+    stats['wall'] = time.time() - wall
+    stats['cpu'] = _processTime() - cpu
+    return key, clusters, labels, stats
@@ -9,12 +9,18 @@ __desc__ = """
 __author__ = "Wai Yi Leung <w.y.leung@lumc.nl>"
 
 import argparse
+import array
 import collections
 import itertools
-from natsort import natsorted
+from natsort import natsorted, natsort_keygen
 import logging
+import multiprocessing
 import os
 import sys
+import threading
+import time
+
+from six.moves import queue
 
 try:
     import vcf
@@ -25,270 +31,1322 @@ except:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-from pysvtools.models import Event
+# minimal number of calls in a partition clustered by one worker
+PARTITION_SIZE = 10000
+
+# lines collected per report before they are written, and the buffer size of the report files
+REPORT_BATCH_LINES = 10000
+REPORT_BUFFER_SIZE = 1024 * 1024
+
+# batches waiting between the stages of a pipelined merge, per reader process and for the writer
+PIPELINE_QUEUE_SIZE = 4
+# seconds between the checks whether a reader process of a pipelined merge is still running
+PIPELINE_POLL_SECONDS = 1.
+
+from pysvtools.cache import EventCache, DEFAULT_CACHE_SIZE, addCacheArguments
+from pysvtools.filters import LoadFilter, FilteredLines, addFilterArguments
+from pysvtools.metrics import Metrics, addMetricsArguments, cpuTime
+from pysvtools.reader import SVReader, MmapSVReader
+from pysvtools.spill import EventSpill, addMemoryArguments
+from pysvtools.state import MergeState
+from pysvtools.bgzf import BgzfWriter, isGzipped, openText
+from pysvtools.tabix import openRegions, parseRegion, SortedIndexedWriter
+from pysvtools.matcher import iterClusters, iterBreakendClusters, clusterMembers, iterSortedEvents, splitAtGaps, clusterPartition, \
+    clustersFromLabels, updateLabels
+from pysvtools.models import Event, EventTable, ExclusionIndex
+from pysvtools.models.eventtable import chromosomeKey
 from pysvtools.utils import extractTXmate, extractDPFromRecord, getSVType, getSVLEN, formatBedTrack, \
     formatVCFRecord, vcfHeader, build_exclusion
 
+VCF_PARSERS = collections.OrderedDict([
+    ('native', SVReader),
+    ('pyvcf', vcf.Reader),
+])
+
 
 class VCFEventLoader(object):
     """
         Load VCF File and transform VCF record into an `Event`
+
+        Iterating over the loader yields the `Event` for each record in file order, the number of loaded, skipped
+        and filtered events and the time spent on exclusion lookups are kept on the loader.
     """
 
-    def __init__(self):
-        pass
+    def __init__(self, vcf_reader, edb, centerpointFlanking, transonly, svmethod="", exclusion_mate=False,
+                 loadFilter=None):
+        """
+            :param edb: `ExclusionIndex` with the regions to skip
+            :param exclusion_mate: also skip translocations of which the mate breakpoint is in an excluded region
+            :param loadFilter: `LoadFilter` of the calls to load, checked before an `Event` is made
+        """
+        self.vcf_reader = vcf_reader
+        self.edb = edb
+        self.centerpointFlanking = centerpointFlanking
+        self.transonly = transonly
+        self.svmethod = svmethod
+        self.exclusion_mate = exclusion_mate
+        self.loadFilter = loadFilter
 
+        self.n_events = 0
+        self.skipped_events = 0
+        self.filtered_events = 0
+        self.exclusion_seconds = 0.
 
-class SVMerger(object):
-    def __init__(self):
-        pass
+    def excluded(self, chromosome, position):
+        start = time.time()
+        overlaps = self.edb.overlaps(chromosome, position)
+        self.exclusion_seconds += time.time() - start
+        return overlaps
 
+    @property
+    def n_filtered(self):
+        """
+            The number of calls dropped by the load filter, including the records dropped before parsing
+        """
+        # the lines dropped before a pyvcf reader are counted on its `FilteredLines`
+        prefiltered = getattr(self.vcf_reader, 'filtered_lines', self.vcf_reader)
+        return self.filtered_events + getattr(prefiltered, 'prefiltered', 0)
 
-class ReportExport(object):
-    def __init__(self):
-        pass
+    def iterCalls(self):
+        """
+            Yield each call passing the load filter as (chrA, chrApos, chrB, chrBpos, sv_type, dp), without
+            creating an `Event`
+        """
+        for t in self.iterRecordCalls():
+            if self.loadFilter is not None and not self.loadFilter.accepts(*t):
+                self.filtered_events += 1
+                continue
+            self.n_events += 1
+            yield t
+
+    def iterRecordCalls(self):
+        """
+            Yield the call of each record which is not excluded, see `iterCalls`
+        """
+        for record in self.vcf_reader:
+            if self.loadFilter is not None and not self.loadFilter.acceptsFilter(record.FILTER):
+                self.filtered_events += 1
+                continue
 
+            SVTYPE = getSVType(record)
 
-# read all samples in memory
-def loadEventFromVCF(s, vcf_reader, edb, centerpointFlanking, transonly, svmethod=""):
+            if self.transonly and SVTYPE not in ['CTX', 'TRA']:
+                continue
+
+            if self.excluded(record.CHROM, record.POS):
+                self.skipped_events += 1
+                continue
+
+            SVLEN = getSVLEN(record)
+
+            if SVTYPE == 'bITX':
+                # intrachromosomal events
+                try:
+                    end = record.INFO['SVEND'][0]
+                except:
+                    end = record.INFO['BREAKPOINTS'][0].replace('"', '').split('-')[1]
+                if self.exclusion_mate and self.excluded(record.CHROM, int(end)):
+                    self.skipped_events += 1
+                    continue
+                t = (record.CHROM, record.POS, record.CHROM, end, "TRA", extractDPFromRecord(record))
+                yield t
+            elif SVTYPE in ['CTX', 'TRA']:
+                # interchromosomal events
+                # check chromosome B:
+                chrB, chrBpos = extractTXmate(record)
+                if self.exclusion_mate and self.excluded(chrB, chrBpos):
+                    self.skipped_events += 1
+                    continue
+
+                t = (record.CHROM, record.POS, chrB, chrBpos, 'TRA', extractDPFromRecord(record))
+                yield t
+
+            elif SVTYPE == 'DEL':
+                try:
+                    if "SVEND" in record.INFO.keys():
+                        if type(record.INFO['SVEND']) == type([]):
+                            end = record.INFO['SVEND'][0]
+                        else:
+                            end = record.INFO['SVEND']
+                    elif "END" in record.INFO.keys():
+                        if type(record.INFO['END']) == type([]):
+                            end = record.INFO['END'][0]
+                        else:
+                            end = record.INFO['END']
+                    elif "SVLEN" in record.INFO.keys():
+                        end = record.POS + abs(SVLEN)
+                    t = (record.CHROM, record.POS, record.CHROM, end, SVTYPE, extractDPFromRecord(record))
+                except:
+                    print("Unexpected error:", sys.exc_info()[0])
+                    raise
+                else:
+                    yield t
+            else:
+                # all other events not covered in this analysis, we only check the overlap
+                try:
+                    if "SVEND" in record.INFO.keys():
+                        if type(record.INFO['SVEND']) == type([]):
+                            end = record.INFO['SVEND'][0]
+                        else:
+                            end = record.INFO['SVEND']
+                    elif "END" in record.INFO.keys():
+                        if type(record.INFO['END']) == type([]):
+                            end = record.INFO['END'][0]
+                        else:
+                            end = record.INFO['END']
+                    elif "SVLEN" in record.INFO.keys():
+                        end = record.POS + abs(SVLEN)
+                    t = (record.CHROM, record.POS, record.CHROM, end, SVTYPE, extractDPFromRecord(record))
+                except:
+                    print("Unexpected error:", sys.exc_info()[0])
+                    raise
+                else:
+                    yield t
+
+
+    def __iter__(self):
+        for chrA, chrApos, chrB, chrBpos, sv_type, dp in self.iterCalls():
+            yield Event(chrA, chrApos, chrB, chrBpos,
+                        sv_type=sv_type,
+                        cp_flank=self.centerpointFlanking,
+                        dp=dp,
+                        svmethod=self.svmethod)
+
+    def loadTable(self, table, sample):
+        """
+            Append all calls to `EventTable` `table` for `sample`
+        """
+        for chrA, chrApos, chrB, chrBpos, sv_type, dp in self.iterCalls():
+            table.append(chrA, chrApos, chrB, chrBpos, sv_type, dp, sample, self.svmethod)
+
+
+MergedCluster = collections.namedtuple('MergedCluster', ['virtualChr', 'event', 'members'])
+
+
+def representativeEvent(items):
     """
-        Loading VCF records and transform them to `Event`
+        The event reported for a cluster: the first one with the highest DP, events without DP rank lowest
+
+        :param items: OrderedDict of sample -> `Event` found in that sample
     """
-    svDB = collections.OrderedDict()
-    skipped_events = 0
+    return max(items.values(), key=lambda hit: -1 if hit.dp is None else hit.dp)
 
-    for record in vcf_reader:
-        SVTYPE = getSVType(record)
 
-        if transonly and SVTYPE not in ['CTX', 'TRA']:
-            continue
+def sortedClusters(hits):
+    """
+        The clusters of one chromosome ordered by the position of their first member
 
-        skip = True in list(
-            filter((lambda y: y == True), list(map((lambda x: x.overlaps(record.CHROM, record.POS)), edb))))
-        if skip:
-            skipped_events += 1
-            continue
+        :param hits: OrderedDict of cluster id -> items, see `representativeEvent`
+    """
+    return sorted(hits.values(), key=lambda items: list(items.values())[0].chrApos)
 
-        SVLEN = getSVLEN(record)
 
-        if SVTYPE == 'bITX':
-            # intrachromosomal events
-            try:
-                end = record.INFO['SVEND'][0]
-            except:
-                end = record.INFO['BREAKPOINTS'][0].replace('"', '').split('-')[1]
-            finally:
-                t = Event(record.CHROM, record.POS, record.CHROM,
-                          end, sv_type="TRA",
-                          cp_flank=centerpointFlanking,
-                          dp=extractDPFromRecord(record),
-                          svmethod=svmethod)
-                svDB[t.virtualChr] = svDB.get(t.virtualChr, [])
-                svDB[t.virtualChr].append(t)
-        elif SVTYPE in ['CTX', 'TRA']:
-            # interchromosomal events
-            # check chromosome B:
-            chrB, chrBpos = extractTXmate(record)
-
-            t = Event(record.CHROM, record.POS, chrB, chrBpos,
-                      sv_type='TRA',
-                      cp_flank=centerpointFlanking,
-                      dp=extractDPFromRecord(record),
-                      svmethod=svmethod)
-            try:
-                svDB[t.virtualChr] = svDB.get(t.virtualChr, [])
-            except:
-                pass
-            else:
-                svDB[t.virtualChr].append(t)
+class SVMerger(object):
+    """
+        Merge the SV calls of several samples in-process
 
-        elif SVTYPE == 'DEL':
-            try:
-                if "SVEND" in record.INFO.keys():
-                    if type(record.INFO['SVEND']) == type([]):
-                        end = record.INFO['SVEND'][0]
-                    else:
-                        end = record.INFO['SVEND']
-                elif "END" in record.INFO.keys():
-                    if type(record.INFO['END']) == type([]):
-                        end = record.INFO['END'][0]
-                    else:
-                        end = record.INFO['END']
-                elif "SVLEN" in record.INFO.keys():
-                    end = record.POS + abs(SVLEN)
-                t = Event(record.CHROM, record.POS, record.CHROM, end,
-                          sv_type=SVTYPE,
-                          cp_flank=centerpointFlanking,
-                          dp=extractDPFromRecord(record),
-                          svmethod=svmethod)
-            except:
-                print("Unexpected error:", sys.exc_info()[0])
-                raise
+        Samples are added with `addSample` from a VCF file, a VCF reader (`SVReader`, `vcf.Reader`) or any iterable
+        of `Event`s. Iterating over the merger clusters all samples added so far and yields a `MergedCluster`
+        (virtualChr, event, members) for each event found in more than one sample, with the merged `event` as
+        reported in the merge reports and `members` the OrderedDict of sample -> `Event`. The clusters come
+        per virtualChr in natural order, ordered by position.
+
+        :param exclusion_regions: list of BED files with the regions to skip, applied to VCF input only
+        :param sizeFlanking: also match on size, see `startMerge`
+        :param breakends: match interchromosomal events on both breakends, see `startMerge`
+        :param processes: number of worker processes clustering the chromosomes
+        :param loadFilter: `LoadFilter` of the calls to load, applied to VCF input only
+        :param metrics: `Metrics` to record the time per phase and the counters of the merge in
+    """
+
+    def __init__(self, centerpointFlanking, exclusion_regions=None, transonly=False, exclusion_mate=False,
+                 sizeFlanking=None, breakends=False, processes=1, parser='native', loadFilter=None, metrics=None):
+        self.centerpointFlanking = centerpointFlanking
+        self.transonly = transonly
+        self.exclusion_mate = exclusion_mate
+        self.sizeFlanking = sizeFlanking
+        self.breakends = breakends
+        self.processes = processes
+        self.parser = parser
+        self.loadFilter = loadFilter
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.edb = loadExclusionRegions(exclusion_regions)
+        self.table = EventTable()
+        self.samples = []
+
+    def addSample(self, sample, source=None, svmethod=""):
+        """
+            Add the calls of one sample
+
+            :param sample: name of the sample, the path of the VCF file when `source` is None
+            :param source: VCF reader, or iterable of `Event`s which are added as given
+            :param svmethod: SV caller of the events, taken from the VCF header for VCF input
+        """
+        if sample in self.samples:
+            raise ValueError("Sample {} is already added".format(sample))
+        self.samples.append(sample)
+        with self.metrics.phase('load'):
+            if source is None:
+                vcf_reader, svmethod = openVCF(sample, self.parser, loadFilter=self.loadFilter)
+                self.addReader(sample, vcf_reader, svmethod)
+            elif hasattr(source, 'metadata'):
+                self.addReader(sample, source, svmethod or getSVCaller(source, sample))
             else:
-                svDB[t.virtualChr] = svDB.get(t.virtualChr, [])
-                svDB[t.virtualChr].append(t)
-        else:
-            # all other events not covered in this analysis, we only check the overlap
-            try:
-                if "SVEND" in record.INFO.keys():
-                    if type(record.INFO['SVEND']) == type([]):
-                        end = record.INFO['SVEND'][0]
-                    else:
-                        end = record.INFO['SVEND']
-                elif "END" in record.INFO.keys():
-                    if type(record.INFO['END']) == type([]):
-                        end = record.INFO['END'][0]
-                    else:
-                        end = record.INFO['END']
-                elif "SVLEN" in record.INFO.keys():
-                    end = record.POS + abs(SVLEN)
-                t = Event(record.CHROM, record.POS, record.CHROM, end,
-                          sv_type=SVTYPE,
-                          cp_flank=centerpointFlanking,
-                          dp=extractDPFromRecord(record),
-                          svmethod=svmethod)
-            except:
-                print("Unexpected error:", sys.exc_info()[0])
-                raise
+                n_events = 0
+                for t in source:
+                    self.table.append(t.chrA, t.chrApos, t.chrB, t.chrBpos, t.sv_type, t.dp, sample,
+                                      svmethod or t.svmethod)
+                    n_events += 1
+                self.metrics.count('events_loaded', n_events)
+
+    def addReader(self, sample, vcf_reader, svmethod=""):
+        loader = VCFEventLoader(vcf_reader, self.edb, self.centerpointFlanking, self.transonly, svmethod,
+                                self.exclusion_mate, self.loadFilter)
+        loader.loadTable(self.table, sample)
+        self.metrics.count('events_loaded', loader.n_events)
+        self.metrics.count('events_skipped', loader.skipped_events)
+        self.metrics.count('events_filtered', loader.n_filtered)
+        self.metrics.addTime('exclusion_lookup', loader.exclusion_seconds)
+
+    def __iter__(self):
+        clusterer = TableClusterer(self.table, self.centerpointFlanking, self.processes, self.sizeFlanking,
+                                   metrics=self.metrics, breakends=self.breakends)
+        for chromosome, hits in clusterer:
+            for items in sortedClusters(hits):
+                yield MergedCluster(''.join(chromosome), representativeEvent(items), items)
+
+    def __repr__(self):
+        return "<SVMerger {n} samples, {e} events>".format(n=len(self.samples), e=len(self.table))
+
+
+class ReportExport(object):
+    """
+        Writer of the merge reports: the TSV matrix of the clusters, the merged events as VCF and as BED tracks, and
+        the regions of all cluster members
+
+        The lines of each report are collected and written in batches through a large file buffer. The clusters of
+        a chromosome are written with `writeChromosome`, so reports can be written as each chromosome is complete.
+        Use as a context manager to close all reports.
+
+        Reports with a path ending in .gz are written BGZF compressed, using `threads` compression threads.
+        With `index` the compressed VCF and BED reports are sorted by position and get a tabix index, their records
+        are kept per contig until `finishContigs` or `close`.
+
+        :param metrics: `Metrics` to add the write time per chromosome to
+    """
+
+    def __init__(self, samplelist, output_file, bedoutput, vcf_output, regions_out, metrics=None,
+                 batch_lines=REPORT_BATCH_LINES, threads=1, index=False):
+        self.samplelist = samplelist
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.batch_lines = batch_lines
+        self.n_clusters = 0
+
+        self.files = []
+        try:
+            for path, preset in ((output_file, None), (vcf_output, 'vcf'), (bedoutput, 'bed'), (regions_out, None)):
+                self.files.append(openReport(path, preset if index else None, threads))
+        except:
+            self.close()
+            raise
+        self.tsv_lines, self.vcf_lines, self.bed_lines, self.regions_lines = self.lines = [[], [], [], []]
+        self.writeHeaders()
+
+    def writeHeaders(self):
+        self.vcf_lines.append(vcfHeader() + "\n")
+
+        samplecols = "\t".join(map(lambda x: "{}\tsize".format(os.path.basename(x).strip(".vcf")), self.samplelist))
+        header_line = "\t".join(['ChrA', 'ChrApos', 'ChrB', 'ChrBpos', 'SVTYPE', 'DP', 'Size', samplecols])
+        self.tsv_lines.append("{}\n".format(header_line))
+
+    def writeCluster(self, items):
+        """
+            Write one merged event to all reports
+
+            :param items: OrderedDict of sample -> `Event` found in that sample
+        """
+        # check which samples has the same
+        locations_found = []
+        for sample in self.samplelist:
+            hit = items.get(sample)
+            if hit is not None:
+                locations_found.append("{}\t{}".format(hit, hit.size))
+                # track all locations found for later intersecting or complementing the set of found/not-found
+                self.regions_lines.append(hit.bedRow + "\n")
             else:
-                svDB[t.virtualChr] = svDB.get(t.virtualChr, [])
-                svDB[t.virtualChr].append(t)
-    logger.info("Skipped {} events overlapping excluded regions.".format(skipped_events))
-    return svDB
+                locations_found.append("\t")
+        t = representativeEvent(items)
 
+        self.vcf_lines.append(formatVCFRecord(t) + "\n")
+        self.tsv_lines.append("\t".join(map(str, [t.chrA, t.chrApos, t.chrB, t.chrBpos, t.sv_type, t.dp, t.size] +
+                                             locations_found)) + "\n")
+        self.bed_lines.append(formatBedTrack(t))
+        self.n_clusters += 1
+        if len(self.tsv_lines) >= self.batch_lines:
+            self.flush()
 
-def startMerge(vcf_files, exclusion_regions, output_file, centerpointFlanking, bedoutput, transonly=False,
-               regions_out="regions_out.bed", vcf_output="output.vcf"):
-    regions_out_file = open(regions_out, "w")
-    vcf_output_file = open(vcf_output, "w")
+    def writeChromosome(self, virtualChr, hits):
+        """
+            Write the clusters of one chromosome ordered by position, and flush the reports
 
-    samplelist = vcf_files
+            :param hits: clusters of the chromosome as OrderedDict of cluster id -> items, see `writeCluster`
+        """
+        wall, cpu = time.time(), cpuTime()
+        for items in sortedClusters(hits):
+            if len(items):
+                self.writeCluster(items)
+        self.flush()
+        wall, cpu = time.time() - wall, cpuTime() - cpu
+        self.metrics.addTime('write', wall, cpu)
+        self.metrics.addChromosome(virtualChr, write_wall=wall)
+
+    def flush(self):
+        for fh, lines in zip(self.files, self.lines):
+            fh.writelines(lines)
+            del lines[:]
+
+    def finishContigs(self, contigs):
+        """
+            Write the sorted records of the contigs to the indexed reports, no more records of these may follow
+        """
+        self.flush()
+        for fh in self.files:
+            if isinstance(fh, SortedIndexedWriter):
+                fh.finishContigs(contigs)
+
+    def close(self):
+        if len(self.files) == 4:
+            self.flush()
+        for fh in self.files:
+            fh.close()
+        self.files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
-    sampleDB = collections.OrderedDict()
+    def __repr__(self):
+        return "<ReportExport {n} clusters>".format(n=self.n_clusters)
+
+
+def openReport(path, preset=None, threads=1):
+    """
+        Open a report for writing, BGZF compressed when the path ends in .gz
+
+        :param preset: tabix preset ('vcf' or 'bed') to sort and index the compressed report with, None to not index
+        :param threads: number of compression threads
+    """
+    if not path.endswith('.gz'):
+        return open(path, 'w', REPORT_BUFFER_SIZE)
+    if preset is not None:
+        return SortedIndexedWriter(path, preset, threads)
+    return BgzfWriter(path, threads)
+
+
+def loadEventFromVCF(s, vcf_reader, edb, centerpointFlanking, transonly, svmethod="", exclusion_mate=False,
+                     metrics=None, loadFilter=None):
+    """
+        Loading VCF records and transform them to `Event`, grouped per virtualChr
+
+        Not used by the merges, which load into an `EventTable`. Kept as public API for scripts working on the
+        `Event`s of one VCF file.
+
+        :param edb: `ExclusionIndex` with the regions to skip
+        :param exclusion_mate: also skip translocations of which the mate breakpoint is in an excluded region
+        :param metrics: `Metrics` to add the load time and event counters to
+        :param loadFilter: `LoadFilter` of the calls to load
+    """
+    if metrics is None:
+        metrics = Metrics()
     svDB = collections.OrderedDict()
+    loader = VCFEventLoader(vcf_reader, edb, centerpointFlanking, transonly, svmethod, exclusion_mate, loadFilter)
+    with metrics.phase('load'):
+        for t in loader:
+            svDB[t.virtualChr] = svDB.get(t.virtualChr, [])
+            svDB[t.virtualChr].append(t)
+    metrics.count('events_loaded', loader.n_events)
+    metrics.count('events_skipped', loader.skipped_events)
+    metrics.count('events_filtered', loader.n_filtered)
+    metrics.addTime('exclusion_lookup', loader.exclusion_seconds)
+    logger.info("Skipped {} events overlapping excluded regions.".format(loader.skipped_events))
+    return svDB
 
-    commonhits = collections.OrderedDict()
-    edb = []
+
+# settings of the loader in a worker process, set once by `initLoaderProcess`
+_loaderSettings = None
+
+
+def initLoaderProcess(edb, centerpointFlanking, transonly, exclusion_mate, parser, regions, cache=None,
+                      loadFilter=None):
+    global _loaderSettings
+    _loaderSettings = (edb, centerpointFlanking, transonly, exclusion_mate, parser, regions, cache, loadFilter)
+
+
+def loaderCacheSettings(edb, transonly, exclusion_mate, regions, loadFilter=None):
+    """
+        The loader settings which change the loaded events, part of the cache key
+    """
+    settings = {
+        'transonly': bool(transonly),
+        'exclusion_mate': bool(exclusion_mate),
+        'regions': regions and [list(region) for region in regions],
+        'exclusion': sorted([region.chromosome, region.start, region.end] for region in edb),
+    }
+    if loadFilter is not None:
+        settings['filters'] = loadFilter.settings()
+    return settings
+
+
+def loadCompactEventsFromVCF(s):
+    """
+        Load the events of one VCF file, in a worker process or after `initLoaderProcess`
+
+        When an `EventCache` is set the table is read from the cache if present, and stored otherwise.
+
+        :return: (s, sv_caller, stats, table) with the events in `EventTable` table, and a dict with the number of
+                 skipped and filtered events, the seconds of exclusion lookups and whether the events came from
+                 the cache
+    """
+    edb, centerpointFlanking, transonly, exclusion_mate, parser, regions, cache, loadFilter = _loaderSettings
+    key = None
+    if cache is not None:
+        key = cache.key(s, loaderCacheSettings(edb, transonly, exclusion_mate, regions, loadFilter))
+        cached = cache.load(key)
+        if cached is not None:
+            logger.info('Loaded SV-events of {} from cache'.format(s))
+            sv_caller, skipped_events, table = cached
+            return s, sv_caller, {'events_skipped': skipped_events, 'events_filtered': 0, 'exclusion_seconds': 0.,
+                                  'cached': 1}, table
+
+    vcf_reader, sv_caller = openVCF(s, parser, regions, loadFilter)
+    loader = VCFEventLoader(vcf_reader, edb, centerpointFlanking, transonly, sv_caller, exclusion_mate, loadFilter)
+
+    table = EventTable()
+    loader.loadTable(table, s)
+    if cache is not None:
+        cache.store(key, sv_caller, loader.skipped_events, table)
+    stats = {'events_skipped': loader.skipped_events, 'events_filtered': loader.n_filtered,
+             'exclusion_seconds': loader.exclusion_seconds, 'cached': 0}
+    return s, sv_caller, stats, table
+
+
+def loadExclusionRegions(exclusion_regions):
+    """
+        Build one `ExclusionIndex` from a list of BED files
+    """
+    edb = ExclusionIndex()
     if type(exclusion_regions) != type([]):
         exclusion_regions = []
     for exclusion_region in exclusion_regions:
-        edb += build_exclusion(exclusion_region)
+        edb.update(build_exclusion(exclusion_region))
+    return edb
+
+
+def openVCF(s, parser='native', regions=None, loadFilter=None):
+    """
+        Open a VCF file for reading, plain or BGZF compressed
+
+        :param parser: 'native' for the fast-path `SVReader`, 'pyvcf' for the full PyVCF reader.
+                       The native parser memory maps plain files read as a whole (`MmapSVReader`)
+        :param regions: only read the records overlapping these (contig, start, end) regions,
+                        using the tabix index when available
+        :param loadFilter: `LoadFilter` of which the raw check drops records before these are parsed
+        :return: (vcf_reader, sv_caller) with the SV caller extracted from the header
+    """
+    prefilter = loadFilter if loadFilter is not None and loadFilter.checksText else None
+    if parser == 'native' and not regions and os.path.getsize(s) > 0 and not isGzipped(s):
+        vcf_reader = MmapSVReader(s, prefilter=prefilter)
+    elif parser == 'native':
+        vcf_reader = SVReader(openRegions(s, regions), compressed=False, prefilter=prefilter)
+    else:
+        lines = openRegions(s, regions)
+        if prefilter is not None:
+            lines = FilteredLines(lines, prefilter)
+        vcf_reader = VCF_PARSERS[parser](lines, compressed=False)
+        if prefilter is not None:
+            vcf_reader.filtered_lines = lines
+
+    return vcf_reader, getSVCaller(vcf_reader, s)
+
+
+def getSVCaller(vcf_reader, s):
+    """
+        The SV caller from the source line of the VCF header, or the name of file `s` without one
+    """
+    return vcf_reader.metadata.get('source', [os.path.basename(s).strip('.vcf')]).pop(0).split(' ').pop(0)
+
+
+def imapBounded(pool, func, items, limit):
+    """
+        Ordered results of `func` on the items as `pool.imap`, with at most `limit` results pending, so the
+        workers can't run ahead of the consumer and pile up results in memory
+    """
+    pending = collections.deque()
+    for item in items:
+        if len(pending) >= limit:
+            yield pending.popleft().get()
+        pending.append(pool.apply_async(func, (item,)))
+    while pending:
+        yield pending.popleft().get()
+
+
+def loadSamples(table, vcf_files, loaderSettings, processes=1, metrics=None, spill=None):
+    """
+        Load the events of the VCF files into `EventTable` table, in the order of `vcf_files`
+
+        :param loaderSettings: arguments of `initLoaderProcess`
+        :param processes: number of worker processes parsing the files, at most this many loaded files wait to be
+                          added to the table
+        :param metrics: `Metrics` to add the event counters and exclusion lookup time to
+        :param spill: `EventSpill` the table is spilled to, and emptied, whenever it reaches the memory budget after
+                      a file is loaded
+    """
+    if metrics is None:
+        metrics = Metrics()
+    progress = metrics.progress('Loaded VCF files', len(vcf_files))
+    if processes > 1:
+        # parse the files in a worker pool, the events come back as compact tables
+        pool = multiprocessing.Pool(processes, initLoaderProcess, loaderSettings)
+        loaded = imapBounded(pool, loadCompactEventsFromVCF, vcf_files, processes)
+    else:
+        pool = None
+        initLoaderProcess(*loaderSettings)
+        loaded = (loadCompactEventsFromVCF(s) for s in vcf_files)
+    try:
+        for s, sv_caller, stats, sampleTable in loaded:
+            logger.info('Reading SV-events from sample: {} '.format(s))
+            table.extend(sampleTable)
+            logger.info("Skipped {} events overlapping excluded regions.".format(stats['events_skipped']))
+            logger.info('Loaded SV-events from sample: {} '.format(len(sampleTable)))
+            metrics.count('events_loaded', len(sampleTable))
+            metrics.count('events_skipped', stats['events_skipped'])
+            metrics.count('events_filtered', stats['events_filtered'])
+            metrics.count('files_cached', stats['cached'])
+            # summed over the worker processes
+            metrics.addTime('exclusion_lookup', stats['exclusion_seconds'])
+            if spill is not None and spill.full(table):
+                metrics.count('events_spilled', len(table))
+                spill.spill(table)
+            progress.update()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return table
+
+
+class TableClusterer(object):
+    """
+        Cluster the events of all samples in an `EventTable`
+
+        Iterating over the clusterer yields (chromosome, hits) for every (chrA, chrB) chromosome in the order of
+        `chromosomeKey`, with the reported clusters of the chromosome as OrderedDict of cluster label -> items, see
+        `ReportExport.writeCluster`.
+        The cluster label of each row and the first unused label are kept on the clusterer once it is exhausted.
+
+        :param sizeFlanking: also match on size, see `startMerge`
+        :param state: `MergeState` of which the rows are the first rows of `table`, only the other rows are linked in
+        :param metrics: `Metrics` to add the comparison counters and the clustering time per chromosome to
+        :param breakends: match interchromosomal events on both breakends, see `startMerge`
+        :param pool: `multiprocessing.Pool` of `processes` workers to cluster in, left open. Without it the
+                     clusterer starts a pool of its own.
+    """
 
+    def __init__(self, table, centerpointFlanking, processes=1, sizeFlanking=None, state=None, metrics=None,
+                 breakends=False, pool=None):
+        self.table = table
+        self.centerpointFlanking = centerpointFlanking
+        self.processes = processes
+        self.sizeFlanking = sizeFlanking
+        self.breakends = breakends
+        self.state = state
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.pool = pool
+
+        # the cluster label of every row, kept in the merge state
+        self.rowLabels = array.array('l', [-1] * len(table))
+        self.next_label = state.next_label if state is not None else 0
+
+    def completedContigs(self):
+        """
+            The contigs of which all events are clustered after each chromosome
+
+            :return: dict of (chrA, chrB) chromosome -> contigs of which it is the last chromosome with events
+        """
+        lastChromosome = {}
+        for chromosome in sorted(self.table.partitions().keys(), key=chromosomeKey):
+            for contig in chromosome:
+                lastChromosome[contig] = chromosome
+        completes = {}
+        for contig, chromosome in lastChromosome.items():
+            completes.setdefault(chromosome, []).append(contig)
+        return completes
+
+    def partitions(self):
+        """
+            The partitions of the table to cluster, in chromosome order
+
+            :return: (partitions, partitionRows) with the arguments of `clusterPartition` or `updateLabels` per
+                     partition, and the table rows of each partition by (chromosome, start)
+        """
+        table, state = self.table, self.state
+        centerpointFlanking, sizeFlanking = self.centerpointFlanking, self.sizeFlanking
+        # the calls of all samples per chromosome form one stream sorted by centerpoint, tagged with the sample.
+        # Each stream is cut in partitions which are clustered independently, shipped as compact arrays.
+        partitions = []
+        partitionRows = {}
+        for chromosome, rows in sorted(table.partitions().items(), key=lambda partition: chromosomeKey(partition[0])):
+            centerpoints = array.array('l', [table.centerpoint[row] for row in rows])
+            if state is not None:
+                # the rows of the state keep their cluster, only the new rows are linked in
+                partitionRows[(chromosome, 0)] = rows
+                samples = array.array('i', [table.sample[row] for row in rows])
+                labels = array.array('l', [state.labels[row] if row < len(state.labels) else -1 for row in rows])
+                partitions.append(((chromosome, 0), centerpoints, samples, labels))
+                continue
+            if self.breakends and table.chrA[rows[0]] != table.chrB[rows[0]]:
+                # gaps between centerpoints don't separate translocations matched on both breakends
+                partitionRows[(chromosome, 0)] = rows
+                samples = array.array('i', [table.sample[row] for row in rows])
+                positions = (array.array('l', [table.posA[row] for row in rows]),
+                             array.array('l', [table.posB[row] for row in rows]))
+                partitions.append(((chromosome, 0), centerpoints, samples, centerpointFlanking, None, None,
+                                   positions))
+                continue
+            for start, end in splitAtGaps(centerpoints, centerpointFlanking, PARTITION_SIZE):
+                key = (chromosome, start)
+                partitionRows[key] = rows[start:end]
+                samples = array.array('i', [table.sample[row] for row in rows[start:end]])
+                sizes = None
+                if sizeFlanking is not None:
+                    sizes = array.array('l', [table.size[row] for row in rows[start:end]])
+                partitions.append((key, centerpoints[start:end], samples, centerpointFlanking, sizes, sizeFlanking,
+                                   None))
+        return partitions, partitionRows
+
+    def __iter__(self):
+        table, metrics = self.table, self.metrics
+        partitions, partitionRows = self.partitions()
+
+        pool = None
+        if self.state is not None:
+            clustered = self._updatePartitions(partitions)
+        elif self.processes > 1:
+            logger.info('Clustering {} partitions using {} processes'.format(len(partitions), self.processes))
+            if self.pool is not None:
+                clustered = self.pool.imap(clusterPartition, partitions)
+            else:
+                pool = multiprocessing.Pool(self.processes)
+                clustered = pool.imap(clusterPartition, partitions)
+        else:
+            clustered = map(clusterPartition, partitions)
+
+        progress = metrics.progress('Clustered partitions', len(partitions))
+        previous = None
+        hits = None
+        try:
+            for (_chromosome, start), clusters, labels, stats in clustered:
+                # the partitions come in chromosome order, the previous chromosome is complete
+                if _chromosome != previous:
+                    if previous is not None:
+                        yield previous, hits
+                    previous = _chromosome
+                    hits = collections.OrderedDict()
+                rows = partitionRows.pop((_chromosome, start))
+                metrics.count('partitions')
+                metrics.count('clusters', len(clusters))
+                metrics.count('comparisons', stats['comparisons'])
+                metrics.count('matches', stats['matches'])
+                metrics.addChromosome(''.join(_chromosome), events=len(labels), partitions=1, clusters=len(clusters),
+                                      comparisons=stats['comparisons'], matches=stats['matches'],
+                                      match_wall=stats['wall'], match_cpu=stats['cpu'])
+                progress.update()
+                if self.state is None:
+                    # labels are numbered per partition
+                    offset = self.next_label
+                    self.next_label += max(labels) + 1 if len(labels) else 0
+                else:
+                    offset = 0
+                for k, label in enumerate(labels):
+                    self.rowLabels[rows[k]] = offset + label
+
+                for members in clusters:
+                    # the cluster is identified by its label
+                    label = self.rowLabels[rows[members[0]]]
+                    items = collections.OrderedDict()
+                    for k in members:
+                        t = table.event(rows[k], self.centerpointFlanking)
+                        t.matched_in = label
+                        items[table.samples[table.sample[rows[k]]]] = t
+                    hits[label] = items
+                logger.debug("Common hits in {} from {}: {}".format(''.join(_chromosome), start, len(clusters)))
+            if previous is not None:
+                yield previous, hits
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    def _updatePartitions(self, partitions):
+        for key, centerpoints, samples, labels in partitions:
+            stats = {}
+            wall, cpu = time.time(), cpuTime()
+            labels, self.next_label = updateLabels(centerpoints, samples, labels, self.centerpointFlanking,
+                                                   self.next_label, stats)
+            clusters = clustersFromLabels(labels, samples)
+            stats['wall'], stats['cpu'] = time.time() - wall, cpuTime() - cpu
+            yield key, clusters, labels, stats
+
+
+def clusterTable(table, centerpointFlanking, processes=1, sizeFlanking=None, state=None, metrics=None,
+                 export=None, breakends=False):
+    """
+        Cluster the events of all samples in `table`, see `TableClusterer`
+
+        :param export: `ReportExport` to write the clusters of each chromosome to as soon as it is clustered,
+                       these are then not kept in the returned commonhits
+        :return: (commonhits, rowLabels, next_label) with the reported clusters per (chrA, chrB) chromosome as
+                 OrderedDict of cluster label -> items, the cluster label of each row and the first unused label
+    """
+    commonhits = collections.OrderedDict()
+    clusterer = TableClusterer(table, centerpointFlanking, processes, sizeFlanking, state, metrics, breakends)
+    completes = clusterer.completedContigs() if export is not None else {}
+    for chromosome, hits in clusterer:
+        if export is None:
+            if hits:
+                commonhits[chromosome] = hits
+            continue
+        if hits:
+            export.writeChromosome(''.join(chromosome), hits)
+        if chromosome in completes:
+            export.finishContigs(natsorted(completes[chromosome]))
+    return commonhits, clusterer.rowLabels, clusterer.next_label
+
+
+def clusterSpill(spill, centerpointFlanking, processes=1, sizeFlanking=None, metrics=None, export=None,
+                 breakends=False):
+    """
+        Cluster the spilled events chromosome by chromosome, only the events of one chromosome are loaded at a time
+
+        :param spill: `EventSpill` with all events
+        :return: commonhits as returned by `clusterTable`
+    """
+    commonhits = collections.OrderedDict()
+    completes = spill.completedContigs() if export is not None else {}
+    next_label = 0
+    # one worker pool for all chromosomes
+    pool = multiprocessing.Pool(processes) if processes > 1 else None
+    try:
+        for chromosome in spill.chromosomes():
+            clusterer = TableClusterer(spill.load(chromosome), centerpointFlanking, processes, sizeFlanking,
+                                       metrics=metrics, breakends=breakends, pool=pool)
+            # the labels are numbered over all chromosomes
+            clusterer.next_label = next_label
+            # the table of one chromosome
+            for _, hits in clusterer:
+                if export is None:
+                    if hits:
+                        commonhits[chromosome] = hits
+                    continue
+                if hits:
+                    export.writeChromosome(''.join(chromosome), hits)
+            if chromosome in completes:
+                export.finishContigs(natsorted(completes[chromosome]))
+            next_label = clusterer.next_label
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return commonhits
+
+
+def writeReports(commonhits, samplelist, output_file, bedoutput, vcf_output, regions_out, metrics=None):
+    """
+        Write the clusters of `clusterTable` to the reports, ordered by chromosome and position
+
+        :param metrics: `Metrics` to add the write time per chromosome to
+    """
+    with ReportExport(samplelist, output_file, bedoutput, vcf_output, regions_out, metrics) as export:
+        for chromosome in sorted(commonhits.keys(), key=chromosomeKey):
+            export.writeChromosome(''.join(chromosome), commonhits[chromosome])
+
+
+def startMerge(vcf_files, exclusion_regions, output_file, centerpointFlanking, bedoutput, transonly=False,
+               regions_out="regions_out.bed", vcf_output="output.vcf", exclusion_mate=False, processes=1,
+               parser='native', regions=None, cache_dir=None, cache_size=DEFAULT_CACHE_SIZE, append_to=None,
+               sizeFlanking=None, metrics=None, index=False, breakends=False, loadFilter=None, max_memory=None,
+               spill_dir=None):
+    """
+        Merge the VCF files in memory
+
+        Reports with a path ending in .gz are written BGZF compressed using `processes` threads. With `index`
+        the compressed VCF and BED reports are sorted by position and indexed with tabix.
+
+        :param sizeFlanking: also require the sizes of matching events to be at most this far apart,
+                             events are then matched on a grid of centerpoint and size
+        :param breakends: match interchromosomal events when both breakends are at most `centerpointFlanking` apart,
+                          instead of on the centerpoint between the contigs. The events are looked up in a grid of
+                          the positions of both breakends.
+        :param append_to: merge state file, written after the merge. When it exists the VCF files are added to the
+                          samples of the state, which are not loaded again, and the reports cover all samples.
+        :param metrics: `Metrics` to record the time per phase and the counters of the merge in
+        :param loadFilter: `LoadFilter` of the calls to load. Its raw check drops records before these are
+                           parsed, the other calls are dropped before an `Event` is made.
+        :param max_memory: memory budget of the loaded events in bytes. When the events outgrow it these are
+                           spilled to sorted runs per chromosome in a temporary directory in `spill_dir`, and matched
+                           one chromosome at a time, see `EventSpill`. The reports are the same. The budget is
+                           checked after each loaded file, the events of the files being loaded, at most one per
+                           process, come on top of it.
+    """
+    if metrics is None:
+        metrics = Metrics()
+    if append_to is not None and max_memory is not None:
+        raise ValueError("A merge state can't be used with a memory budget")
+    with metrics.phase('exclusion_regions'):
+        edb = loadExclusionRegions(exclusion_regions)
+
+    settings = loaderCacheSettings(edb, transonly, exclusion_mate, regions, loadFilter)
+    settings['flanking'] = centerpointFlanking
+
+    if append_to is not None and sizeFlanking is not None:
+        raise ValueError("A merge state can't be used with matching on size")
+    if append_to is not None and breakends:
+        raise ValueError("A merge state can't be used with matching on breakends")
+
+    state = None
+    if append_to is not None and os.path.exists(append_to):
+        with metrics.phase('state'):
+            state = MergeState.load(append_to)
+        if state.settings != settings:
+            raise ValueError("Merge state {} was made with other settings: {}".format(append_to, state.settings))
+        merged = set(state.samples).intersection(vcf_files)
+        if merged:
+            raise ValueError("Samples already in merge state {}: {}".format(append_to, ", ".join(sorted(merged))))
+        logger.info('Adding {} samples to the {} samples of {}'.format(len(vcf_files), len(state.samples),
+                                                                          append_to))
+
+    # all calls are kept in one columnar table, `Event` objects are only created for the merged events
+    if state is not None:
+        table = state.table
+        samplelist = list(state.samples) + list(vcf_files)
+    else:
+        table = EventTable()
+        samplelist = vcf_files
+    cache = None
+    if cache_dir is not None:
+        cache = EventCache(cache_dir, cache_size)
+
+    loaderSettings = (edb, centerpointFlanking, transonly, exclusion_mate, parser, regions, cache, loadFilter)
+    spill = EventSpill(max_memory, spill_dir) if max_memory is not None else None
+    try:
+        with metrics.phase('load'):
+            loadSamples(table, vcf_files, loaderSettings, processes, metrics, spill)
+            if spill is not None and spill.n_runs:
+                # the remaining events as the last run, all events are then matched from the spill
+                metrics.count('events_spilled', len(table))
+                spill.spill(table)
+
+        # the clusters are written per chromosome while clustering, the 'match' phase includes the 'write' time
+        with ReportExport(samplelist, output_file, bedoutput, vcf_output, regions_out, metrics, threads=processes,
+                          index=index) as export:
+            with metrics.phase('match'):
+                if spill is not None and spill.n_runs:
+                    clusterSpill(spill, centerpointFlanking, processes, sizeFlanking, metrics, export, breakends)
+                else:
+                    commonhits, rowLabels, next_label = clusterTable(table, centerpointFlanking, processes,
+                                                                     sizeFlanking, state, metrics, export, breakends)
+    finally:
+        if spill is not None:
+            spill.close()
+
+    if append_to is not None:
+        with metrics.phase('state'):
+            MergeState(table, rowLabels, settings, next_label).dump(append_to)
+        logger.info('Wrote merge state of {} samples to {}'.format(len(samplelist), append_to))
+
+
+def contigKeygen(contigs):
+    """
+        Sort key function of contig names following the order of `contigs`, the contigs of the VCF headers.
+        Contigs without header line are ordered naturally after those.
+    """
+    contig_rank = dict((contig, rank) for rank, contig in enumerate(contigs))
+    natural_key = natsort_keygen()
+
+    def contigKey(contig):
+        return contig_rank.get(contig, len(contig_rank)), natural_key(contig)
+    return contigKey
+
+
+def startStreamingMerge(vcf_files, exclusion_regions, output_file, centerpointFlanking, bedoutput,
+                        transonly=False, regions_out="regions_out.bed", vcf_output="output.vcf", exclusion_mate=False,
+                        parser='native', regions=None, metrics=None, processes=1, index=False, breakends=False,
+                        loadFilter=None):
+    """
+        Merge coordinate sorted VCF files in a single streaming pass
+
+        All readers are walked together in a k-way merge by (contig, centerpoint), only the events within
+        reach of the sweep window are kept in memory. Merged events are written as soon as the window passed them.
+        Interchromosomal events can't be ordered along one contig, these are kept aside and merged at the end.
+
+        :param metrics: `Metrics` to record the time per phase and chromosome and the counters of the merge in.
+                        Loading, matching and writing are interleaved, these are timed together as 'merge'.
+        :param processes: number of threads compressing .gz reports
+        :param index: sort and index the compressed VCF and BED reports, see `startMerge`. The records are kept in
+                      memory until the end of the merge.
+        :param breakends: match interchromosomal events on both breakends, see `startMerge`
+        :param loadFilter: `LoadFilter` of the calls to load, see `startMerge`
+    """
+    if metrics is None:
+        metrics = Metrics()
+    samplelist = vcf_files
+    with metrics.phase('exclusion_regions'):
+        edb = loadExclusionRegions(exclusion_regions)
+
+    loaders = []
+    contigs = []
     for s in samplelist:
         logger.info('Reading SV-events from sample: {} '.format(s))
-        sampleDB[s] = vcf.Reader(open(s, 'r'))
-
-        # extract SV caller from header
-        sv_caller = sampleDB[s].metadata.get('source', [os.path.basename(s).strip('.vcf')]).pop(0).split(' ').pop(0)
-
-        svDB[s] = loadEventFromVCF(s, sampleDB[s], edb, centerpointFlanking, transonly, sv_caller)
-        n_events = sum([len(calls) for chromlist, calls in svDB[s].items()])
-        logger.info('Loaded SV-events from sample: {} '.format(n_events))
-
-    pairs_to_check = itertools.combinations(svDB.keys(), 2)
-    # collect all chromosomes seen:
-    chromosomes_to_check = []
-    for sample in svDB.keys():
-        chromosomes_to_check += svDB[sample].keys()
-
-    chromosomes_to_check = list(set(chromosomes_to_check))
-    chromosomes_to_check.sort()
-
-    for (s1, s2) in pairs_to_check:
-        _s1 = os.path.basename(s1)
-        _s2 = os.path.basename(s2)
-        logger.debug('Pairwise compare: {} x {}'.format(_s1, _s2))
-        for _chromosome in chromosomes_to_check:
-            s1_calls_in_chromosome = svDB[s1].get(_chromosome, [])
-            s2_calls_in_chromosome = svDB[s2].get(_chromosome, [])
-            s1_n_calls = len(s1_calls_in_chromosome)
-            s2_n_calls = len(s2_calls_in_chromosome)
-
-            _match = 0
-
-            for i, t1 in enumerate(s1_calls_in_chromosome):
-                for j, t2 in enumerate(s2_calls_in_chromosome):
-                    if not (t1 and t2):
-                        continue
-                    if t1 == t2:
-                        # determine the object with the most DP and size
-                        if t1.size >= t2.size:
-                            _m = t1
-                        else:
-                            _m = t2
+        vcf_reader, sv_caller = openVCF(s, parser, regions, loadFilter)
+        for contig in vcf_reader.contigs.keys():
+            if contig not in contigs:
+                contigs.append(contig)
+        loaders.append(VCFEventLoader(vcf_reader, edb, centerpointFlanking, transonly, sv_caller, exclusion_mate,
+                                      loadFilter))
 
-                        # get the hashes from all hits, check weither one of them was already evaluated and thus in the table
+    contigKey = contigKeygen(contigs)
+    translocations = collections.OrderedDict()
 
-                        if t1.matched_in or t2.matched_in:
-                            m = t1.matched_in or t2.matched_in
-                        else:
-                            m = _m.hexdigest
+    def intrachromosomal(sample, loader):
+        for t in loader:
+            if t.chrA != t.chrB:
+                chromosome = (t.chrA, t.chrB)
+                translocations[chromosome] = translocations.get(chromosome, [])
+                translocations[chromosome].append((t.centerpoint, sample, t))
+            else:
+                yield t
 
-                        t1.matched_in = m
-                        t2.matched_in = m
+    streams = [intrachromosomal(s, loader) for s, loader in zip(samplelist, loaders)]
 
-                        # TODO: write getter method for the Event instead now by accessing the internal class variable
-                        virtualchrom = _m.virtualChr
+    export = ReportExport(samplelist, output_file, bedoutput, vcf_output, regions_out, metrics, threads=processes,
+                          index=index)
 
-                        # split out per chromosome storage
-                        commonhits[virtualchrom] = commonhits.get(virtualchrom, collections.OrderedDict())
-                        commonhits[virtualchrom][m] = commonhits[virtualchrom].get(m, collections.OrderedDict())
-                        commonhits[virtualchrom][m][s1] = t1
-                        commonhits[virtualchrom][m][s2] = t2
-                        _match += 1
+    def report(clusters):
+        for cluster in clusters:
+            items = clusterMembers(cluster)
+            if len(items) > 1:
+                export.writeCluster(items)
+        export.flush()
 
-                        # when found, continue? It is the best approach to break this long list comparison?
-                        break
-            logger.debug("Common hits so far in {}: {} / {} vs {}".format(_chromosome, _match, s1_n_calls, s2_n_calls))
+    def mergeChromosome(virtualChr, entries, clusters=iterClusters):
+        stats = {}
+        wall, cpu = time.time(), cpuTime()
+        report(clusters(entries, centerpointFlanking, stats))
+        metrics.count('comparisons', stats['comparisons'])
+        metrics.count('matches', stats['matches'])
+        metrics.addChromosome(virtualChr, comparisons=stats['comparisons'], matches=stats['matches'],
+                              wall=time.time() - wall, cpu=cpuTime() - cpu)
+        progress.update()
 
-    # vcf header
-    print(vcfHeader(), file=vcf_output_file)
+    progress = metrics.progress('Merged chromosomes', None)
+    with export:
+        with metrics.phase('merge'):
+            sortedEvents = iterSortedEvents(streams, contigKey)
+            for virtualChr, events in itertools.groupby(sortedEvents, key=lambda hit: hit[1].virtualChr):
+                logger.debug('Streaming merge of: {}'.format(virtualChr))
+                mergeChromosome(virtualChr, ((t.centerpoint, samplelist[i], t) for i, t in events))
 
-    # tsv file
-    samplecols = "\t".join(map(lambda x: "{}\tsize".format(os.path.basename(x).strip(".vcf")), samplelist))
-    header_line = "\t".join(['ChrA', 'ChrApos', 'ChrB', 'ChrBpos', 'SVTYPE', 'DP', 'Size', samplecols])
+        with metrics.phase('translocations'):
+            for chromosome in sorted(translocations.keys(), key=chromosomeKey):
+                mergeChromosome(''.join(chromosome), sorted(translocations[chromosome], key=lambda hit: hit[0]),
+                                iterBreakendClusters if breakends else iterClusters)
 
-    tsv_report_output = open(output_file, 'w')
-    tsv_report_output.write("{}\n".format(header_line))
+    for s, loader in zip(samplelist, loaders):
+        logger.info("Skipped {} events overlapping excluded regions in: {}".format(loader.skipped_events, s))
+        logger.info('Loaded SV-events from sample: {} '.format(loader.n_events))
+        metrics.count('events_loaded', loader.n_events)
+        metrics.count('events_skipped', loader.skipped_events)
+        metrics.count('events_filtered', loader.n_filtered)
+        metrics.addTime('exclusion_lookup', loader.exclusion_seconds)
 
-    bed_structural_events = open(bedoutput, 'w')
-    all_locations = []
 
-    for virtualChr in natsorted(commonhits.keys()):
-        for s, items in sorted(commonhits[virtualChr].items(), key=lambda hit: hit[1].items()[0][1].chrApos):
-            if len(items):
-                # check which samples has the same
-                locations_found = []
-                for sample in samplelist:
-                    if sample in items.keys():
-                        locations_found.append("{}\t{}".format(items[sample], items[sample].size))
-                        # track all locations found for later intersecting or complementing the set of found/not-found
-                        all_locations.append(items[sample])
-                    else:
-                        locations_found.append("\t")
-                # get the key with the highest DP
-                sorted_by_dp = sorted(items.items(), key=lambda hit: hit[1].dp, reverse=True)
-                fKey = sorted_by_dp[0][0]
-                t = items[fKey]
+class ReportWriter(threading.Thread):
+    """
+        Thread writing the clusters of a pipelined merge to a `ReportExport`
 
-                print(formatVCFRecord(t), file=vcf_output_file)
+        `put` queues the clusters of one chromosome and blocks while `queue_size` chromosomes are waiting to be
+        written. An error of the writer is raised by the next `put` or by `close`, the time spent writing is kept
+        in `seconds`.
+    """
 
-                tsv_report_output.write("{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\n".format(
-                    t.chrA,
-                    t.chrApos,
-                    t.chrB,
-                    t.chrBpos,
-                    t.sv_type,
-                    t.dp,
-                    t.size,
-                    "\t".join(locations_found)))
-                bed_structural_events.write(formatBedTrack(t))
+    def __init__(self, export, queue_size=PIPELINE_QUEUE_SIZE):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.export = export
+        self.queue = queue.Queue(queue_size)
+        self.error = None
+        self.seconds = 0.
 
-    for loc in all_locations:
-        print(loc.bedRow, file=regions_out_file)
+    def put(self, clusters):
+        """
+            :param clusters: list of the clusters to write, as items for `ReportExport.writeCluster`
+        """
+        if self.error is not None:
+            raise self.error
+        self.queue.put(clusters)
 
-    tsv_report_output.close()
-    regions_out_file.close()
+    def run(self):
+        while True:
+            clusters = self.queue.get()
+            if clusters is None:
+                break
+            if self.error is not None:
+                # keep taking the clusters after an error, so `put` doesn't block
+                continue
+            start = time.time()
+            try:
+                for items in clusters:
+                    self.export.writeCluster(items)
+                self.export.flush()
+            except Exception as e:
+                self.error = e
+            self.seconds += time.time() - start
+
+    def close(self, raiseError=True):
+        """
+            Write the queued clusters and stop the thread
+
+            :param raiseError: raise the error of the writer, off while another error is raised
+        """
+        self.queue.put(None)
+        self.join()
+        if raiseError and self.error is not None:
+            raise self.error
+
+
+def readContigBatches(worker, vcf_files, contigs, loaderSettings, batches):
+    """
+        Reader process of `startPipelinedMerge`, loading coordinate sorted VCF files contig by contig
+
+        The files are read side by side in the contig order of `contigKeygen(contigs)`. When all files are past a
+        contig, ('batch', worker, contig, table, nextContig) is put on `batches`, with the events of the contig in
+        an `EventTable` in the order of `vcf_files` and the contig the files continue with (None at the end).
+        The interchromosomal events are put at the end as ('done', worker, table, stats), an error is put as
+        ('error', worker, exception).
+
+        :param loaderSettings: (edb, centerpointFlanking, transonly, exclusion_mate, parser, regions, loadFilter)
+        :param batches: bounded `multiprocessing.Queue`, which blocks the reader while the matching lags behind
+    """
+    try:
+        edb, centerpointFlanking, transonly, exclusion_mate, parser, regions, loadFilter = loaderSettings
+        contigKey = contigKeygen(contigs)
+        loaders = []
+        for s in vcf_files:
+            vcf_reader, sv_caller = openVCF(s, parser, regions, loadFilter)
+            loaders.append(VCFEventLoader(vcf_reader, edb, centerpointFlanking, transonly, sv_caller, exclusion_mate,
+                                          loadFilter))
+        calls = [loader.iterCalls() for loader in loaders]
+        translocations = EventTable()
+
+        def nextCall(i):
+            # the next intrachromosomal call of file i, the interchromosomal calls are kept aside
+            for chrA, chrApos, chrB, chrBpos, sv_type, dp in calls[i]:
+                if chrA == chrB:
+                    return chrA, chrApos, chrB, chrBpos, sv_type, dp
+                translocations.append(chrA, chrApos, chrB, chrBpos, sv_type, dp, vcf_files[i], loaders[i].svmethod)
+            return None
+
+        heads = [nextCall(i) for i in range(len(calls))]
+        contig = previous = None
+        if any(heads):
+            contig = min((head[0] for head in heads if head is not None), key=contigKey)
+        while contig is not None:
+            if previous is not None and contigKey(contig) <= contigKey(previous):
+                unsorted = [s for s, head in zip(vcf_files, heads) if head is not None and head[0] == contig]
+                raise ValueError("Input {} is not coordinate sorted at contig {}".format(unsorted[0], contig))
+            table = EventTable()
+            for i, s in enumerate(vcf_files):
+                while heads[i] is not None and heads[i][0] == contig:
+                    chrA, chrApos, chrB, chrBpos, sv_type, dp = heads[i]
+                    table.append(chrA, chrApos, chrB, chrBpos, sv_type, dp, s, loaders[i].svmethod)
+                    heads[i] = nextCall(i)
+            previous, contig = contig, None
+            if any(heads):
+                contig = min((head[0] for head in heads if head is not None), key=contigKey)
+            batches.put(('batch', worker, previous, table, contig))
+
+        stats = {'events_loaded': 0, 'events_skipped': 0, 'events_filtered': 0, 'exclusion_seconds': 0.}
+        for s, loader in zip(vcf_files, loaders):
+            logger.info("Skipped {} events overlapping excluded regions in: {}".format(loader.skipped_events, s))
+            logger.info('Loaded SV-events from sample: {} '.format(loader.n_events))
+            stats['events_loaded'] += loader.n_events
+            stats['events_skipped'] += loader.skipped_events
+            stats['events_filtered'] += loader.n_filtered
+            stats['exclusion_seconds'] += loader.exclusion_seconds
+        batches.put(('done', worker, translocations, stats))
+    except Exception as e:
+        logger.exception('Reading SV-events failed')
+        batches.put(('error', worker, e))
+
+
+def startPipelinedMerge(vcf_files, exclusion_regions, output_file, centerpointFlanking, bedoutput,
+                        transonly=False, regions_out="regions_out.bed", vcf_output="output.vcf", exclusion_mate=False,
+                        parser='native', regions=None, metrics=None, processes=1, index=False, breakends=False,
+                        loadFilter=None, queue_size=PIPELINE_QUEUE_SIZE):
+    """
+        Merge coordinate sorted VCF files in a pipeline of loading, matching and writing
+
+        `processes` reader processes each load a share of the files side by side and pass the events of a contig
+        on as soon as all their files are past it, see `readContigBatches`. A contig is matched in this process as
+        soon as all readers passed it, while a writer thread writes the clusters of the previous contigs. The
+        queues between the stages hold at most `queue_size` batches, a reader waits while the matching lags behind
+        and the matching waits for the writer. Interchromosomal events are merged at the end. The reports are
+        those of `startStreamingMerge`.
+
+        :param metrics: `Metrics` to record the time per phase and chromosome and the counters of the merge in.
+                        Loading, matching and writing overlap, these are timed together as 'merge'.
+        :param processes: number of reader processes, and of threads compressing .gz reports
+        :param index: sort and index the compressed VCF and BED reports, see `startMerge`
+        :param breakends: match interchromosomal events on both breakends, see `startMerge`
+        :param loadFilter: `LoadFilter` of the calls to load, see `startMerge`
+    """
+    if metrics is None:
+        metrics = Metrics()
+    samplelist = vcf_files
+    with metrics.phase('exclusion_regions'):
+        edb = loadExclusionRegions(exclusion_regions)
+
+    # the contigs of the headers, the records are read by the reader processes
+    contigs = []
+    for s in samplelist:
+        with openText(s) as fh:
+            for contig in vcf.Reader(fh, compressed=False).contigs.keys():
+                if contig not in contigs:
+                    contigs.append(contig)
+    contigKey = contigKeygen(contigs)
+    # sort keys before the first and after the last contig
+    first, last = (-1,), (len(contigs) + 1,)
+
+    # each reader loads a consecutive share of the samples, so the batches of a contig are in sample order
+    n_readers = max(1, min(processes, len(samplelist)))
+    loaderSettings = (edb, centerpointFlanking, transonly, exclusion_mate, parser, regions, loadFilter)
+    queues = [multiprocessing.Queue(queue_size) for w in range(n_readers)]
+    readers = [multiprocessing.Process(target=readContigBatches,
+                                       args=(w, samplelist[w * len(samplelist) // n_readers:
+                                                           (w + 1) * len(samplelist) // n_readers],
+                                             contigs, loaderSettings, queues[w]))
+               for w in range(n_readers)]
+    for reader in readers:
+        reader.daemon = True
+
+    def stopReaders():
+        for reader in readers:
+            if reader.is_alive():
+                reader.terminate()
+            reader.join()
+
+    def receive(w):
+        while True:
+            try:
+                message = queues[w].get(timeout=PIPELINE_POLL_SECONDS)
+            except queue.Empty:
+                if not readers[w].is_alive() and queues[w].empty():
+                    raise RuntimeError("Reader process {} stopped unexpectedly".format(w))
+                continue
+            if message[0] == 'error':
+                raise message[2]
+            return message
+
+    def mergeChromosome(table, clusters=iterClusters):
+        partitions = table.partitions()
+        for chromosome in sorted(partitions.keys(), key=chromosomeKey):
+            stats = {}
+            wall, cpu = time.time(), cpuTime()
+            entries = ((table.centerpoint[k], table.samples[table.sample[k]], table.event(k, centerpointFlanking))
+                       for k in partitions[chromosome])
+            found = []
+            for cluster in clusters(entries, centerpointFlanking, stats):
+                items = clusterMembers(cluster)
+                if len(items) > 1:
+                    found.append(items)
+            writer.put(found)
+            metrics.count('comparisons', stats['comparisons'])
+            metrics.count('matches', stats['matches'])
+            metrics.addChromosome(''.join(chromosome), comparisons=stats['comparisons'], matches=stats['matches'],
+                                  wall=time.time() - wall, cpu=cpuTime() - cpu)
+            progress.update()
+
+    def combine(batches):
+        table = EventTable()
+        for w, batch in sorted(batches, key=lambda batch: batch[0]):
+            table.extend(batch)
+        return table
+
+    progress = metrics.progress('Merged chromosomes', None)
+    # key of the contig each reader is at, the batches per contig and the interchromosomal events per reader
+    passed = [first] * n_readers
+    pending = {}
+    translocations = {}
+    with ReportExport(samplelist, output_file, bedoutput, vcf_output, regions_out, metrics, threads=processes,
+                      index=index) as export:
+        writer = ReportWriter(export, queue_size)
+        writer.start()
+        try:
+            for reader in readers:
+                reader.start()
+            with metrics.phase('merge'):
+                while True:
+                    complete = [contig for contig in pending if contigKey(contig) < min(passed)]
+                    if complete:
+                        contig = min(complete, key=contigKey)
+                        logger.debug('Pipelined merge of: {}'.format(contig))
+                        mergeChromosome(combine(pending.pop(contig)))
+                        continue
+                    if len(translocations) == n_readers:
+                        break
+                    # wait for the reader furthest behind
+                    w = min((w for w in range(n_readers) if w not in translocations), key=lambda w: passed[w])
+                    message = receive(w)
+                    if message[0] == 'batch':
+                        kind, w, contig, table, nextContig = message
+                        pending.setdefault(contig, []).append((w, table))
+                        passed[w] = last if nextContig is None else contigKey(nextContig)
+                    else:
+                        kind, w, table, stats = message
+                        translocations[w] = table
+                        passed[w] = last
+                        metrics.count('events_loaded', stats['events_loaded'])
+                        metrics.count('events_skipped', stats['events_skipped'])
+                        metrics.count('events_filtered', stats['events_filtered'])
+                        metrics.addTime('exclusion_lookup', stats['exclusion_seconds'])
+
+            with metrics.phase('translocations'):
+                mergeChromosome(combine(translocations.items()), iterBreakendClusters if breakends else iterClusters)
+        except:
+            # the error of the merge is raised, not an error of the writer following it
+            stopReaders()
+            writer.close(raiseError=False)
+            raise
+        stopReaders()
+        writer.close()
+    metrics.addTime('write', writer.seconds)
+
+
+def addOutputArguments(parser):
+    """
+        Add the report options to an `argparse.ArgumentParser`, see `ReportExport`
+    """
+    parser.add_argument('-o', '--output',
+                        help='Output summary to [sample.tsv], BGZF compressed when ending in .gz', default='sample.tsv')
+    parser.add_argument('-b', '--bedoutput',
+                        help='Output bed file to [sample.bed], BGZF compressed when ending in .gz', default='sample.bed')
+    parser.add_argument('-v', '--vcfoutput',
+                        help='Output summary to [sample.vcf], BGZF compressed when ending in .gz', default='sample.vcf')
+    parser.add_argument('-r', '--regions_out',
+                        help='Output all regions to [regions_out.bed], BGZF compressed when ending in .gz',
+                        default='regions_out.bed')
 
 
 def main():
@@ -297,30 +1355,103 @@ def main():
     parser.add_argument('-c', '--exclusion_regions', action='append',
                         help='Exclusion regions file in BED format')
 
+    parser.add_argument('--exclusion_mate', action='store_true', default=False,
+                        help='Also skip translocations with the mate breakpoint in an exclusion region')
+
     parser.add_argument('-f', '--flanking', type=int,
                         help='Centerpoint flanking [100]', default=100)
 
     parser.add_argument('-t', '--translocation_only', action='store_true',
                         help='Do translocations only', required=False, default=False)
 
+    parser.add_argument('--breakends', action='store_true', default=False,
+                        help='Match translocations between contigs on the positions of both breakends, '
+                             'instead of on the centerpoint')
+
+    parser.add_argument('--sorted', action='store_true', default=False,
+                        help='Input VCFs are coordinate sorted, merge them in a single streaming pass')
+
+    parser.add_argument('--pipeline', action='store_true', default=False,
+                        help='With --sorted, load, match and write in a pipeline: reader processes pass the events '
+                             'of a contig on as soon as all VCFs are past it')
+
+    parser.add_argument('-p', '--processes', '--threads', type=int, default=1,
+                        help='Number of processes used to load the VCFs and cluster the chromosomes in parallel, '
+                             'and of threads compressing .gz reports [1]')
+
+    parser.add_argument('--parser', choices=list(VCF_PARSERS.keys()), default='native',
+                        help='VCF parser, the native parser only reads the fields needed for merging '
+                             'and memory maps uncompressed VCFs [native]')
+
+    parser.add_argument('--region', dest='regions', action='append', type=parseRegion,
+                        help='Only merge the calls in this region (chr:start-end), can be given multiple times. '
+                             'Seeks with the tabix index of .vcf.gz input when available')
+
+    addFilterArguments(parser)
+
+    addCacheArguments(parser)
+
+    addMemoryArguments(parser)
+
+    parser.add_argument('--append_to', default=None, metavar='STATE',
+                        help='Merge state file. When it exists the VCF files are added to the merged samples of the '
+                             'state, which are not loaded again, and the reports are written for all samples. '
+                             'The state is created or updated after the merge')
+
+    parser.add_argument('--index', action='store_true', default=False,
+                        help='Sort the .vcf.gz and .bed.gz reports by position and write a tabix index for these')
+
+    addMetricsArguments(parser)
+
     parser.add_argument('-i', '--vcf', nargs='+',
                         help='The VCF(s) to compare, can be supplied multiple times')
-    parser.add_argument('-o', '--output',
-                        help='Output summary to [sample.tsv]', default='sample.tsv')
-    parser.add_argument('-b', '--bedoutput',
-                        help='Output bed file to [sample.bed]', default='sample.bed')
-    parser.add_argument('-v', '--vcfoutput',
-                        help='Output summary to [sample.vcf]', default='sample.vcf')
-    parser.add_argument('-r', '--regions_out',
-                        help='Output all regions to [regions_out.bed]', default='regions_out.bed')
+    addOutputArguments(parser)
     args = parser.parse_args()
 
-    if args.vcf == None or len(args.vcf) < 2:
+    if args.vcf == None or len(args.vcf) < 2 and not (args.append_to and os.path.exists(args.append_to)):
         logger.error("Please supply at least 2 VCF files to merge")
         sys.exit(1)
 
-    startMerge(args.vcf, args.exclusion_regions,
-               args.output, args.flanking, args.bedoutput, args.translocation_only, args.regions_out, args.vcfoutput)
+    if args.pipeline and not args.sorted:
+        logger.error("A pipelined merge needs coordinate sorted input, use --sorted")
+        sys.exit(1)
+
+    if args.sorted and args.append_to:
+        logger.error("A merge state can't be used with --sorted")
+        sys.exit(1)
+
+    if args.max_memory is not None and (args.sorted or args.append_to):
+        logger.error("--max_memory can't be used with --sorted or a merge state")
+        sys.exit(1)
+
+    if args.breakends and args.append_to:
+        logger.error("A merge state can't be used with --breakends")
+        sys.exit(1)
+
+    metrics = Metrics(args.progress)
+    loadFilter = LoadFilter.fromArgs(args)
+    max_memory = args.max_memory * 1024 * 1024 if args.max_memory is not None else None
+    if args.pipeline:
+        startPipelinedMerge(args.vcf, args.exclusion_regions,
+                            args.output, args.flanking, args.bedoutput, args.translocation_only, args.regions_out,
+                            args.vcfoutput, exclusion_mate=args.exclusion_mate, parser=args.parser,
+                            regions=args.regions, metrics=metrics, processes=args.processes, index=args.index,
+                            breakends=args.breakends, loadFilter=loadFilter)
+    elif args.sorted:
+        startStreamingMerge(args.vcf, args.exclusion_regions,
+                            args.output, args.flanking, args.bedoutput, args.translocation_only, args.regions_out,
+                            args.vcfoutput, exclusion_mate=args.exclusion_mate, parser=args.parser,
+                            regions=args.regions, metrics=metrics, processes=args.processes, index=args.index,
+                            breakends=args.breakends, loadFilter=loadFilter)
+    else:
+        startMerge(args.vcf, args.exclusion_regions,
+                   args.output, args.flanking, args.bedoutput, args.translocation_only, args.regions_out, args.vcfoutput,
+                   exclusion_mate=args.exclusion_mate, processes=args.processes, parser=args.parser,
+                   regions=args.regions, cache_dir=args.cache_dir, cache_size=args.cache_size * 1024 * 1024,
+                   append_to=args.append_to, metrics=metrics, index=args.index, breakends=args.breakends,
+                   loadFilter=loadFilter, max_memory=max_memory, spill_dir=args.spill_dir)
+    if args.metrics:
+        metrics.dump(args.metrics)
 
 
 if __name__ == "__main__":
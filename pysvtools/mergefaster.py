@@ -4,47 +4,37 @@ from __future__ import print_function
 
 __desc__ = """
     Merging procedure for Structural Variation events.
-    Follows the idea of centerpoint matching to allow flexible match vs. reciprocal overlap.
+    Follows the idea of centerpoint matching to allow flexible match vs. reciprocal overlap,
+    matching events also need a similar size.
 """
 __author__ = "Wai Yi Leung <w.y.leung@lumc.nl>"
 
 import argparse
-import collections
-import itertools
-from natsort import natsorted
 import logging
-import os
 import sys
 
-try:
-    import vcf
-except:
-    print("No PyVCF installation was found, please install with:\n\tpip install pyvcf")
-    sys.exit(1)
-
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-from pysvtools.models import Event, ExclusionRegion
-from pysvtools.utils import extractTXmate, extractDPFromRecord, getSVType, getSVLEN, formatBedTrack, \
-    formatVCFRecord, vcfHeader, build_exclusion
+from pysvtools import merge
+from pysvtools.cache import addCacheArguments
+from pysvtools.filters import LoadFilter, addFilterArguments
+from pysvtools.metrics import Metrics, addMetricsArguments
+from pysvtools.spill import addMemoryArguments
+from pysvtools.tabix import parseRegion
 
 
-class VCFEventLoader(object):
-    """
-        Load VCF File and transform VCF record into an `Event`
+def startMerge(vcf_files, exclusion_regions, output_file, centerpointFlanking, bedoutput, transonly=False,
+               regions_out="regions_out.bed", vcf_output="output.vcf", sizeFlanking=50, **kwargs):
     """
-    def __init__(self):
-        pass
-
-class SVMerger(object):
-    def __init__(self):
-        pass
-
-class ReportExport(object):
-    def __init__(self):
-        pass
+        Merge the VCF files, matching events on centerpoint distance and size deviation
 
+        Events of different samples match when their centerpoints are at most `centerpointFlanking` apart and
+        their sizes at most `sizeFlanking`. The events are looked up in a grid of centerpoint by size bins, the
+        loading and the reports are those of `pysvtools.merge.startMerge`, other keyword arguments are passed on.
+    """
+    merge.startMerge(vcf_files, exclusion_regions, output_file, centerpointFlanking, bedoutput, transonly,
+                     regions_out, vcf_output, sizeFlanking=sizeFlanking, **kwargs)
 
 
 def main():
@@ -62,24 +52,55 @@ def main():
     parser.add_argument('-t', '--translocation_only', action='store_true',
                         help='Do translocations only', required=False, default=False)
 
+    parser.add_argument('--breakends', action='store_true', default=False,
+                        help='Match translocations between contigs on the positions of both breakends, '
+                             'instead of on the centerpoint')
+
+    parser.add_argument('--exclusion_mate', action='store_true', default=False,
+                        help='Also exclude translocations of which the mate breakpoint is in an exclusion region')
+
+    parser.add_argument('-p', '--processes', '--threads', type=int, default=1,
+                        help='Number of worker processes for loading and matching, and of threads compressing '
+                             '.gz reports [1]')
+
+    parser.add_argument('--parser', choices=list(merge.VCF_PARSERS.keys()), default='native',
+                        help='VCF parser, the native parser only reads the fields needed for merging '
+                             'and memory maps uncompressed VCFs [native]')
+
+    parser.add_argument('--region', dest='regions', action='append', type=parseRegion,
+                        help='Only merge the calls in this region (chr:start-end), can be given multiple times. '
+                             'Seeks with the tabix index of .vcf.gz input when available')
+
+    addFilterArguments(parser)
+
+    addCacheArguments(parser)
+
+    addMemoryArguments(parser)
+
+    parser.add_argument('--index', action='store_true', default=False,
+                        help='Sort the .vcf.gz and .bed.gz reports by position and write a tabix index for these')
+
+    addMetricsArguments(parser)
+
     parser.add_argument('-i', '--vcf', nargs='+',
                         help='The VCF(s) to compare, can be supplied multiple times')
-    parser.add_argument('-o', '--output',
-                        help='Output summary to [sample.tsv]', default='sample.tsv')
-    parser.add_argument('-b', '--bedoutput',
-                        help='Output bed file to [sample.bed]', default='sample.bed')
-    parser.add_argument('-v', '--vcfoutput',
-                        help='Output summary to [sample.vcf]', default='sample.vcf')
-    parser.add_argument('-r', '--regions_out',
-                        help='Output all regions to [regions_out.bed]', default='regions_out.bed')
+    merge.addOutputArguments(parser)
     args = parser.parse_args()
 
     if args.vcf == None or len(args.vcf) < 2:
         logger.error("Please supply at least 2 VCF files to merge")
         sys.exit(1)
 
+    metrics = Metrics(args.progress)
+    max_memory = args.max_memory * 1024 * 1024 if args.max_memory is not None else None
     startMerge(args.vcf, args.exclusion_regions,
-               args.output, args.flanking, args.bedoutput, args.translocation_only, args.regions_out, args.vcfoutput)
+               args.output, args.flanking, args.bedoutput, args.translocation_only, args.regions_out, args.vcfoutput,
+               sizeFlanking=args.sizeflanking, exclusion_mate=args.exclusion_mate, processes=args.processes,
+               parser=args.parser, regions=args.regions, cache_dir=args.cache_dir,
+               cache_size=args.cache_size * 1024 * 1024, metrics=metrics, index=args.index, breakends=args.breakends,
+               loadFilter=LoadFilter.fromArgs(args), max_memory=max_memory, spill_dir=args.spill_dir)
+    if args.metrics:
+        metrics.dump(args.metrics)
 
 
 if __name__ == "__main__":
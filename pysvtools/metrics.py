@@ -0,0 +1,181 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function
+
+__desc__ = """
+    Timing and counters of a merge run: wall and CPU time per phase and per chromosome, event and
+    comparison counters, peak memory, and periodic progress logging.
+"""
+__author__ = "Wai Yi Leung <w.y.leung@lumc.nl>"
+
+import collections
+import contextlib
+import datetime
+import json
+import logging
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, no child CPU time and peak memory then
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+if hasattr(time, 'process_time'):
+    _processTime = time.process_time
+else:
+    _processTime = time.clock
+
+
+def cpuTime():
+    """
+        CPU time (user + system) of this process and its finished child processes, in seconds
+    """
+    seconds = _processTime()
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        seconds += usage.ru_utime + usage.ru_stime
+    return seconds
+
+
+def peakRSS(who=None):
+    """
+        Peak resident set size in bytes, of this process or of the largest finished child process
+    """
+    if resource is None:
+        return None
+    if who is None:
+        who = resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # reported in kilobytes on Linux, in bytes on macOS
+    if sys.platform != 'darwin':
+        peak *= 1024
+    return peak
+
+
+class Progress(object):
+    """
+        Log the progress of `total` work items with rate and ETA, at most once per `interval` seconds
+
+        :param interval: seconds between log lines, None to not log
+    """
+
+    def __init__(self, label, total, interval=None):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.start = time.time()
+        self._logged = self.start
+
+    def update(self, n=1):
+        self.done += n
+        if self.interval is None:
+            return
+        now = time.time()
+        if now - self._logged >= self.interval or self.done == self.total:
+            self._logged = now
+            logger.info(self.format(now))
+
+    def format(self, now=None):
+        now = now or time.time()
+        elapsed = now - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.
+        message = "{label}: {done}/{total}".format(label=self.label, done=self.done, total=self.total)
+        if self.total:
+            message += " ({:.1f}%)".format(100. * self.done / self.total)
+        message += ", {:.1f}/s".format(rate)
+        if rate > 0 and self.total:
+            eta = datetime.timedelta(seconds=int((self.total - self.done) / rate))
+            message += ", ETA {}".format(eta)
+        return message
+
+
+class Metrics(object):
+    """
+        Metrics of one merge run, emitted as JSON with `dump`
+
+        Phases are timed with `phase`, chromosome level numbers are added with `addChromosome`,
+        counters with `count`.
+
+        :param progress_interval: seconds between progress log lines, None to not log progress
+    """
+
+    def __init__(self, progress_interval=None):
+        self.progress_interval = progress_interval
+        self.phases = collections.OrderedDict()
+        self.chromosomes = collections.OrderedDict()
+        self.counters = collections.Counter()
+        self.start = time.time()
+        self.start_cpu = cpuTime()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+            Time the wall and CPU time of a block, added up per phase name
+        """
+        wall = time.time()
+        cpu = cpuTime()
+        try:
+            yield
+        finally:
+            self.addTime(name, time.time() - wall, cpuTime() - cpu)
+
+    def addTime(self, name, wall, cpu=None):
+        """
+            Add time to a phase, e.g. measured in a worker process. Without `cpu` only wall time is kept.
+        """
+        timing = self.phases.setdefault(name, collections.OrderedDict())
+        timing['wall'] = timing.get('wall', 0.) + wall
+        if cpu is not None:
+            timing['cpu'] = timing.get('cpu', 0.) + cpu
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def addChromosome(self, virtualChr, **values):
+        """
+            Add up numbers for a chromosome, e.g. addChromosome('chr1chr1', wall=1.5, events=1000)
+        """
+        chromosome = self.chromosomes.setdefault(virtualChr, collections.OrderedDict())
+        for name, value in values.items():
+            chromosome[name] = chromosome.get(name, 0) + value
+
+    def progress(self, label, total):
+        return Progress(label, total, self.progress_interval)
+
+    def toDict(self):
+        wall = time.time() - self.start
+        events = self.counters.get('events_loaded', 0)
+        return collections.OrderedDict([
+            ('wall', wall),
+            ('cpu', cpuTime() - self.start_cpu),
+            ('events_per_second', events / wall if wall > 0 else None),
+            ('peak_rss', peakRSS()),
+            ('peak_rss_children', peakRSS(resource.RUSAGE_CHILDREN) if resource is not None else None),
+            ('phases', self.phases),
+            ('counters', collections.OrderedDict(sorted(self.counters.items()))),
+            ('chromosomes', self.chromosomes),
+        ])
+
+    def dump(self, path):
+        with open(path, 'w') as fh:
+            json.dump(self.toDict(), fh, indent=2)
+            fh.write('\n')
+
+    def __repr__(self):
+        return "<Metrics {} phases>".format(len(self.phases))
+
+
+def addMetricsArguments(parser):
+    """
+        Add the metrics and progress options to an `argparse.ArgumentParser`, see `Metrics`
+    """
+    parser.add_argument('--metrics', default=None, metavar='FILE',
+                        help='Write the time per phase and chromosome, comparison counters and peak memory '
+                             'as JSON to this file')
+    parser.add_argument('--progress', type=float, default=None, metavar='SECONDS',
+                        help='Log the progress with an ETA every SECONDS')
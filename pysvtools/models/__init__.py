@@ -1,4 +1,5 @@
 from .event import Event
-from .exclusionregion import ExclusionRegion
+from .eventtable import EventTable
+from .exclusionregion import ExclusionRegion, ExclusionIndex
 
-__all__ = (Event, ExclusionRegion)
+__all__ = (Event, EventTable, ExclusionRegion, ExclusionIndex)
@@ -8,6 +8,15 @@ __author__ = "Wai Yi Leung <w.y.leung@lumc.nl>"
 
 
 class Event(object):
+    """
+        Structural Variation event between breakpoint (chrA, chrApos) and (chrB, chrBpos)
+
+        The size, centerpoint and flanked centerpoint bounds (lft, rgt) are computed once at construction,
+        the breakpoints should not be changed afterwards.
+    """
+    __slots__ = ('chrA', 'chrApos', 'chrB', 'chrBpos', 'seen', 'matched_in', 'svmethod', 'support', 'virtualChr',
+                 'size', 'centerpoint', 'sv_type', 'centerpointFlanking', 'lft', 'rgt', 'dp', '_hash')
+
     centerpoint_flanking = 100
 
     def __init__(self, chrA, chrApos, chrB, chrBpos, sv_type=None, cp_flank=None, dp=0, svmethod=""):
@@ -24,85 +33,35 @@ class Event(object):
         # number of reads supporting this breakpoint
         self.support = 0
 
-        _vChr = [self.chrA, self.chrB]
-        _vChr.sort()
-        self.virtualChr = "".join(_vChr)
+        # the breakpoints are sorted, chrA <= chrB
+        self.virtualChr = self.chrA + self.chrB
 
-        self.centerpoint = self.get_centerpoint
+        if self.chrApos <= self.chrBpos:
+            self.size = self.chrBpos - self.chrApos
+            self.centerpoint = self.chrApos + self.size // 2
+        else:
+            self.size = self.chrApos - self.chrBpos
+            self.centerpoint = self.chrBpos + self.size // 2
         self.sv_type = sv_type
         self.centerpointFlanking = cp_flank or self.centerpoint_flanking
+        self.lft = self.centerpoint - self.centerpointFlanking
+        self.rgt = self.centerpoint + self.centerpointFlanking
         self.dp = dp
         self._hash = None
 
     @property
     def get_centerpoint(self):
-        cnt = int(self.size / 2)
-        positions = [self.chrApos, self.chrBpos]
-        positions.sort()
-        centerpoint = positions[0] + cnt
-        return centerpoint
-
-    @property
-    def size(self):
-        positions = [self.chrApos, self.chrBpos]
-        positions.sort()
-        return abs(positions[1] - positions[0])
+        return self.centerpoint
 
     def __eq__(self, other):
-        # if the current sv event is already visited, then skip it.
-        #       This predicate is False under the condition where we have more than 2 samples
-        #       This logic is now kept in comments, to show that this is wrong assumption
-        #        if self.seen or other.seen:
-        #            return False
-
-        #       #FIXME: We also need to check on the SVTYPE of each
+        # rules defined: the flanked centerpoints should overlap each other by at least 1 bp.
+        # With both centerpoints flanked by the flanking of this event, the flanked centerpoints overlap
+        # whenever the other centerpoint is within the flanking of this centerpoint:
+        # A l--------c--------r
+        # B               l--------c--------r
         #
-        #
-
-        #        if not ((self.chrA == other.chrA) and (self.chrB == other.chrB)):
-        #            return False
-        # check whether we are working on the same chromosome set.
-        if not (self.virtualChr == other.virtualChr):
-            return False
-
-        if abs(self.centerpoint - other.centerpoint) > self.centerpointFlanking:
-            return False
-
-        centerpointA = self.centerpoint
-        centerpointB = other.centerpoint
-
-        lftA = centerpointA - self.centerpointFlanking
-        rgtA = centerpointA + self.centerpointFlanking
-
-        lftB = centerpointB - self.centerpointFlanking
-        rgtB = centerpointB + self.centerpointFlanking
-
-        # rules defined: centerpoints should overlap each other by at least 1 bp
-        # look for hypothesis first:
-        # A l--------------r
-        # B            l--------------r
-        if lftB <= rgtA <= rgtB:
-            # we have a overlap
-            #            print "A end to B start"
-            return True
-        # A            l--------------r
-        # B l--------------r
-        if lftB <= lftA <= rgtB:
-            #            print "B end to A start"
-            return True
-
-        # conditions where A fully overlaps B or the otherway around
-        # A l--------------------r
-        # B     l----------r
-        # or
-        # A     l----------r
-        # B l--------------------r
-        if (lftB >= lftA and rgtB <= rgtA) or (lftB <= lftA and rgtB >= rgtA):
-            #            print "overlapping things"
-            return True
-
-        # say false for other not (yet) tested hypotheses
-        return False
+        # #FIXME: We also need to check on the SVTYPE of each
+        return self.virtualChr == other.virtualChr and self.lft <= other.centerpoint <= self.rgt
 
     @property
     def vcf_alt(self):
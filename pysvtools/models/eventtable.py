@@ -0,0 +1,225 @@
+#!/usr/bin/env python2
+
+import array
+import json
+import sys
+
+from natsort import natsort_keygen
+
+from .event import Event
+
+__desc__ = """
+    Columnar in-memory store of SV calls.
+"""
+__author__ = "Wai Yi Leung <w.y.leung@lumc.nl>"
+
+# value stored for a call without read depth
+DP_MISSING = -1
+
+# first line of a dumped table
+DUMP_MAGIC = b'PYSVTOOLS-EVENTTABLE-1\n'
+
+_natural_key = natsort_keygen()
+
+
+def chromosomeKey(chromosome):
+    """
+        Sort key of a (chrA, chrB) chromosome of `EventTable.partitions`: the natural order of its virtualChr, as
+        the reports are ordered. Chromosomes with the same virtualChr, like chr1 + chr12 and chr11 + chr2, are
+        ordered by their contigs.
+    """
+    return _natural_key(chromosome[0] + chromosome[1]), chromosome
+
+
+class EventTable(object):
+    """
+        Struct-of-arrays store of SV calls, one `array.array` per attribute.
+
+        Contigs, SV types, methods and samples are kept once in a lookup list and referenced by id.
+        `Event` objects are only created on request with `event`.
+    """
+
+    COLUMNS = (
+        ('chrA', 'i'),
+        ('posA', 'l'),
+        ('chrB', 'i'),
+        ('posB', 'l'),
+        ('centerpoint', 'l'),
+        ('size', 'l'),
+        ('svtype', 'i'),
+        ('dp', 'l'),
+        ('sample', 'i'),
+        ('method', 'i'),
+    )
+
+    def __init__(self):
+        self.contigs = []
+        self.svtypes = []
+        self.methods = []
+        self.samples = []
+        self._ids = {}
+        for name, typecode in self.COLUMNS:
+            setattr(self, name, array.array(typecode))
+
+    def _id(self, name, value):
+        """
+            Id of `value` in the lookup list `name`, added when new
+        """
+        ids = self._ids.setdefault(name, {})
+        try:
+            return ids[value]
+        except KeyError:
+            values = getattr(self, name)
+            ids[value] = len(values)
+            values.append(value)
+            return ids[value]
+
+    def __len__(self):
+        return len(self.posA)
+
+    @property
+    def nbytes(self):
+        """
+            Size of the columns in bytes, without the lookup lists
+        """
+        return sum(len(column) * column.itemsize for column in (getattr(self, name) for name, typecode in self.COLUMNS))
+
+    def clear(self):
+        """
+            Remove all rows and lookup values
+        """
+        self.__init__()
+
+    def append(self, chrA, chrApos, chrB, chrBpos, sv_type, dp, sample, svmethod=""):
+        # breakpoints are ordered the same way as in `Event`
+        (chrA, chrApos), (chrB, chrBpos) = sorted([(chrA, int(chrApos)), (chrB, int(chrBpos))])
+        size = abs(chrBpos - chrApos)
+
+        self.chrA.append(self._id('contigs', chrA))
+        self.posA.append(chrApos)
+        self.chrB.append(self._id('contigs', chrB))
+        self.posB.append(chrBpos)
+        self.centerpoint.append(min(chrApos, chrBpos) + size // 2)
+        self.size.append(size)
+        self.svtype.append(self._id('svtypes', sv_type))
+        if type(dp) == type([]):
+            dp = dp[0]
+        self.dp.append(DP_MISSING if dp is None else int(dp))
+        self.sample.append(self._id('samples', sample))
+        self.method.append(self._id('methods', svmethod))
+
+    def extend(self, other):
+        """
+            Append all rows of `other`, the lookup ids are translated to this table
+        """
+        contigs = [self._id('contigs', v) for v in other.contigs]
+        svtypes = [self._id('svtypes', v) for v in other.svtypes]
+        samples = [self._id('samples', v) for v in other.samples]
+        methods = [self._id('methods', v) for v in other.methods]
+
+        self.chrA.extend(array.array(self.chrA.typecode, [contigs[i] for i in other.chrA]))
+        self.posA.extend(other.posA)
+        self.chrB.extend(array.array(self.chrB.typecode, [contigs[i] for i in other.chrB]))
+        self.posB.extend(other.posB)
+        self.centerpoint.extend(other.centerpoint)
+        self.size.extend(other.size)
+        self.svtype.extend(array.array(self.svtype.typecode, [svtypes[i] for i in other.svtype]))
+        self.dp.extend(other.dp)
+        self.sample.extend(array.array(self.sample.typecode, [samples[i] for i in other.sample]))
+        self.method.extend(array.array(self.method.typecode, [methods[i] for i in other.method]))
+
+    def take(self, rows):
+        """
+            New table with the given rows of this table in that order, with the same lookup ids
+        """
+        table = type(self)()
+        for name in ('contigs', 'svtypes', 'methods', 'samples'):
+            for value in getattr(self, name):
+                table._id(name, value)
+        for name, typecode in self.COLUMNS:
+            column = getattr(self, name)
+            getattr(table, name).extend(array.array(typecode, [column[i] for i in rows]))
+        return table
+
+    def virtualChr(self, i):
+        return self.contigs[self.chrA[i]] + self.contigs[self.chrB[i]]
+
+    def partitions(self):
+        """
+            Row indexes per chromosome, the (chrA, chrB) contig names, ordered by centerpoint (rows with the same
+            centerpoint stay in table order). The virtualChr of a chromosome is chrA + chrB, see `chromosomeKey`.
+
+            :return: dict of (chrA, chrB) -> `array.array` of row indexes
+        """
+        rows = {}
+        for i in range(len(self)):
+            key = (self.chrA[i], self.chrB[i])
+            rows[key] = rows.get(key, [])
+            rows[key].append(i)
+
+        partitions = {}
+        for (chrA, chrB), indexes in rows.items():
+            indexes.sort(key=self.centerpoint.__getitem__)
+            partitions[(self.contigs[chrA], self.contigs[chrB])] = array.array('l', indexes)
+        return partitions
+
+    def event(self, i, cp_flank=None):
+        """
+            Create the `Event` for row `i`
+        """
+        dp = self.dp[i]
+        return Event(self.contigs[self.chrA[i]], self.posA[i], self.contigs[self.chrB[i]], self.posB[i],
+                     sv_type=self.svtypes[self.svtype[i]],
+                     cp_flank=cp_flank,
+                     dp=None if dp == DP_MISSING else dp,
+                     svmethod=self.methods[self.method[i]])
+
+    def dump(self, fh):
+        """
+            Write the table in binary form to the file object `fh`, opened in binary mode
+
+            A header line in JSON with the lookup lists and the number of rows is followed by the raw columns.
+            The columns are written in the byte order of this machine, which is recorded in the header.
+        """
+        header = {
+            'rows': len(self),
+            'byteorder': sys.byteorder,
+            'itemsize': dict((name, getattr(self, name).itemsize) for name, typecode in self.COLUMNS),
+            'contigs': self.contigs,
+            'svtypes': self.svtypes,
+            'methods': self.methods,
+            'samples': self.samples,
+        }
+        fh.write(DUMP_MAGIC)
+        fh.write(json.dumps(header).encode('utf-8') + b'\n')
+        for name, typecode in self.COLUMNS:
+            getattr(self, name).tofile(fh)
+
+    @classmethod
+    def load(cls, fh):
+        """
+            Read a table written by `dump`
+
+            :raises ValueError: when the data was not written by `dump` on a compatible machine
+        """
+        if fh.readline() != DUMP_MAGIC:
+            raise ValueError("Not a dumped EventTable")
+        header = json.loads(fh.readline().decode('utf-8'))
+        table = cls()
+        if header['byteorder'] != sys.byteorder or \
+                any(header['itemsize'][name] != getattr(table, name).itemsize for name, typecode in cls.COLUMNS):
+            raise ValueError("EventTable was dumped on an incompatible machine")
+
+        for name in ('contigs', 'svtypes', 'methods', 'samples'):
+            for value in header[name]:
+                table._id(name, value)
+        for name, typecode in cls.COLUMNS:
+            column = getattr(table, name)
+            try:
+                column.fromfile(fh, header['rows'])
+            except EOFError:
+                raise ValueError("Dumped EventTable is truncated")
+        return table
+
+    def __repr__(self):
+        return "<EventTable {n} events, {s} samples>".format(n=len(self), s=len(self.samples))
@@ -1,5 +1,7 @@
 #!/usr/bin/env python2
 
+import bisect
+
 
 class ExclusionRegion(object):
     def __init__(self, chromosome, start, end, *args, **kwargs):
@@ -16,3 +18,56 @@ class ExclusionRegion(object):
             chromosome=self.chromosome,
             start=self.start,
             end=self.end)
+
+
+class ExclusionIndex(object):
+    """
+        Collection of `ExclusionRegion`, indexed per chromosome for O(log n) overlap lookups.
+        Overlapping regions are merged, starts and ends are kept in sorted lists to bisect on.
+    """
+
+    def __init__(self, regions=None):
+        self.regions = []
+        self._starts = None
+        self._ends = None
+        self.update(regions or [])
+
+    def add(self, region):
+        self.regions.append(region)
+        self._starts = None
+        self._ends = None
+
+    def update(self, regions):
+        for region in regions:
+            self.add(region)
+
+    def _build(self):
+        self._starts = {}
+        self._ends = {}
+        for region in sorted(self.regions, key=lambda r: (r.chromosome, r.start, r.end)):
+            starts = self._starts.setdefault(region.chromosome, [])
+            ends = self._ends.setdefault(region.chromosome, [])
+            # positions are inclusive, so adjacent regions are merged as well
+            if ends and region.start <= ends[-1] + 1:
+                ends[-1] = max(ends[-1], region.end)
+            else:
+                starts.append(region.start)
+                ends.append(region.end)
+
+    def overlaps(self, qChr, qPos):
+        if self._starts is None:
+            self._build()
+        starts = self._starts.get(qChr)
+        if not starts:
+            return False
+        i = bisect.bisect_right(starts, qPos) - 1
+        return i >= 0 and qPos <= self._ends[qChr][i]
+
+    def __len__(self):
+        return len(self.regions)
+
+    def __iter__(self):
+        return iter(self.regions)
+
+    def __repr__(self):
+        return "<ExclusionIndex {n} regions>".format(n=len(self.regions))
@@ -0,0 +1,344 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function
+
+__desc__ = """
+    Fast-path VCF reader for SV calls.
+    Only the fields used to build an `Event` are parsed, PyVCF parses the header and serves as fallback.
+"""
+__author__ = "Wai Yi Leung <w.y.leung@lumc.nl>"
+
+import mmap
+
+import six
+import vcf
+import vcf.model
+from vcf.parser import RESERVED_INFO
+
+# INFO keys used by the loader, all other keys are not parsed
+SV_INFO_KEYS = frozenset(['SVTYPE', 'END', 'SVEND', 'SVLEN', 'CHR2', 'DP', 'BREAKPOINTS'])
+
+MISSING_VALUES = frozenset(['.', '', 'NA'])
+
+# INFO keys of `SV_INFO_KEYS` as found in the raw bytes of a line
+SV_INFO_BYTES = dict((key.encode('ascii'), key) for key in SV_INFO_KEYS)
+
+# initial number of bytes of a line sliced from a memory map, enough for the fields up to the first sample
+FIELDS_WINDOW = 4096
+
+if six.PY2:
+    def _text(data):
+        return data
+else:
+    def _text(data):
+        return data.decode('utf-8')
+
+
+class SVCallData(object):
+    """
+        Sample data of a call, only DP is parsed
+    """
+    __slots__ = ('DP',)
+
+
+class SVCall(object):
+    __slots__ = ('sample', 'data')
+
+    def __init__(self, sample, data):
+        self.sample = sample
+        self.data = data
+
+
+class SVRecord(object):
+    """
+        Subset of a PyVCF `_Record`: CHROM, POS, ID, ALT, FILTER, INFO (SV keys only) and the first sample
+    """
+    __slots__ = ('CHROM', 'POS', 'ID', 'ALT', 'FILTER', 'INFO', 'samples')
+
+    def __init__(self, CHROM, POS, ID, ALT, FILTER, INFO, samples):
+        self.CHROM = CHROM
+        self.POS = POS
+        self.ID = ID
+        self.ALT = ALT
+        self.FILTER = FILTER
+        self.INFO = INFO
+        self.samples = samples
+
+    @property
+    def is_sv(self):
+        return self.INFO.get('SVTYPE') is not None
+
+    @property
+    def sv_end(self):
+        if self.is_sv:
+            return self.INFO['END']
+        return None
+
+    def __repr__(self):
+        return "<SVRecord {}:{}>".format(self.CHROM, self.POS)
+
+
+def _cast(values, vtype):
+    if vtype == 'Integer':
+        try:
+            return [int(v) if v not in MISSING_VALUES else None for v in values]
+        except ValueError:
+            return [float(v) if v not in MISSING_VALUES else None for v in values]
+    elif vtype == 'Float':
+        return [float(v) if v not in MISSING_VALUES else None for v in values]
+    return [v if v not in MISSING_VALUES else None for v in values]
+
+
+def parseAlt(alt):
+    """
+        Parse one ALT allele to the PyVCF model classes
+    """
+    if '[' in alt or ']' in alt:
+        bracket = '[' if '[' in alt else ']'
+        items = alt.split(bracket)
+        chrom, pos = items[1].rsplit(':', 1)
+        withinMainAssembly = True
+        if chrom[0] == '<':
+            chrom = chrom[1:-1]
+            withinMainAssembly = False
+        orientation = alt[0] in '[]'
+        connectingSequence = items[2] if orientation else items[0]
+        return vcf.model._Breakend(chrom, pos, orientation, bracket == '[', connectingSequence, withinMainAssembly)
+    elif alt[0] == '<' and alt[-1] == '>':
+        return vcf.model._SV(alt[1:-1])
+    elif alt == '.':
+        return None
+    return vcf.model._Substitution(alt)
+
+
+def parseFilter(filters):
+    """
+        Parse the FILTER column as PyVCF: None when missing, an empty list for PASS, else the failed filters
+    """
+    if filters == '.':
+        return None
+    if filters == 'PASS':
+        return []
+    return filters.split(';')
+
+
+class SVReader(object):
+    """
+        Fast-path VCF reader, splits the lines directly and parses only the fields of `SV_INFO_KEYS`,
+        ALT, FILTER and the DP of the first sample. Lines which can't be parsed this way are handed to PyVCF.
+
+        :param fsock: file object or iterable of lines, including the header
+        :param compressed: passed to PyVCF, whether fsock is gzip compressed (guessed from the file name when None)
+        :param prefilter: `LoadFilter` of which the raw check drops records after splitting the line, before the
+                          fields are parsed. The number of dropped records is kept in `prefiltered`.
+    """
+
+    def __init__(self, fsock, compressed=None, prefilter=None):
+        self._reader = vcf.Reader(fsock, compressed=compressed)
+        self.prefilter = prefilter
+        self.prefiltered = 0
+        self.metadata = self._reader.metadata
+        self.contigs = self._reader.contigs
+        self.infos = self._reader.infos
+        self.formats = self._reader.formats
+        self.samples = self._reader.samples
+
+        # (number, type) of the parsed INFO keys, following the typing of PyVCF
+        self._infoTypes = {}
+        for key in SV_INFO_KEYS:
+            if key in self.infos:
+                self._infoTypes[key] = (self.infos[key].num, self.infos[key].type)
+            else:
+                self._infoTypes[key] = (None, RESERVED_INFO.get(key, 'String'))
+
+        self._dpType = 'Integer'
+        if 'DP' in self.formats:
+            self._dpType = self.formats['DP'].type
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while True:
+            line = next(self._reader.reader)
+            try:
+                record = self.parseLine(line)
+            except (ValueError, IndexError):
+                return self._parsePyVCF(line)
+            if record is not None:
+                return record
+
+    next = __next__
+
+    def _parsePyVCF(self, line):
+        # PyVCF reads from its line iterator, hand it only this line and restore the iterator of the file
+        reader = self._reader.reader
+        self._reader.reader = iter([line])
+        try:
+            return next(self._reader)
+        finally:
+            self._reader.reader = reader
+
+    def parseInfo(self, info_str):
+        info = {}
+        if info_str == '.':
+            return info
+        for entry in info_str.split(';'):
+            key, _, value = entry.partition('=')
+            if key not in SV_INFO_KEYS:
+                continue
+            num, vtype = self._infoTypes[key]
+            if vtype == 'Flag' or not _:
+                info[key] = True
+                continue
+            val = _cast(value.split(','), vtype)
+            if num == 1:
+                val = val[0]
+            info[key] = val
+        return info
+
+    def parseSample(self, fmt, sample_str):
+        data = SVCallData()
+        keys = fmt.split(':')
+        if 'DP' in keys:
+            values = sample_str.split(':')
+            i = keys.index('DP')
+            value = values[i] if i < len(values) else '.'
+            data.DP = _cast([value], self._dpType)[0]
+        return SVCall(self.samples[0], data)
+
+    def parseLine(self, line):
+        """
+            :return: the `SVRecord` of a data line, None when dropped by the prefilter
+        """
+        fields = line.split('\t', 9)
+        if self.prefilter is not None and len(fields) > 7 and \
+                not self.prefilter.acceptsFields(fields[0], fields[6], fields[7].rstrip()):
+            self.prefiltered += 1
+            return None
+
+        samples = []
+        if len(fields) > 9 and self.samples:
+            samples.append(self.parseSample(fields[8], fields[9].split('\t', 1)[0]))
+
+        return SVRecord(fields[0],
+                        int(fields[1]),
+                        None if fields[2] == '.' else fields[2],
+                        [parseAlt(alt) for alt in fields[4].split(',')],
+                        parseFilter(fields[6]),
+                        self.parseInfo(fields[7]),
+                        samples)
+
+
+class MmapSVReader(SVReader):
+    """
+        `SVReader` over a memory mapped plain VCF file
+
+        The line boundaries are found with `find` on the mapping and only the bytes up to the end of the first
+        sample are copied, so the other samples of a population VCF are never read into Python objects.
+        Of those fields only CHROM, POS, ID, ALT, FILTER, the `SV_INFO_KEYS` values and the DP of the first sample
+        are decoded.
+
+        :param path: path of an uncompressed, non-empty VCF file
+        :param prefilter: `LoadFilter` for a raw check of the fields, see `SVReader`
+    """
+
+    def __init__(self, path, prefilter=None):
+        self._fh = open(path, 'rb')
+        self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self._size = len(self._mm)
+
+        # the header lines are few, parse them with PyVCF
+        pos = 0
+        while pos < self._size and self._mm[pos:pos + 1] == b'#':
+            end = self._mm.find(b'\n', pos)
+            pos = self._size if end < 0 else end + 1
+        SVReader.__init__(self, iter(_text(self._mm[:pos]).splitlines(True)), compressed=False, prefilter=prefilter)
+        self._pos = pos
+        # decoded contig names, reused across records
+        self._chroms = {}
+
+    def __next__(self):
+        mm = self._mm
+        while self._pos < self._size:
+            start = self._pos
+            end = mm.find(b'\n', start)
+            if end < 0:
+                end = self._size
+            self._pos = end + 1
+            if end > start and mm[end - 1:end] == b'\r':
+                end -= 1
+            if end == start:
+                continue
+            try:
+                record = self.parseRange(start, end)
+            except (ValueError, IndexError):
+                return self._parsePyVCF(_text(mm[start:end]))
+            if record is not None:
+                return record
+        self.close()
+        raise StopIteration
+
+    next = __next__
+
+    def parseInfoBytes(self, info_bytes):
+        info = {}
+        if info_bytes == b'.':
+            return info
+        for entry in info_bytes.split(b';'):
+            key, _, value = entry.partition(b'=')
+            key = SV_INFO_BYTES.get(key)
+            if key is None:
+                continue
+            num, vtype = self._infoTypes[key]
+            if vtype == 'Flag' or not _:
+                info[key] = True
+                continue
+            val = _cast(_text(value).split(','), vtype)
+            if num == 1:
+                val = val[0]
+            info[key] = val
+        return info
+
+    def parseRange(self, start, end):
+        """
+            Parse the line at [start, end) of the mapping
+
+            :return: the `SVRecord`, None when dropped by the prefilter
+        """
+        # slice a window up to the end of the first sample, growing it for long lines
+        size = FIELDS_WINDOW
+        while True:
+            stop = min(end, start + size)
+            fields = self._mm[start:stop].split(b'\t', 10)
+            if len(fields) > 10 or stop == end:
+                break
+            size *= 4
+        if self.prefilter is not None and len(fields) > 7 and \
+                not self.prefilter.acceptsFields(fields[0], fields[6], fields[7]):
+            self.prefiltered += 1
+            return None
+
+        chrom = self._chroms.get(fields[0])
+        if chrom is None:
+            chrom = self._chroms[fields[0]] = _text(fields[0])
+
+        samples = []
+        if len(fields) > 9 and self.samples:
+            samples.append(self.parseSample(_text(fields[8]), _text(fields[9])))
+
+        return SVRecord(chrom,
+                        int(fields[1]),
+                        None if fields[2] == b'.' else _text(fields[2]),
+                        [parseAlt(alt) for alt in _text(fields[4]).split(',')],
+                        parseFilter(_text(fields[6])),
+                        self.parseInfoBytes(fields[7]),
+                        samples)
+
+    def close(self):
+        if self._mm is None:
+            return
+        self._mm.close()
+        self._fh.close()
+        self._mm = None
+        self._size = self._pos = 0
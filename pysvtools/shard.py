@@ -0,0 +1,463 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function
+
+__desc__ = """
+    Sharded merge of Structural Variation events, to spread a merge over separate processes or nodes.
+    `scatter` cuts the loaded events in shard files per virtualChr and position chunk, `merge-shard` clusters
+    one shard and `gather` writes the clusters of all shards to the reports.
+"""
+__author__ = "Wai Yi Leung <w.y.leung@lumc.nl>"
+
+import argparse
+import array
+import bisect
+import collections
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+
+from natsort import natsorted
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+from pysvtools import merge
+from pysvtools.cache import EventCache, DEFAULT_CACHE_SIZE, addCacheArguments
+from pysvtools.filters import LoadFilter, addFilterArguments
+from pysvtools.matcher import clustersFromLabels
+from pysvtools.metrics import Metrics, addMetricsArguments
+from pysvtools.models import EventTable
+from pysvtools.models.eventtable import chromosomeKey
+from pysvtools.spill import EventSpill, addMemoryArguments
+from pysvtools.tabix import parseRegion
+
+SHARD_MAGIC = b'PYSVTOOLS-SHARD-1\n'
+
+# span in bp of the centerpoints of the events in one shard
+DEFAULT_CHUNK_SIZE = 10000000
+
+# maximum number of events in a shard packing the chromosomes between contigs which fit in one chunk
+PACKED_SHARD_EVENTS = 100000
+
+
+def chunkRows(centerpoints, flanking, chunk_size):
+    """
+        Cut sorted centerpoints in chunks spanning at least `chunk_size` bp
+
+        A chunk ends at the first gap wider than `flanking` after `chunk_size`, no cluster can span such a gap.
+        Without such a gap within the next `chunk_size` the chunk is cut at `chunk_size`, the neighbouring chunks
+        then overlap by the events within `flanking` of the cut.
+
+        :return: list of (start, end, core_start, core_end) with the slice of each chunk including the overlap,
+                 and the slice of the chunk itself
+    """
+    chunks = []
+    n = len(centerpoints)
+    core_start = 0
+    while core_start < n:
+        end = max(bisect.bisect_left(centerpoints, centerpoints[core_start] + chunk_size, core_start),
+                  core_start + 1)
+        limit = bisect.bisect_left(centerpoints, centerpoints[core_start] + 2 * chunk_size, end)
+        core_end = end
+        while core_end < limit and centerpoints[core_end] - centerpoints[core_end - 1] <= flanking:
+            core_end += 1
+        if core_end < n and centerpoints[core_end] - centerpoints[core_end - 1] <= flanking:
+            # no gap to cut at
+            core_end = end
+        start = bisect.bisect_left(centerpoints, centerpoints[core_start] - flanking, 0, core_start)
+        stop = bisect.bisect_right(centerpoints, centerpoints[core_end - 1] + flanking, core_end)
+        chunks.append((start, stop, core_start, core_end))
+        core_start = core_end
+    return chunks
+
+
+class Shard(object):
+    """
+        Events of one chunk of a virtualChr, sorted by centerpoint, and once merged the cluster label of each event
+
+        The table holds the events of the chunk itself, the core, and the events of the neighbouring chunks within
+        reach of the core. A cluster belongs to the shard holding its first member in the core. Chromosomes between
+        contigs which fit in one chunk are packed in one shard, one after the other in report order.
+
+        :param table: `EventTable` with the events of the shard
+        :param info: dict with the (chrA, chrB) chromosomes, the end row of each chromosome, the chunk number, the
+                     core as [start, end) rows, all samples of the merge and the flanking and sizeFlanking to match
+                     with
+        :param labels: `array.array` with the cluster label per row of the table, None when not merged
+    """
+
+    def __init__(self, table, info, labels=None):
+        if labels is not None and len(labels) != len(table):
+            raise ValueError("Expected {} labels, got {}".format(len(table), len(labels)))
+        self.table = table
+        self.info = info
+        self.labels = labels
+
+    @property
+    def core(self):
+        return tuple(self.info['core'])
+
+    def dump(self, path):
+        """
+            Write the shard to `path`, replacing an existing file only when completely written
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(SHARD_MAGIC)
+                header = {'info': self.info, 'merged': self.labels is not None}
+                fh.write(json.dumps(header, sort_keys=True).encode('utf-8') + b'\n')
+                self.table.dump(fh)
+                if self.labels is not None:
+                    self.labels.tofile(fh)
+            os.rename(tmp_path, path)
+        except:
+            os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def _header(fh, path):
+        if fh.readline() != SHARD_MAGIC:
+            raise ValueError("{} is not a shard".format(path))
+        return json.loads(fh.readline().decode('utf-8'))
+
+    @classmethod
+    def loadInfo(cls, path):
+        """
+            Read the info of a shard and whether it is merged, without the events
+
+            :return: (info, merged)
+        """
+        with open(path, 'rb') as fh:
+            header = cls._header(fh, path)
+        return header['info'], header['merged']
+
+    @classmethod
+    def load(cls, path):
+        """
+            :raises ValueError: when `path` is not a shard
+        """
+        with open(path, 'rb') as fh:
+            header = cls._header(fh, path)
+            table = EventTable.load(fh)
+            labels = None
+            if header['merged']:
+                labels = array.array('l')
+                try:
+                    labels.fromfile(fh, len(table))
+                except EOFError:
+                    raise ValueError("Shard {} is truncated".format(path))
+        return cls(table, header['info'], labels)
+
+    def __repr__(self):
+        virtualChrs = ','.join(''.join(chromosome) for chromosome in self.info['chromosomes'])
+        return "<Shard {c}:{n} {e} events>".format(c=virtualChrs, n=self.info['chunk'], e=len(self.table))
+
+
+def scatterShards(vcf_files, exclusion_regions, shard_dir, centerpointFlanking, chunkSize=DEFAULT_CHUNK_SIZE,
+                  transonly=False, exclusion_mate=False, sizeFlanking=None, processes=1, parser='native',
+                  regions=None, cache_dir=None, cache_size=DEFAULT_CACHE_SIZE, metrics=None, breakends=False,
+                  loadFilter=None, max_memory=0, spill_dir=None):
+    """
+        Load the VCF files and write the events in shards per virtualChr and chunk of `chunkSize` bp
+
+        The chromosomes between contigs which fit in one chunk are packed in shards of up to `PACKED_SHARD_EVENTS`
+        events, so the number of shards grows with the number of contigs rather than with the pairs of contigs.
+
+        The loaded events are spilled to sorted runs per chromosome when they reach `max_memory`, and the shards
+        are then cut one chromosome at a time, see `pysvtools.spill.EventSpill`. With the default budget of 0
+        every loaded file is spilled, so only the events of one file or of one chromosome are in memory.
+
+        :param sizeFlanking: also match on size in `mergeShard`, see `pysvtools.merge.startMerge`
+        :param breakends: match interchromosomal events on both breakends in `mergeShard`, these are not cut
+                          in chunks, see `pysvtools.merge.startMerge`
+        :param loadFilter: `LoadFilter` of the calls to load, see `pysvtools.merge.startMerge`
+        :param metrics: `Metrics` to record the time per phase and the counters in
+        :param max_memory: memory budget of the loaded events in bytes, checked after each loaded file
+        :param spill_dir: directory to create the spill directory in, the system temporary directory when None
+        :return: paths of the shard files, in natural order of virtualChr and position
+    """
+    if metrics is None:
+        metrics = Metrics()
+    with metrics.phase('exclusion_regions'):
+        edb = merge.loadExclusionRegions(exclusion_regions)
+    cache = None
+    if cache_dir is not None:
+        cache = EventCache(cache_dir, cache_size)
+
+    if not os.path.isdir(shard_dir):
+        os.makedirs(shard_dir)
+    table = EventTable()
+    loaderSettings = (edb, centerpointFlanking, transonly, exclusion_mate, parser, regions, cache, loadFilter)
+    with EventSpill(max_memory, spill_dir) as spill:
+        with metrics.phase('load'):
+            merge.loadSamples(table, vcf_files, loaderSettings, processes, metrics, spill)
+            if spill.n_runs:
+                # the remaining events as the last run, all events are then read from the spill
+                metrics.count('events_spilled', len(table))
+                spill.spill(table)
+
+        def chromosomes():
+            # the table and its rows of each chromosome, the spilled chromosomes are loaded one at a time
+            if spill.n_runs:
+                for chromosome in spill.chromosomes():
+                    loaded = spill.load(chromosome)
+                    yield chromosome, loaded, loaded.partitions()[chromosome]
+            else:
+                partitions = table.partitions()
+                for chromosome in sorted(partitions.keys(), key=chromosomeKey):
+                    yield chromosome, table, partitions[chromosome]
+
+        paths = []
+
+        def writeShard(shardTable, shardChromosomes, ends, chunk, core):
+            info = {
+                'chromosomes': shardChromosomes,
+                'ends': ends,
+                'chunk': chunk,
+                'core': core,
+                'samples': list(vcf_files),
+                'flanking': centerpointFlanking,
+                'sizeFlanking': sizeFlanking,
+                'breakends': breakends,
+            }
+            path = os.path.join(shard_dir, '{:06d}.shard'.format(len(paths)))
+            Shard(shardTable, info).dump(path)
+            paths.append(path)
+            metrics.count('shards')
+
+        # (chromosome, table) of the small chromosomes between contigs packed in the next shard
+        packed = []
+
+        def writePacked():
+            shardTable = packed[0][1]
+            ends = [len(shardTable)]
+            for chromosome, packedTable in packed[1:]:
+                shardTable.extend(packedTable)
+                ends.append(len(shardTable))
+            writeShard(shardTable, [list(chromosome) for chromosome, packedTable in packed], ends, 0,
+                       [0, len(shardTable)])
+            metrics.count('packed_chromosomes', len(packed))
+            del packed[:]
+
+        with metrics.phase('scatter'):
+            for chromosome, chromosomeTable, rows in chromosomes():
+                centerpoints = array.array('l', [chromosomeTable.centerpoint[row] for row in rows])
+                if breakends and chromosome[0] != chromosome[1]:
+                    chunks = [(0, len(rows), 0, len(rows))]
+                else:
+                    chunks = chunkRows(centerpoints, centerpointFlanking, chunkSize)
+                if chromosome[0] != chromosome[1] and len(chunks) == 1:
+                    # translocations of one pair are few, pack the pairs in report order in shared shards
+                    if packed and sum(len(item[1]) for item in packed) + len(rows) > PACKED_SHARD_EVENTS:
+                        writePacked()
+                    packed.append((chromosome, chromosomeTable.take(rows)))
+                    continue
+                if packed:
+                    writePacked()
+                for chunk, (start, end, core_start, core_end) in enumerate(chunks):
+                    writeShard(chromosomeTable.take(rows[start:end]), [list(chromosome)], [end - start], chunk,
+                               [core_start - start, core_end - start])
+                    metrics.count('overlap_events', (end - start) - (core_end - core_start))
+            if packed:
+                writePacked()
+    logger.info('Wrote {} shards to {}'.format(len(paths), shard_dir))
+    return paths
+
+
+def mergeShard(path, result_path, processes=1, metrics=None):
+    """
+        Cluster the events of one shard and write the shard with the cluster labels to `result_path`
+    """
+    if metrics is None:
+        metrics = Metrics()
+    with metrics.phase('load'):
+        shard = Shard.load(path)
+    if shard.labels is not None:
+        raise ValueError("Shard {} is already merged".format(path))
+
+    with metrics.phase('match'):
+        clusterer = merge.TableClusterer(shard.table, shard.info['flanking'], processes, shard.info['sizeFlanking'],
+                                         metrics=metrics, breakends=shard.info['breakends'])
+        for chromosome, hits in clusterer:
+            logger.info('Clustered {}: {}'.format(''.join(chromosome), len(hits)))
+        shard.labels = clusterer.rowLabels
+
+    with metrics.phase('write'):
+        shard.dump(result_path)
+
+
+def gatherShards(result_paths, output_file, bedoutput, vcf_output, regions_out, processes=1, index=False,
+                 metrics=None):
+    """
+        Write the clusters of the merged shards to the reports, as `pysvtools.merge.startMerge`
+
+        Clusters with the first member in the overlap with a neighbouring chunk belong to that chunk, and are
+        skipped here.
+
+        :param processes: number of threads compressing .gz reports
+        :param index: sort and index the compressed VCF and BED reports, see `pysvtools.merge.startMerge`
+    """
+    if metrics is None:
+        metrics = Metrics()
+    shards = []
+    for path in result_paths:
+        info, merged = Shard.loadInfo(path)
+        if not merged:
+            raise ValueError("Shard {} is not merged".format(path))
+        shards.append((info, path))
+    if not shards:
+        raise ValueError("No shards to gather")
+
+    samplelist = shards[0][0]['samples']
+    # a shard holds one chunk of a (chrA, chrB) chromosome, or several chromosomes in report order
+    shards.sort(key=lambda shard: (chromosomeKey(tuple(shard[0]['chromosomes'][0])), shard[0]['chunk']))
+    seen = set()
+    for info, path in shards:
+        if info['samples'] != samplelist:
+            raise ValueError("Shard {} is of other samples".format(path))
+        for contigs in info['chromosomes']:
+            if (tuple(contigs), info['chunk']) in seen:
+                raise ValueError("Shard {} of {} is given twice".format(info['chunk'], ''.join(contigs)))
+            seen.add((tuple(contigs), info['chunk']))
+
+    # the last chromosome on each contig, after which the contig is complete in the reports
+    lastChromosome = {}
+    for info, path in shards:
+        for contigs in info['chromosomes']:
+            for contig in contigs:
+                lastChromosome[contig] = tuple(contigs)
+    completes = {}
+    for contig, chromosome in lastChromosome.items():
+        completes.setdefault(chromosome, []).append(contig)
+
+    def chromosomeShards():
+        # the shards of each chromosome, with the index of the chromosome in the shard
+        for info, path in shards:
+            for i, contigs in enumerate(info['chromosomes']):
+                yield tuple(contigs), (info, path, i)
+
+    next_label = 0
+    progress = metrics.progress('Gathered shards', len(shards))
+    shard = None
+    with merge.ReportExport(samplelist, output_file, bedoutput, vcf_output, regions_out, metrics, threads=processes,
+                            index=index) as export:
+        for chromosome, chunks in itertools.groupby(chromosomeShards(), key=lambda item: item[0]):
+            hits = collections.OrderedDict()
+            for _, (info, path, i) in chunks:
+                if i == 0:
+                    with metrics.phase('load'):
+                        shard = Shard.load(path)
+                    # the clusters per chromosome of the shard, by the row of the first member
+                    clusters = [[] for contigs in info['chromosomes']]
+                    for members in clustersFromLabels(shard.labels, shard.table.sample):
+                        clusters[bisect.bisect_right(info['ends'], members[0])].append(members)
+                    progress.update()
+                table = shard.table
+                core_start, core_end = shard.core
+                for members in clusters[i]:
+                    if not core_start <= members[0] < core_end:
+                        metrics.count('overlap_clusters')
+                        continue
+                    items = collections.OrderedDict()
+                    for k in members:
+                        t = table.event(k, info['flanking'])
+                        t.matched_in = next_label
+                        items[table.samples[table.sample[k]]] = t
+                    hits[next_label] = items
+                    next_label += 1
+                    metrics.count('clusters')
+            if hits:
+                export.writeChromosome(''.join(chromosome), hits)
+            if chromosome in completes:
+                export.finishContigs(natsorted(completes[chromosome]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge in shards: scatter the events of the VCF files over '
+                                                 'shard files, merge each shard and gather the merged shards')
+    addMetricsArguments(parser)
+    subparsers = parser.add_subparsers(dest='command')
+
+    scatter = subparsers.add_parser('scatter', help='Load the VCF files and write the events in shards, the '
+                                                    'paths of the shards are printed')
+    scatter.add_argument('-c', '--exclusion_regions', action='append',
+                         help='Exclusion regions file in BED format')
+    scatter.add_argument('--exclusion_mate', action='store_true', default=False,
+                         help='Also skip translocations with the mate breakpoint in an exclusion region')
+    scatter.add_argument('-f', '--flanking', type=int,
+                         help='Centerpoint flanking [100]', default=100)
+    scatter.add_argument('-s', '--sizeflanking', type=int, default=None,
+                         help='Also match on size, with this maximum size difference')
+    scatter.add_argument('-t', '--translocation_only', action='store_true',
+                         help='Do translocations only', required=False, default=False)
+    scatter.add_argument('--breakends', action='store_true', default=False,
+                         help='Match translocations between contigs on the positions of both breakends, '
+                              'instead of on the centerpoint')
+    scatter.add_argument('--chunk_size', type=int, default=DEFAULT_CHUNK_SIZE,
+                         help='Span of the centerpoints in a shard in bp, shards are cut at gaps wider than the '
+                              'flanking [%(default)s]')
+    scatter.add_argument('-p', '--processes', type=int, default=1,
+                         help='Number of processes used to load the VCFs in parallel [1]')
+    scatter.add_argument('--parser', choices=list(merge.VCF_PARSERS.keys()), default='native',
+                         help='VCF parser, the native parser only reads the fields needed for merging '
+                              'and memory maps uncompressed VCFs [native]')
+    scatter.add_argument('--region', dest='regions', action='append', type=parseRegion,
+                         help='Only merge the calls in this region (chr:start-end), can be given multiple times')
+    addFilterArguments(scatter)
+    addCacheArguments(scatter)
+    addMemoryArguments(scatter, default=0)
+    scatter.add_argument('-d', '--shard_dir', required=True,
+                         help='Directory to write the shards to')
+    scatter.add_argument('-i', '--vcf', nargs='+', required=True,
+                         help='The VCF(s) to compare')
+
+    merge_shard = subparsers.add_parser('merge-shard', help='Cluster the events of one shard')
+    merge_shard.add_argument('-p', '--processes', type=int, default=1,
+                             help='Number of processes clustering the shard in parallel [1]')
+    merge_shard.add_argument('-i', '--shard', required=True,
+                             help='Shard written by scatter')
+    merge_shard.add_argument('-o', '--output', default=None,
+                             help='Merged shard to write [SHARD.merged]')
+
+    gather = subparsers.add_parser('gather', help='Write the reports of the merged shards')
+    gather.add_argument('-p', '--processes', '--threads', type=int, default=1,
+                        help='Number of threads compressing .gz reports [1]')
+    gather.add_argument('--index', action='store_true', default=False,
+                        help='Sort the .vcf.gz and .bed.gz reports by position and write a tabix index for these')
+    gather.add_argument('-i', '--shards', nargs='+', required=True,
+                        help='The merged shards of all chunks')
+    merge.addOutputArguments(gather)
+    args = parser.parse_args()
+
+    metrics = Metrics(args.progress)
+    if args.command == 'scatter':
+        if len(args.vcf) < 2:
+            logger.error("Please supply at least 2 VCF files to merge")
+            sys.exit(1)
+        paths = scatterShards(args.vcf, args.exclusion_regions, args.shard_dir, args.flanking, args.chunk_size,
+                              args.translocation_only, args.exclusion_mate, args.sizeflanking, args.processes,
+                              args.parser, args.regions, args.cache_dir, args.cache_size * 1024 * 1024, metrics,
+                              args.breakends, LoadFilter.fromArgs(args), args.max_memory * 1024 * 1024,
+                              args.spill_dir)
+        for path in paths:
+            print(path)
+    elif args.command == 'merge-shard':
+        mergeShard(args.shard, args.output or args.shard + '.merged', args.processes, metrics)
+    elif args.command == 'gather':
+        gatherShards(args.shards, args.output, args.bedoutput, args.vcfoutput, args.regions_out, args.processes,
+                     args.index, metrics)
+    else:
+        parser.print_help()
+        sys.exit(1)
+    if args.metrics:
+        metrics.dump(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function
+
+__desc__ = """
+    Spill of the loaded events to sorted runs on disk per chromosome, for merges which don't fit in memory.
+"""
+__author__ = "Wai Yi Leung <w.y.leung@lumc.nl>"
+
+import logging
+import os
+import shutil
+import tempfile
+
+from pysvtools.models import EventTable
+from pysvtools.models.eventtable import chromosomeKey
+
+logger = logging.getLogger(__name__)
+
+# rows per dumped block of a run, bounds the copy made while spilling
+SPILL_BLOCK_ROWS = 65536
+
+
+class EventSpill(object):
+    """
+        Temporary directory with the events of an `EventTable` which outgrew the memory budget
+
+        `spill` writes the rows of the table per (chrA, chrB) chromosome as a run sorted by centerpoint, appended to
+        the file of that chromosome, and empties the table. `load` reads all runs of one chromosome back into one
+        table, in spill order. As the runs are sorted, ordering that table by centerpoint (`EventTable.partitions`, a
+        stable merge sort) merges the runs, with the rows in the order of a table that was never spilled.
+
+        The merge checks the budget with `full` after each loaded file, as the events of a file are loaded at once
+        the memory in use can exceed the budget by the events of the files being loaded, one per load process.
+
+        Use as a context manager to remove the spill directory.
+
+        :param max_bytes: size of the table columns at which the table is spilled, see `full`
+        :param directory: directory to create the spill directory in, the system temporary directory when None
+    """
+
+    def __init__(self, max_bytes, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = tempfile.mkdtemp(prefix='pysvtools-spill-', dir=directory)
+        # run file per chromosome
+        self.paths = {}
+        self.n_runs = 0
+        self.n_events = 0
+
+    def full(self, table):
+        """
+            Whether the columns of `table` reached the memory budget
+        """
+        return table.nbytes >= self.max_bytes
+
+    def spill(self, table):
+        """
+            Write the rows of `table` as sorted runs per chromosome and empty the table
+        """
+        for chromosome, rows in table.partitions().items():
+            if chromosome not in self.paths:
+                self.paths[chromosome] = os.path.join(self.directory, 'chromosome{}.runs'.format(len(self.paths)))
+            with open(self.paths[chromosome], 'ab') as fh:
+                for start in range(0, len(rows), SPILL_BLOCK_ROWS):
+                    table.take(rows[start:start + SPILL_BLOCK_ROWS]).dump(fh)
+        logger.info('Spilled {} events to {}'.format(len(table), self.directory))
+        self.n_runs += 1
+        self.n_events += len(table)
+        table.clear()
+
+    def chromosomes(self):
+        """
+            The spilled (chrA, chrB) chromosomes in the order of `chromosomeKey`
+        """
+        return sorted(self.paths.keys(), key=chromosomeKey)
+
+    def load(self, chromosome, remove=True):
+        """
+            Read all runs of `chromosome` into one `EventTable`
+
+            :param remove: remove the runs once these are read
+        """
+        path = self.paths[chromosome]
+        size = os.path.getsize(path)
+        table = EventTable()
+        with open(path, 'rb') as fh:
+            while fh.tell() < size:
+                table.extend(EventTable.load(fh))
+        if remove:
+            os.remove(path)
+        return table
+
+    def completedContigs(self):
+        """
+            The contigs of which all events are clustered after each chromosome, see
+            `pysvtools.merge.TableClusterer.completedContigs`
+        """
+        lastChromosome = {}
+        for chromosome in self.chromosomes():
+            for contig in chromosome:
+                lastChromosome[contig] = chromosome
+        completes = {}
+        for contig, chromosome in lastChromosome.items():
+            completes.setdefault(chromosome, []).append(contig)
+        return completes
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return "<EventSpill {e} events in {r} runs, {c} chromosomes>".format(e=self.n_events, r=self.n_runs,
+                                                                          c=len(self.paths))
+
+
+def addMemoryArguments(parser, default=None):
+    """
+        Add the memory budget options to an `argparse.ArgumentParser`, the budget is in MB
+
+        :param default: default budget, None for no budget
+    """
+    helpText = ('Memory budget of the loaded events in MB, checked after each loaded VCF file. Beyond it the events '
+                'are spilled to sorted runs on disk and matched one chromosome at a time, with 0 every loaded file is '
+                'spilled')
+    if default is not None:
+        helpText += ' [%(default)s]'
+    parser.add_argument('--max_memory', type=int, default=default, metavar='MB', help=helpText)
+    parser.add_argument('--spill_dir', default=None,
+                        help='Directory for the events spilled with --max_memory [system temporary directory]')
@@ -0,0 +1,81 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function
+
+__desc__ = """
+    Persistent state of a merge, to add samples to a merged cohort without loading the merged samples again.
+"""
+__author__ = "Wai Yi Leung <w.y.leung@lumc.nl>"
+
+import array
+import json
+import os
+import tempfile
+
+from pysvtools.models import EventTable
+
+STATE_MAGIC = b'PYSVTOOLS-MERGESTATE-1\n'
+
+
+class MergeState(object):
+    """
+        Events of all merged samples with the cluster label of each event
+
+        The samples of the state are the samples of the table, in merge order. Events with the same label
+        form one cluster, the reported members follow from the labels.
+
+        :param table: `EventTable` with the events of all samples
+        :param labels: `array.array` with the cluster label per row of the table
+        :param settings: the merge settings the labels depend on, a state can only be extended with the same settings
+        :param next_label: first unused cluster label
+    """
+
+    def __init__(self, table, labels, settings, next_label):
+        if len(labels) != len(table):
+            raise ValueError("Expected {} labels, got {}".format(len(table), len(labels)))
+        self.table = table
+        self.labels = labels
+        self.settings = settings
+        self.next_label = next_label
+
+    @property
+    def samples(self):
+        return self.table.samples
+
+    def dump(self, path):
+        """
+            Write the state to `path`, replacing an existing state only when completely written
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(STATE_MAGIC)
+                header = {'settings': self.settings, 'next_label': self.next_label}
+                fh.write(json.dumps(header, sort_keys=True).encode('utf-8') + b'\n')
+                self.table.dump(fh)
+                self.labels.tofile(fh)
+            os.rename(tmp_path, path)
+        except:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """
+            :raises ValueError: when `path` is not a merge state
+        """
+        with open(path, 'rb') as fh:
+            if fh.readline() != STATE_MAGIC:
+                raise ValueError("{} is not a merge state".format(path))
+            header = json.loads(fh.readline().decode('utf-8'))
+            table = EventTable.load(fh)
+            labels = array.array('l')
+            try:
+                labels.fromfile(fh, len(table))
+            except EOFError:
+                raise ValueError("Merge state {} is truncated".format(path))
+        return cls(table, labels, header['settings'], header['next_label'])
+
+    def __repr__(self):
+        return "<MergeState {n} samples, {e} events>".format(n=len(self.samples), e=len(self.table))
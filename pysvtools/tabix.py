@@ -0,0 +1,422 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function
+
+__desc__ = """
+    Region restricted reading of VCF files, using the tabix index (.tbi) of BGZF compressed files,
+    and building the tabix index of written BGZF files.
+"""
+__author__ = "Wai Yi Leung <w.y.leung@lumc.nl>"
+
+import bisect
+import collections
+import gzip
+import os
+import re
+import struct
+
+import six
+
+from pysvtools.bgzf import BgzfReader, BgzfWriter, openText, BLOCK_SIZE
+
+TABIX_MAGIC = b'TBI\x01'
+
+# format and the (1-based) sequence, begin and end columns of the tabix presets,
+# 0x10000 in the format marks 0-based begin positions
+TABIX_PRESETS = {
+    'vcf': (2, 1, 2, 0),
+    'bed': (0x10000, 1, 2, 3),
+}
+
+# the linear index of tabix has one entry per 16kb window
+LINEAR_SHIFT = 14
+
+# largest position supported by the tabix binning scheme
+MAX_POSITION = 1 << 29
+
+REGION_PATTERN = re.compile(r'^(?P<contig>.+?)(:(?P<start>[0-9,]+)?(-(?P<end>[0-9,]+)?)?)?$')
+
+
+def parseRegion(region):
+    """
+        Parse a samtools style region: chr, chr:start or chr:start-end (1-based, inclusive)
+
+        :return: (contig, start, end) as 0-based half-open interval
+    """
+    match = REGION_PATTERN.match(region.strip())
+    if not match:
+        raise ValueError("Invalid region: {}".format(region))
+    start = match.group('start')
+    end = match.group('end')
+    start = int(start.replace(',', '')) - 1 if start else 0
+    end = int(end.replace(',', '')) if end else MAX_POSITION
+    if start < 0 or end <= start:
+        raise ValueError("Invalid region: {}".format(region))
+    return match.group('contig'), start, end
+
+
+def mergeRegions(regions):
+    """
+        Sort and merge overlapping (contig, start, end) regions
+
+        :return: OrderedDict of contig -> list of (start, end), contigs in order of first appearance
+    """
+    merged = collections.OrderedDict()
+    for contig, start, end in regions:
+        merged.setdefault(contig, []).append((start, end))
+    for contig, intervals in merged.items():
+        intervals.sort()
+        result = [intervals[0]]
+        for start, end in intervals[1:]:
+            if start <= result[-1][1]:
+                result[-1] = (result[-1][0], max(result[-1][1], end))
+            else:
+                result.append((start, end))
+        merged[contig] = result
+    return merged
+
+
+def recordSpan(line):
+    """
+        Contig and 0-based half-open span of a VCF data line, following tabix: from POS over the
+        length of REF, or up to END when given in INFO
+    """
+    fields = line.rstrip('\r\n').split('\t', 8)
+    start = int(fields[1]) - 1
+    end = start + len(fields[3])
+    info = fields[7]
+    i = info.find('END=')
+    while i >= 0:
+        if i == 0 or info[i - 1] == ';':
+            value = info[i + 4:].split(';', 1)[0]
+            if value.isdigit() and int(value) > start:
+                end = int(value)
+            break
+        i = info.find('END=', i + 1)
+    return fields[0], start, end
+
+
+def reg2bins(start, end):
+    """
+        Bins of the UCSC/tabix binning scheme overlapping the 0-based half-open interval
+    """
+    end -= 1
+    bins = [0]
+    for shift, offset in ((26, 1), (23, 9), (20, 73), (17, 585), (14, 4681)):
+        bins.extend(range(offset + (start >> shift), offset + (end >> shift) + 1))
+    return bins
+
+
+def reg2bin(start, end):
+    """
+        Smallest bin of the UCSC/tabix binning scheme holding the 0-based half-open interval
+    """
+    end -= 1
+    for shift, offset in ((14, 4681), (17, 585), (20, 73), (23, 9), (26, 1)):
+        if start >> shift == end >> shift:
+            return offset + (start >> shift)
+    return 0
+
+
+def lineSpan(line, preset):
+    """
+        Contig and 0-based half-open span of a data line of a tabix preset
+    """
+    if preset == 'vcf':
+        return recordSpan(line)
+    fields = line.split('\t', 3)
+    return fields[0], int(fields[1]), int(fields[2].rstrip('\r\n'))
+
+
+class TabixIndexBuilder(object):
+    """
+        Tabix index of a coordinate sorted file, built while the file is written
+
+        Records are added with their begin and end offset in the uncompressed data, which are converted to virtual
+        offsets when the index is written. As for tabix the records of a contig must be together and sorted by
+        begin position.
+
+        :param preset: 'vcf' or 'bed'
+    """
+
+    def __init__(self, preset='vcf'):
+        self.preset = preset
+        self.contigs = []
+        self._bins = []
+        self._linear = []
+        self._last = 0
+
+    def add(self, line, begin_offset, end_offset):
+        """
+            :raises ValueError: when the records are not sorted
+        """
+        contig, start, end = lineSpan(line, self.preset)
+        end = max(end, start + 1)
+        if not self.contigs or contig != self.contigs[-1]:
+            if contig in self.contigs:
+                raise ValueError("Records of {} are not together, can't index an unsorted file".format(contig))
+            self.contigs.append(contig)
+            self._bins.append({})
+            self._linear.append([])
+        elif start < self._last:
+            raise ValueError("Records of {} are not sorted at position {}".format(contig, start + 1))
+        self._last = start
+
+        # records of a bin share a chunk when the chunk ends in the block the record starts in, as for tabix.
+        # The blocks of `BgzfWriter` all hold `BLOCK_SIZE` bytes of uncompressed data.
+        chunks = self._bins[-1].setdefault(reg2bin(start, end), [])
+        if chunks and chunks[-1][1] // BLOCK_SIZE == begin_offset // BLOCK_SIZE:
+            chunks[-1][1] = end_offset
+        else:
+            chunks.append([begin_offset, end_offset])
+
+        # the first record overlapping a window has the lowest offset, as records are sorted
+        linear = self._linear[-1]
+        last_window = min(end - 1, MAX_POSITION - 1) >> LINEAR_SHIFT
+        if len(linear) <= last_window:
+            linear.extend([None] * (last_window + 1 - len(linear)))
+        for window in range(start >> LINEAR_SHIFT, last_window + 1):
+            if linear[window] is None:
+                linear[window] = begin_offset
+
+    def write(self, path, virtualOffset):
+        """
+            Write the index as BGZF compressed .tbi file
+
+            :param virtualOffset: function converting an offset in the uncompressed data to a virtual offset
+        """
+        fmt, col_seq, col_beg, col_end = TABIX_PRESETS[self.preset]
+        names = b''.join(contig.encode('utf-8') + b'\0' for contig in self.contigs)
+        data = [TABIX_MAGIC, struct.pack('<8i', len(self.contigs), fmt, col_seq, col_beg, col_end, ord('#'), 0,
+                                         len(names)), names]
+        for bins, linear in zip(self._bins, self._linear):
+            data.append(struct.pack('<i', len(bins)))
+            for bin_id in sorted(bins):
+                chunks = bins[bin_id]
+                data.append(struct.pack('<Ii', bin_id, len(chunks)))
+                for begin_offset, end_offset in chunks:
+                    data.append(struct.pack('<2Q', virtualOffset(begin_offset), virtualOffset(end_offset)))
+            # windows without records get the offset of the window before
+            offsets = []
+            previous = 0
+            for offset in linear:
+                if offset is not None:
+                    previous = virtualOffset(offset)
+                offsets.append(previous)
+            data.append(struct.pack('<i{}Q'.format(len(offsets)), len(offsets), *offsets))
+        with BgzfWriter(path) as fh:
+            fh.write(b''.join(data))
+
+
+class SortedIndexedWriter(object):
+    """
+        Writer of a BGZF compressed file sorted by position, with a tabix index written next to it on `close`
+
+        Header lines are written directly. Records are kept per contig until the contig is complete, see
+        `finishContigs`, and are then written sorted by begin position. Contigs not finished before `close` are
+        written in order of their first record.
+
+        :param preset: 'vcf' or 'bed'
+        :param threads: number of compression threads
+    """
+
+    def __init__(self, path, preset, threads=1):
+        self.path = path
+        self.preset = preset
+        self._writer = BgzfWriter(path, threads)
+        self._index = TabixIndexBuilder(preset)
+        self._pending = collections.OrderedDict()
+        self._finished = set()
+
+    def write(self, data):
+        for line in data.splitlines(True):
+            if line.startswith('#'):
+                self._writer.write(line)
+                continue
+            contig, start, end = lineSpan(line, self.preset)
+            if contig in self._finished:
+                raise ValueError("Record of {} after its contig was finished in {}".format(contig, self.path))
+            self._pending.setdefault(contig, []).append((start, line))
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def finishContigs(self, contigs):
+        """
+            Write the records of the contigs, no more records of these may follow
+        """
+        for contig in contigs:
+            self._finished.add(contig)
+            records = self._pending.pop(contig, [])
+            records.sort(key=lambda record: record[0])
+            for start, line in records:
+                begin_offset = self._writer.tell()
+                self._writer.write(line)
+                self._index.add(line, begin_offset, self._writer.tell())
+
+    def close(self):
+        if self._writer is None:
+            return
+        self.finishContigs(list(self._pending.keys()))
+        self._writer.close()
+        self._index.write(self.path + '.tbi', self._writer.virtualOffset)
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TabixIndex(object):
+    """
+        Tabix index of a BGZF compressed file, gives the file chunks (as virtual offsets) to read for a region
+    """
+
+    def __init__(self, path):
+        with gzip.open(path, 'rb') as fh:
+            data = fh.read()
+        if data[:4] != TABIX_MAGIC:
+            raise ValueError("{} is not a tabix index".format(path))
+
+        n_ref, self.format, self.col_seq, self.col_beg, self.col_end, meta, self.skip, l_nm = \
+            struct.unpack_from('<8i', data, 4)
+        self.meta = chr(meta)
+        offset = 36
+        self.contigs = [name.decode('utf-8') for name in data[offset:offset + l_nm].split(b'\0')[:n_ref]]
+        offset += l_nm
+
+        self.bins = []
+        self.linear = []
+        for _ in range(n_ref):
+            bins = {}
+            n_bin = struct.unpack_from('<i', data, offset)[0]
+            offset += 4
+            for _ in range(n_bin):
+                bin_id, n_chunk = struct.unpack_from('<Ii', data, offset)
+                offset += 8
+                chunks = struct.unpack_from('<{}Q'.format(2 * n_chunk), data, offset)
+                offset += 16 * n_chunk
+                bins[bin_id] = list(zip(chunks[::2], chunks[1::2]))
+            n_intv = struct.unpack_from('<i', data, offset)[0]
+            offset += 4
+            self.linear.append(struct.unpack_from('<{}Q'.format(n_intv), data, offset))
+            offset += 8 * n_intv
+            self.bins.append(bins)
+
+        self._tid = dict((name, i) for i, name in enumerate(self.contigs))
+
+    def __contains__(self, contig):
+        return contig in self._tid
+
+    def chunks(self, contig, start, end):
+        """
+            Merged (begin, end) virtual offset chunks which may hold records overlapping the region
+        """
+        tid = self._tid.get(contig)
+        if tid is None:
+            return []
+        linear = self.linear[tid]
+        min_offset = 0
+        if linear:
+            min_offset = linear[min(start >> LINEAR_SHIFT, len(linear) - 1)]
+
+        bins = self.bins[tid]
+        chunks = sorted(chunk for bin_id in reg2bins(start, end) for chunk in bins.get(bin_id, [])
+                        if chunk[1] > min_offset)
+        merged = []
+        for chunk_start, chunk_end in chunks:
+            if merged and chunk_start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], chunk_end))
+            else:
+                merged.append((chunk_start, chunk_end))
+        return merged
+
+    def __repr__(self):
+        return "<TabixIndex {} contigs>".format(len(self.contigs))
+
+
+def _decode(line):
+    if six.PY2:
+        return line
+    return line.decode('utf-8')
+
+
+def iterIndexedRegions(path, regions, index_path=None):
+    """
+        Lines of a BGZF compressed VCF overlapping the regions, read by seeking with its tabix index
+
+        The header is always included. Records are returned once, in file order per contig,
+        contigs in the order of the index.
+
+        :param regions: list of (contig, start, end) regions, 0-based half-open
+    """
+    index = TabixIndex(index_path or path + '.tbi')
+    merged = mergeRegions(regions)
+
+    with BgzfReader(path) as reader:
+        while True:
+            line = _decode(reader.readline())
+            if not line.startswith('#'):
+                break
+            yield line
+
+        for contig in index.contigs:
+            if contig not in merged:
+                continue
+            # a record spanning several regions is only returned for the first
+            seen = set()
+            for start, end in merged[contig]:
+                for chunk_start, chunk_end in index.chunks(contig, start, end):
+                    reader.seek(chunk_start)
+                    while reader.tell() < chunk_end:
+                        offset = reader.tell()
+                        line = _decode(reader.readline())
+                        if not line:
+                            break
+                        if line.startswith('#') or offset in seen:
+                            continue
+                        chrom, line_start, line_end = recordSpan(line)
+                        if chrom != contig or line_start >= end:
+                            break
+                        if line_end > start:
+                            seen.add(offset)
+                            yield line
+
+
+def iterFilteredRegions(lines, regions):
+    """
+        Lines of a VCF overlapping the regions, by scanning all lines. The header is always included.
+    """
+    merged = mergeRegions(regions)
+    starts = dict((contig, [start for start, end in intervals]) for contig, intervals in merged.items())
+    for line in lines:
+        if line.startswith('#'):
+            yield line
+            continue
+        chrom, start, end = recordSpan(line)
+        intervals = merged.get(chrom)
+        if not intervals:
+            continue
+        # the merged intervals are disjoint, only the last one starting before the end of the record can overlap
+        i = bisect.bisect_left(starts[chrom], end) - 1
+        if i >= 0 and intervals[i][1] > start:
+            yield line
+
+
+def openRegions(path, regions):
+    """
+        Open a (compressed) VCF file for reading the lines overlapping the regions
+
+        With a tabix index next to the file only the needed blocks are read, otherwise the whole file is scanned.
+
+        :param regions: list of (contig, start, end) regions, 0-based half-open, or None for the whole file
+        :return: iterable of lines
+    """
+    if not regions:
+        return openText(path)
+    if os.path.exists(path + '.tbi'):
+        return iterIndexedRegions(path, regions)
+    return iterFilteredRegions(openText(path), regions)
@@ -5,7 +5,7 @@ import re
 
 import vcf.model
 from pysvtools import __version__
-from pysvtools.models.exclusionregion import ExclusionRegion
+from pysvtools.models.exclusionregion import ExclusionRegion, ExclusionIndex
 
 
 def extractTXmate(record):
@@ -196,11 +196,15 @@ def formatVCFRecord(mergedHit):
 
 
 def build_exclusion(bed_exclude=None):
-    exclusiondb= []
+    """
+    :param bed_exclude: path to a BED file with the regions to exclude
+    :return: `ExclusionIndex` over all regions in the file
+    """
+    exclusiondb = ExclusionIndex()
     with open(bed_exclude, 'r') as fd:
         for r in fd:
             row = r.strip().split("\t")
             cols = dict(zip(['chromosome', 'start', 'end', 'band', 'color'], row))
             exclusion = ExclusionRegion(**cols)
-            exclusiondb.append(exclusion)
+            exclusiondb.add(exclusion)
     return exclusiondb
@@ -32,7 +32,9 @@ setup(
     test_suite='nose2.collector.collector',
     entry_points = {
         'console_scripts': [
-            'vcf_merge_sv_events = pysvtools.merge:main'
+            'vcf_merge_sv_events = pysvtools.merge:main',
+            'vcf_mergefaster_sv_events = pysvtools.mergefaster:main',
+            'vcf_shard_sv_events = pysvtools.shard:main'
         ]
     },
     classifiers = [
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+import os
+import shutil
+import tempfile
+
+import unittest2
+
+from pysvtools.cache import EventCache
+from pysvtools.models import EventTable
+
+
+class TestCache(unittest2.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.vcf = os.path.join(self.directory, 'sample.vcf')
+        with open(self.vcf, 'w') as fh:
+            fh.write('##fileformat=VCFv4.1\n')
+        self.table = EventTable()
+        self.table.append("chr1", 1000, "chr1", 1100, "DEL", 1, self.vcf, "delly")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_store_load(self):
+        cache = EventCache(os.path.join(self.directory, 'cache'))
+        key = cache.key(self.vcf, {'transonly': False})
+        self.assertIsNone(cache.load(key))
+        cache.store(key, 'delly', 3, self.table)
+
+        sv_caller, skipped_events, table = cache.load(key)
+        self.assertEqual(sv_caller, 'delly')
+        self.assertEqual(skipped_events, 3)
+        self.assertEqual(str(table.event(0)), str(self.table.event(0)))
+
+    def test_key_changes(self):
+        cache = EventCache(os.path.join(self.directory, 'cache'))
+        key = cache.key(self.vcf, {'transonly': False})
+        self.assertEqual(key, cache.key(self.vcf, {'transonly': False}))
+        self.assertNotEqual(key, cache.key(self.vcf, {'transonly': True}))
+        with open(self.vcf, 'a') as fh:
+            fh.write('#CHROM\n')
+        self.assertNotEqual(key, cache.key(self.vcf, {'transonly': False}))
+
+    def test_evict_least_recently_used(self):
+        cache = EventCache(os.path.join(self.directory, 'cache'))
+        keys = [cache.key(self.vcf, {'n': i}) for i in range(3)]
+        for i, key in enumerate(keys):
+            cache.store(key, 'delly', 0, self.table)
+            # distinct last use times, oldest first
+            os.utime(cache._path(key), (1000 + i, 1000 + i))
+        size = cache.entries()[0][1]
+
+        cache.load(keys[0])
+        cache.max_size = 2 * size
+        cache.evict()
+        self.assertIsNotNone(cache.load(keys[0]))
+        self.assertIsNone(cache.load(keys[1]))
+        self.assertIsNotNone(cache.load(keys[2]))
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+import argparse
+
+import unittest2
+import vcf
+
+from pysvtools.filters import LoadFilter, FilteredLines, addFilterArguments
+
+LINES = [
+    u"##fileformat=VCFv4.1\n",
+    u"#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n",
+    u"chr1\t1000\tdel1\tN\t<DEL>\t.\tPASS\tSVTYPE=DEL;END=1500\n",
+    u"chr1\t2000\tdup1\tN\t<DUP>\t.\tLowQual\tSVTYPE=DUP;END=2600\n",
+    u"chr2\t3000\tctx1\tN\t<CTX>\t.\t.\tSVTYPE=CTX;CHR2=chr3;END=5000\n",
+]
+
+
+class TestLoadFilter(unittest2.TestCase):
+    def test_raw_check(self):
+        loadFilter = LoadFilter(svtypes=['DEL'], pass_only=True)
+        self.assertTrue(loadFilter.checksText)
+        self.assertEqual([loadFilter.acceptsLine(line) for line in LINES[2:]], [True, False, False])
+        # the same check on bytes, as done by the native readers
+        self.assertEqual([loadFilter.acceptsLine(line.encode('utf-8')) for line in LINES[2:]], [True, False, False])
+
+    def test_translocation_aliases(self):
+        loadFilter = LoadFilter(svtypes=['TRA'])
+        self.assertEqual([loadFilter.acceptsLine(line) for line in LINES[2:]], [False, False, True])
+        self.assertTrue(loadFilter.accepts("chr2", 3000, "chr3", 5000, "TRA", None))
+        self.assertFalse(loadFilter.accepts("chr1", 1000, "chr1", 1500, "DEL", None))
+        self.assertEqual(LoadFilter(svtypes=['CTX']).svtypes, frozenset(['TRA']))
+
+    def test_typed_check(self):
+        loadFilter = LoadFilter(min_size=100, max_size=1000, min_dp=5)
+        # no raw check, the size and read depth need the parsed call
+        self.assertFalse(loadFilter.checksText)
+        self.assertTrue(loadFilter.accepts("chr1", 1000, "chr1", 1500, "DEL", 5))
+        self.assertTrue(loadFilter.accepts("chr1", 1000, "chr1", 1500, "DEL", [8]))
+        self.assertFalse(loadFilter.accepts("chr1", 1000, "chr1", 1050, "DEL", 5))
+        self.assertFalse(loadFilter.accepts("chr1", 1000, "chr1", 3000, "DEL", 5))
+        self.assertFalse(loadFilter.accepts("chr1", 1000, "chr1", 1500, "DEL", 4))
+        self.assertFalse(loadFilter.accepts("chr1", 1000, "chr1", 1500, "DEL", None))
+        # translocations between contigs have no size
+        self.assertTrue(loadFilter.accepts("chr1", 1000, "chr2", 1010, "TRA", 5))
+
+    def test_typed_filter(self):
+        # FILTER as parsed by PyVCF
+        self.assertEqual([LoadFilter(pass_only=True).acceptsFilter(filters) for filters in ([], None, ['LowQual'])],
+                         [True, True, False])
+        self.assertTrue(LoadFilter(min_dp=1).acceptsFilter(['LowQual']))
+        self.assertEqual([LoadFilter(pass_only=True).acceptsFilter(record.FILTER) for record in
+                          vcf.Reader(iter(LINES))], [True, False, True])
+
+    def test_contigs(self):
+        loadFilter = LoadFilter(contigs=['chr1', 'chr2'])
+        self.assertEqual([loadFilter.acceptsLine(line) for line in LINES[2:]], [True, True, True])
+        # the mate contig is only known after parsing
+        self.assertFalse(loadFilter.accepts("chr2", 3000, "chr3", 5000, "TRA", None))
+
+    def test_filtered_lines(self):
+        lines = FilteredLines(iter(LINES), LoadFilter(pass_only=True))
+        records = list(vcf.Reader(lines))
+        self.assertEqual([record.ID for record in records], ['del1', 'ctx1'])
+        self.assertEqual(lines.prefiltered, 1)
+
+    def test_from_args(self):
+        parser = argparse.ArgumentParser()
+        addFilterArguments(parser)
+        self.assertIsNone(LoadFilter.fromArgs(parser.parse_args([])))
+        loadFilter = LoadFilter.fromArgs(parser.parse_args(['--svtype', 'DUP', '--svtype', 'DEL', '--min_dp', '3']))
+        self.assertEqual(loadFilter.settings(), {'svtypes': ['DEL', 'DUP'], 'min_dp': 3})
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+import array
+import random
+
+import unittest2
+
+from pysvtools.matcher import iterClusters, clusterMembers, iterSortedEvents, \
+    splitAtGaps, clusterPartition, labelClusters, clustersFromLabels, updateLabels, labelGridClusters, DisjointSet, \
+    labelBreakendClusters, iterBreakendClusters
+from pysvtools.models import Event
+
+
+class TestMatcher(unittest2.TestCase):
+    def test_iterclusters_links_other_samples(self):
+        entries = [(100, "s1", "a"), (150, "s1", "b"), (180, "s2", "c"), (1000, "s2", "d")]
+        clusters = list(iterClusters(entries, 100))
+        self.assertEqual(len(clusters), 2)
+        self.assertEqual([e[2] for e in clusters[0]], ["a", "b", "c"])
+        self.assertEqual([e[2] for e in clusters[1]], ["d"])
+
+    def test_iterclusters_same_sample_not_linked(self):
+        entries = [(100, "s1", "a"), (150, "s1", "b")]
+        clusters = list(iterClusters(entries, 100))
+        self.assertEqual(len(clusters), 2)
+
+    def test_iterclusters_joins_clusters(self):
+        # z links the clusters of x and y, the members come in input order
+        entries = [(100, "s1", "x"), (180, "s1", "y"), (190, "s2", "z"), (500, "s3", "w")]
+        stats = {}
+        clusters = list(iterClusters(entries, 100, stats))
+        self.assertEqual([[e[2] for e in cluster] for cluster in clusters], [["x", "y", "z"], ["w"]])
+        self.assertEqual(stats, {'comparisons': 3, 'matches': 2})
+
+    def test_iterclusters_equals_connected_components(self):
+        rnd = random.Random(7)
+        entries = sorted((rnd.randint(1, 5000), "s{}".format(rnd.randint(1, 4)), i) for i in range(300))
+
+        # brute force connected components over the links between different samples
+        component = list(range(len(entries)))
+
+        def find(i):
+            while component[i] != i:
+                i = component[i]
+            return i
+
+        for i, a in enumerate(entries):
+            for j, b in enumerate(entries):
+                if a[1] != b[1] and abs(a[0] - b[0]) <= 50:
+                    component[find(i)] = find(j)
+        expected = {}
+        for i, entry in enumerate(entries):
+            expected.setdefault(find(i), set()).add(entry[2])
+
+        found = [set(e[2] for e in cluster) for cluster in iterClusters(entries, 50)]
+        self.assertEqual(sorted(map(sorted, found)), sorted(map(sorted, expected.values())))
+
+    def test_clustermembers_first_per_sample(self):
+        members = clusterMembers([(100, "s1", "a"), (120, "s2", "b"), (130, "s1", "c")])
+        self.assertEqual(list(members.items()), [("s1", "a"), ("s2", "b")])
+
+    def test_itersortedevents_orders_by_centerpoint(self):
+        s1 = [Event("chr1", 100, "chr1", 10000), Event("chr1", 200, "chr1", 300), Event("chr2", 50, "chr2", 60)]
+        s2 = [Event("chr1", 150, "chr1", 250), Event("chr2", 10, "chr2", 20)]
+        merged = list(iterSortedEvents([s1, s2], lambda contig: contig))
+        self.assertEqual([(i, t.chrA, t.centerpoint) for i, t in merged],
+                         [(1, "chr1", 200), (0, "chr1", 250), (0, "chr1", 5050), (1, "chr2", 15), (0, "chr2", 55)])
+
+    def test_itersortedevents_unsorted(self):
+        s1 = [Event("chr1", 200, "chr1", 300), Event("chr1", 100, "chr1", 200)]
+        with self.assertRaises(ValueError):
+            list(iterSortedEvents([s1], lambda contig: contig))
+
+    def test_splitatgaps(self):
+        centerpoints = [10, 20, 30, 500, 510, 2000, 2010, 2020]
+        self.assertEqual(splitAtGaps(centerpoints, 100, 2), [(0, 3), (3, 5), (5, 8)])
+        self.assertEqual(splitAtGaps(centerpoints, 100, 4), [(0, 5), (5, 8)])
+        self.assertEqual(splitAtGaps(centerpoints, 1000, 2), [(0, 5), (5, 8)])
+        self.assertEqual(splitAtGaps([], 100, 2), [])
+
+    def test_disjointset(self):
+        clusters = DisjointSet(6)
+        clusters.union(0, 1)
+        clusters.union(2, 3)
+        clusters.union(1, 3)
+        self.assertEqual(len(set(clusters.find(i) for i in range(4))), 1)
+        self.assertNotEqual(clusters.find(4), clusters.find(0))
+        self.assertEqual(clusters.find(5), 5)
+        self.assertEqual(clusters.add(), 6)
+        self.assertEqual(clusters.union(6, 4), clusters.find(4))
+        self.assertEqual(len(clusters), 7)
+
+    def test_disjointset_path_compression(self):
+        clusters = DisjointSet(4)
+        # a chain 3 -> 2 -> 1 -> 0, as built without union by rank
+        clusters.parent[1:] = array.array('l', [0, 1, 2])
+        self.assertEqual(clusters.find(3), 0)
+        self.assertEqual(list(clusters.parent), [0, 0, 0, 0])
+
+    def test_clusterpartition(self):
+        partition = ("chr1chr1", array.array('l', [100, 120, 150, 5000]), array.array('i', [0, 1, 0, 1]), 100,
+                     None, None, None)
+        key, clusters, labels, stats = clusterPartition(partition)
+        self.assertEqual(key, "chr1chr1")
+        self.assertEqual([list(members) for members in clusters], [[0, 1]])
+        self.assertEqual(list(labels), [0, 0, 0, 1])
+        self.assertEqual((stats['comparisons'], stats['matches']), (3, 2))
+        self.assertGreaterEqual(stats['wall'], 0)
+
+    def test_labelclusters(self):
+        centerpoints = [100, 150, 240, 1000, 1050]
+        samples = [0, 0, 1, 0, 0]
+        self.assertEqual(list(labelClusters(centerpoints, samples, 100)), [0, 1, 1, 2, 3])
+
+    def test_clustersfromlabels_first_per_sample(self):
+        labels = [0, 1, 0, 0, 1]
+        samples = [0, 0, 1, 0, 0]
+        self.assertEqual([list(members) for members in clustersFromLabels(labels, samples)], [[0, 2]])
+
+    def test_updatelabels_equals_labelclusters(self):
+        rnd = random.Random(11)
+        entries = sorted((rnd.randint(1, 5000), rnd.randint(0, 4)) for _ in range(400))
+        centerpoints = [e[0] for e in entries]
+        samples = [e[1] for e in entries]
+
+        # label the first 3 samples, then add the others
+        old = [k for k, sample in enumerate(samples) if sample < 3]
+        labels = array.array('l', [-1] * len(entries))
+        oldLabels = labelClusters([centerpoints[k] for k in old], [samples[k] for k in old], 50)
+        for k, label in zip(old, oldLabels):
+            labels[k] = label
+        labels, next_label = updateLabels(centerpoints, samples, labels, 50, max(oldLabels) + 1)
+
+        def components(labels):
+            found = {}
+            for k, label in enumerate(labels):
+                found.setdefault(label, []).append(k)
+            return sorted(found.values())
+
+        self.assertEqual(components(labels), components(labelClusters(centerpoints, samples, 50)))
+        self.assertGreater(next_label, max(labels))
+
+    def test_labelgridclusters_size(self):
+        centerpoints = [100, 120, 140]
+        sizes = [1000, 1040, 5000]
+        samples = [0, 1, 2]
+        self.assertEqual(list(labelGridClusters(centerpoints, sizes, samples, 100, 50)), [0, 0, 1])
+
+    def test_labelgridclusters_equals_connected_components(self):
+        rnd = random.Random(3)
+        entries = sorted((rnd.randint(1, 3000), rnd.randint(50, 400), rnd.randint(0, 3)) for _ in range(300))
+        centerpoints = [e[0] for e in entries]
+        sizes = [e[1] for e in entries]
+        samples = [e[2] for e in entries]
+
+        # brute force over all pairs, labeled in order of the first member
+        component = list(range(len(entries)))
+
+        def find(i):
+            while component[i] != i:
+                i = component[i]
+            return i
+
+        for i, a in enumerate(entries):
+            for j, b in enumerate(entries):
+                if a[2] != b[2] and abs(a[0] - b[0]) <= 50 and abs(a[1] - b[1]) <= 30:
+                    component[find(i)] = find(j)
+        expected = []
+        roots = {}
+        for i in range(len(entries)):
+            expected.append(roots.setdefault(find(i), len(roots)))
+
+        self.assertEqual(list(labelGridClusters(centerpoints, sizes, samples, 50, 30)), expected)
+
+    def test_labelgridclusters_without_size_limit(self):
+        rnd = random.Random(5)
+        entries = sorted((rnd.randint(1, 3000), rnd.randint(0, 3)) for _ in range(200))
+        centerpoints = [e[0] for e in entries]
+        samples = [e[1] for e in entries]
+        self.assertEqual(list(labelGridClusters(centerpoints, [100] * len(entries), samples, 50, 0)),
+                         list(labelClusters(centerpoints, samples, 50)))
+
+    def test_labelbreakendclusters(self):
+        positionsA = [1000, 1050, 1080, 1000]
+        positionsB = [50000, 50090, 60000, 50500]
+        samples = [0, 1, 2, 2]
+        # both breakends must be within the flanking
+        self.assertEqual(list(labelBreakendClusters(positionsA, positionsB, samples, 100)), [0, 0, 1, 2])
+
+    def test_labelbreakendclusters_equals_connected_components(self):
+        rnd = random.Random(7)
+        entries = [(rnd.randint(1, 3000), rnd.randint(1, 3000), rnd.randint(0, 3)) for _ in range(300)]
+        component = list(range(len(entries)))
+
+        def find(i):
+            while component[i] != i:
+                i = component[i]
+            return i
+
+        for i, a in enumerate(entries):
+            for j, b in enumerate(entries):
+                if a[2] != b[2] and abs(a[0] - b[0]) <= 60 and abs(a[1] - b[1]) <= 60:
+                    component[find(i)] = find(j)
+        expected = []
+        roots = {}
+        for i in range(len(entries)):
+            expected.append(roots.setdefault(find(i), len(roots)))
+
+        labels = labelBreakendClusters([e[0] for e in entries], [e[1] for e in entries], [e[2] for e in entries], 60)
+        self.assertEqual(list(labels), expected)
+
+    def test_clusterpartition_breakends(self):
+        partition = ("chr1chr2", array.array('l', [25000, 25040, 25100]), array.array('i', [0, 1, 2]), 100,
+                     None, None, (array.array('l', [1000, 1020, 1010]), array.array('l', [49000, 49060, 49300])))
+        key, clusters, labels, stats = clusterPartition(partition)
+        self.assertEqual([list(members) for members in clusters], [[0, 1]])
+        self.assertEqual(list(labels), [0, 0, 1])
+
+    def test_iterbreakendclusters(self):
+        events = [Event("chr1", 1000, "chr2", 49000), Event("chr1", 1020, "chr2", 49060),
+                  Event("chr1", 1010, "chr2", 49300)]
+        entries = [(t.centerpoint, sample, t) for sample, t in zip(["s1", "s2", "s3"], events)]
+        clusters = iterBreakendClusters(entries, 100)
+        self.assertEqual([[entry[1] for entry in cluster] for cluster in clusters], [["s1", "s2"], ["s3"]])
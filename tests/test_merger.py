@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+import io
+import os
+
+import unittest2
+import vcf
+
+from pysvtools.filters import LoadFilter
+from pysvtools.merge import SVMerger
+from pysvtools.models import Event
+from pysvtools.reader import SVReader
+
+DATA = os.path.join(os.path.dirname(__file__), 'data', 'calls.vcf')
+
+
+class TestSVMerger(unittest2.TestCase):
+    def test_events(self):
+        merger = SVMerger(100)
+        merger.addSample('s1', [Event("chr1", 1000, "chr1", 1100, sv_type="DEL", dp=10),
+                                Event("chr2", 5000, "chr2", 6000, sv_type="DEL", dp=10)])
+        merger.addSample('s2', [Event("chr1", 1020, "chr1", 1120, sv_type="DEL", dp=20),
+                                Event("chr1", 9000, "chr1", 9500, sv_type="DUP", dp=5)])
+        clusters = list(merger)
+        self.assertEqual(len(clusters), 1)
+        cluster = clusters[0]
+        self.assertEqual(cluster.virtualChr, "chr1chr1")
+        self.assertEqual(list(cluster.members.keys()), ['s1', 's2'])
+        # the event with the highest DP represents the cluster
+        self.assertEqual((cluster.event.chrApos, cluster.event.dp), (1020, 20))
+        self.assertEqual(cluster.members['s1'].matched_in, cluster.event.matched_in)
+
+    def test_missing_dp(self):
+        merger = SVMerger(100)
+        merger.addSample('s1', [Event("chr1", 1000, "chr1", 1100, sv_type="DEL", dp=None)])
+        merger.addSample('s2', [Event("chr1", 1020, "chr1", 1120, sv_type="DEL", dp=3)])
+        merger.addSample('s3', [Event("chr1", 1010, "chr1", 1110, sv_type="DEL", dp=None)])
+        clusters = list(merger)
+        self.assertEqual([(cluster.event.chrApos, cluster.event.dp) for cluster in clusters], [(1020, 3)])
+
+    def test_vcf_and_reader(self):
+        merger = SVMerger(100)
+        merger.addSample(DATA)
+        with open(DATA) as fh:
+            merger.addSample('copy', SVReader(fh))
+        self.assertEqual(merger.samples, [DATA, 'copy'])
+        clusters = list(merger)
+        self.assertEqual(len(clusters), len(merger.table) // 2)
+        self.assertEqual([cluster.event.chrApos for cluster in clusters if cluster.virtualChr == 'chr1chr1'],
+                         sorted(cluster.event.chrApos for cluster in clusters if cluster.virtualChr == 'chr1chr1'))
+        self.assertEqual(merger.metrics.counters['events_loaded'], len(merger.table))
+
+    def test_reader_load_filter(self):
+        with open(DATA) as fh:
+            text = fh.read().replace("\tPASS\tSVTYPE=DUP", "\tLowQual\tSVTYPE=DUP")
+        merger = SVMerger(100, loadFilter=LoadFilter(pass_only=True))
+        # the readers don't drop the records of the raw check themselves
+        merger.addSample('native', SVReader(io.StringIO(text)))
+        merger.addSample('pyvcf', vcf.Reader(io.StringIO(text)))
+        self.assertEqual(len(merger.table), 10)
+        self.assertNotIn('DUP', merger.table.svtypes)
+        self.assertEqual(merger.metrics.counters['events_filtered'], 2)
+
+    def test_iterate_again_after_adding(self):
+        merger = SVMerger(100)
+        merger.addSample('s1', [Event("chr1", 1000, "chr1", 1100, sv_type="DEL", dp=10)])
+        merger.addSample('s2', [Event("chr1", 1000, "chr1", 1100, sv_type="DEL", dp=10)])
+        self.assertEqual([len(cluster.members) for cluster in merger], [2])
+        merger.addSample('s3', [Event("chr1", 1010, "chr1", 1110, sv_type="DEL", dp=10)])
+        self.assertEqual([len(cluster.members) for cluster in merger], [3])
+
+    def test_duplicate_sample(self):
+        merger = SVMerger(100)
+        merger.addSample('s1', [])
+        with self.assertRaises(ValueError):
+            merger.addSample('s1', [])
+
+    def test_breakends(self):
+        merger = SVMerger(100, breakends=True)
+        merger.addSample('s1', [Event("chr1", 1000, "chr2", 50000, sv_type="TRA"),
+                                Event("chr1", 1000, "chr2", 90000, sv_type="TRA")])
+        merger.addSample('s2', [Event("chr1", 1050, "chr2", 50080, sv_type="TRA")])
+        clusters = list(merger)
+        self.assertEqual([(cluster.virtualChr, cluster.event.chrBpos) for cluster in clusters],
+                         [("chr1chr2", 50000)])
+        self.assertEqual(list(clusters[0].members.keys()), ['s1', 's2'])
+
+    def test_same_virtualchr(self):
+        # 1 + 12 and 11 + 2 are both virtualChr 112, but other chromosomes
+        for breakends in (False, True):
+            merger = SVMerger(100, breakends=breakends)
+            merger.addSample('s1', [Event("1", 1000, "12", 1000, sv_type="TRA")])
+            merger.addSample('s2', [Event("11", 1000, "2", 1000, sv_type="TRA")])
+            self.assertEqual(list(merger), [])
+            merger.addSample('s3', [Event("11", 1010, "2", 1010, sv_type="TRA")])
+            self.assertEqual([(cluster.virtualChr, list(cluster.members.keys())) for cluster in merger],
+                             [("112", ['s2', 's3'])])
+
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+import json
+import os
+import shutil
+import tempfile
+
+import unittest2
+
+from pysvtools.metrics import Metrics, Progress
+
+
+class TestMetrics(unittest2.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_phase_adds_up(self):
+        metrics = Metrics()
+        with metrics.phase('load'):
+            pass
+        with metrics.phase('load'):
+            pass
+        metrics.addTime('load', 1.5, 0.5)
+        self.assertEqual(list(metrics.phases), ['load'])
+        self.assertGreaterEqual(metrics.phases['load']['wall'], 1.5)
+        self.assertGreaterEqual(metrics.phases['load']['cpu'], 0.5)
+
+    def test_phase_timed_on_error(self):
+        metrics = Metrics()
+        with self.assertRaises(ValueError):
+            with metrics.phase('write'):
+                raise ValueError()
+        self.assertIn('write', metrics.phases)
+
+    def test_counters_and_chromosomes(self):
+        metrics = Metrics()
+        metrics.count('events_loaded', 10)
+        metrics.count('comparisons', 4)
+        metrics.count('comparisons')
+        metrics.addChromosome('chr1chr1', events=3, match_wall=0.5)
+        metrics.addChromosome('chr1chr1', events=2)
+        self.assertEqual(metrics.counters['comparisons'], 5)
+        self.assertEqual(metrics.chromosomes['chr1chr1']['events'], 5)
+        self.assertEqual(metrics.chromosomes['chr1chr1']['match_wall'], 0.5)
+
+    def test_dump(self):
+        metrics = Metrics()
+        metrics.count('events_loaded', 10)
+        with metrics.phase('load'):
+            pass
+        path = os.path.join(self.directory, 'metrics.json')
+        metrics.dump(path)
+        with open(path) as fh:
+            data = json.load(fh)
+        self.assertEqual(data['counters'], {'events_loaded': 10})
+        self.assertIn('load', data['phases'])
+        self.assertIn('peak_rss', data)
+        self.assertIn('events_per_second', data)
+
+    def test_progress_format(self):
+        progress = Progress('Loaded', 4)
+        progress.update(2)
+        message = progress.format(progress.start + 1.)
+        self.assertTrue(message.startswith('Loaded: 2/4 (50.0%), 2.0/s'))
+        self.assertIn('ETA 0:00:01', message)
+
+    def test_progress_unknown_total(self):
+        progress = Progress('Merged', None)
+        progress.update()
+        self.assertTrue(progress.format(progress.start + 1.).startswith('Merged: 1/None, 1.0/s'))
@@ -1,4 +1,6 @@
 #!/usr/bin/env python
+import io
+
 import unittest2
 
 from six import string_types
@@ -83,6 +85,15 @@ class TestModels(unittest2.TestCase):
         self.assertTrue(eventA.size >= 0)
         self.assertEqual(eventA.size, 4)
 
+    def test_event_flank_bounds(self):
+        event = pysvtools.models.Event("chr1", 5000, "chr1", 1000, sv_type="DEL", cp_flank=100)
+        self.assertEqual(event.size, 4000)
+        self.assertEqual(event.centerpoint, 3000)
+        self.assertEqual(event.get_centerpoint, 3000)
+        self.assertEqual(event.lft, 2900)
+        self.assertEqual(event.rgt, 3100)
+        self.assertEqual(event.virtualChr, "chr1chr1")
+
     def test_event_notequal(self):
         chrA = "chr1"
         chrB = "chr5"
@@ -219,3 +230,87 @@ class TestModels(unittest2.TestCase):
         self.assertTrue(exregionA.overlaps("chrA", 1))
         self.assertTrue(exregionA.overlaps("chrA", 5))
         self.assertTrue(exregionA.overlaps("chrA", 10))
+
+    def test_exclusionindex_overlap(self):
+        exindex = pysvtools.models.ExclusionIndex([
+            pysvtools.models.ExclusionRegion("chrA", 1, 10),
+            pysvtools.models.ExclusionRegion("chrA", 5, 20),
+            pysvtools.models.ExclusionRegion("chrA", 100, 200),
+        ])
+        self.assertEqual(len(exindex), 3)
+
+        self.assertFalse(exindex.overlaps("chrB", 5))
+        self.assertFalse(exindex.overlaps("chrA", 0))
+        self.assertFalse(exindex.overlaps("chrA", 21))
+        self.assertFalse(exindex.overlaps("chrA", 201))
+
+        self.assertTrue(exindex.overlaps("chrA", 1))
+        self.assertTrue(exindex.overlaps("chrA", 15))
+        self.assertTrue(exindex.overlaps("chrA", 20))
+        self.assertTrue(exindex.overlaps("chrA", 150))
+
+    def test_exclusionindex_add(self):
+        exindex = pysvtools.models.ExclusionIndex()
+        self.assertFalse(exindex.overlaps("chrA", 5))
+        exindex.add(pysvtools.models.ExclusionRegion("chrA", 1, 10))
+        self.assertTrue(exindex.overlaps("chrA", 5))
+
+    def test_eventtable_append(self):
+        table = pysvtools.models.EventTable()
+        table.append("chr1", 500, "chr1", 100, "DEL", 10, "s1", "delly")
+        self.assertEqual(len(table), 1)
+        self.assertEqual(table.posA[0], 100)
+        self.assertEqual(table.posB[0], 500)
+        self.assertEqual(table.size[0], 400)
+        self.assertEqual(table.centerpoint[0], 300)
+        self.assertEqual(table.virtualChr(0), "chr1chr1")
+
+    def test_eventtable_event(self):
+        table = pysvtools.models.EventTable()
+        table.append("chr2", 1000, "chr1", 100, "TRA", None, "s1", "delly")
+        event = table.event(0)
+        reference = pysvtools.models.Event("chr2", 1000, "chr1", 100, sv_type="TRA", dp=None, svmethod="delly")
+        self.assertEqual(str(event), str(reference))
+        self.assertEqual(event.centerpoint, reference.centerpoint)
+        self.assertEqual(event.virtualChr, reference.virtualChr)
+        self.assertIsNone(event.dp)
+        self.assertEqual(event.svmethod, "delly")
+
+    def test_eventtable_extend_partitions(self):
+        tableA = pysvtools.models.EventTable()
+        tableA.append("chr1", 1000, "chr1", 1100, "DEL", 1, "s1")
+        tableA.append("chr2", 100, "chr2", 200, "DEL", 1, "s1")
+        tableB = pysvtools.models.EventTable()
+        tableB.append("chr1", 100, "chr1", 200, "DUP", 2, "s2")
+        tableA.extend(tableB)
+
+        self.assertEqual(len(tableA), 3)
+        self.assertEqual(tableA.samples, ["s1", "s2"])
+        self.assertEqual(tableA.svtypes[tableA.svtype[2]], "DUP")
+
+        partitions = tableA.partitions()
+        self.assertEqual(sorted(partitions.keys()), [("chr1", "chr1"), ("chr2", "chr2")])
+        self.assertEqual(list(partitions[("chr1", "chr1")]), [2, 0])
+
+    def test_eventtable_dump_load(self):
+        table = pysvtools.models.EventTable()
+        table.append("chr1", 1000, "chr1", 1100, "DEL", 1, "s1", "delly")
+        table.append("chr2", 100, "chr1", 200, "TRA", None, "s1", "delly")
+        fh = io.BytesIO()
+        table.dump(fh)
+        fh.seek(0)
+        loaded = pysvtools.models.EventTable.load(fh)
+
+        self.assertEqual(len(loaded), 2)
+        self.assertEqual(loaded.contigs, table.contigs)
+        for name, typecode in table.COLUMNS:
+            self.assertEqual(getattr(loaded, name), getattr(table, name))
+        self.assertEqual(str(loaded.event(1)), str(table.event(1)))
+
+    def test_eventtable_load_truncated(self):
+        table = pysvtools.models.EventTable()
+        table.append("chr1", 1000, "chr1", 1100, "DEL", 1, "s1")
+        fh = io.BytesIO()
+        table.dump(fh)
+        with self.assertRaises(ValueError):
+            pysvtools.models.EventTable.load(io.BytesIO(fh.getvalue()[:-4]))
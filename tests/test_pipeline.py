@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+import collections
+import os
+import shutil
+import tempfile
+
+import unittest2
+
+from pysvtools.merge import ReportExport, ReportWriter, startPipelinedMerge, startStreamingMerge
+from pysvtools.metrics import Metrics
+from pysvtools.models import Event
+
+HEADER = u"""##fileformat=VCFv4.1
+##source=delly
+##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of structural variant">
+##INFO=<ID=END,Number=1,Type=Integer,Description="End position of the variant">
+##INFO=<ID=CHR2,Number=1,Type=String,Description="Chromosome for END coordinate">
+##contig=<ID=chr1,length=1000000>
+##contig=<ID=chr2,length=1000000>
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tsample
+"""
+
+RECORDS = [
+    ("chr1", 1000, "SVTYPE=DEL;END=1500"),
+    ("chr1", 20000, "SVTYPE=DUP;END=21000"),
+    ("chr1", 30000, "SVTYPE=CTX;CHR2=chr2;END=5000"),
+    ("chr2", 5000, "SVTYPE=DEL;END=5600"),
+    ("chr2", 70000, "SVTYPE=INV;END=71000"),
+]
+
+
+class TestPipelinedMerge(unittest2.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def writeVCF(self, name, records):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as fh:
+            fh.write(HEADER)
+            for chrom, pos, info in records:
+                fh.write("{}\t{}\t.\tN\t<SV>\t.\tPASS\t{}\tGT:DP\t0/1:10\n".format(chrom, pos, info))
+        return path
+
+    def merge(self, startMerge, vcf_files, **kwargs):
+        paths = [os.path.join(self.directory, name) for name in ('merged.tsv', 'merged.bed', 'regions.bed',
+                                                                 'merged.vcf')]
+        startMerge(vcf_files, [], paths[0], 100, paths[1], regions_out=paths[2], vcf_output=paths[3], **kwargs)
+        reports = []
+        for path in paths:
+            with open(path) as fh:
+                reports.append([line for line in fh if not line.startswith('##fileDate')])
+        return reports
+
+    def test_equals_streaming_merge(self):
+        vcf_files = [self.writeVCF('s{}.vcf'.format(i), [(chrom, pos + i * 10, info) for chrom, pos, info in RECORDS])
+                     for i in range(3)]
+        # a sample without calls on chr1
+        vcf_files.append(self.writeVCF('s3.vcf', RECORDS[3:]))
+        expected = self.merge(startStreamingMerge, vcf_files)
+        self.assertEqual(len(expected[0]), 6)
+        for processes in (1, 2):
+            metrics = Metrics()
+            self.assertEqual(self.merge(startPipelinedMerge, vcf_files, processes=processes, queue_size=1,
+                                        metrics=metrics), expected)
+            self.assertEqual(metrics.counters['events_loaded'], 17)
+
+    def test_unsorted(self):
+        vcf_files = [self.writeVCF('s1.vcf', RECORDS), self.writeVCF('s2.vcf', RECORDS[3:] + RECORDS[:3])]
+        with self.assertRaises(ValueError):
+            self.merge(startPipelinedMerge, vcf_files)
+
+
+class TestReportWriter(unittest2.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.paths = [os.path.join(self.directory, name) for name in ('merged.tsv', 'merged.bed', 'merged.vcf',
+                                                                        'regions.bed')]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def cluster(self, pos):
+        items = collections.OrderedDict()
+        items['s1.vcf'] = Event("chr1", pos, "chr1", pos + 100, sv_type="DEL", dp=10)
+        items['s2.vcf'] = Event("chr1", pos + 10, "chr1", pos + 110, sv_type="DEL", dp=15)
+        return items
+
+    def test_write(self):
+        with ReportExport(['s1.vcf', 's2.vcf'], *self.paths) as export:
+            writer = ReportWriter(export, queue_size=1)
+            writer.start()
+            for pos in (1000, 2000, 3000):
+                writer.put([self.cluster(pos)])
+            writer.close()
+        self.assertEqual(export.n_clusters, 3)
+        with open(self.paths[0]) as fh:
+            self.assertEqual(len(fh.read().splitlines()), 4)
+
+    def test_error(self):
+        with ReportExport(['s1.vcf', 's2.vcf'], *self.paths) as export:
+            writer = ReportWriter(export)
+            writer.start()
+            writer.put([None])
+            with self.assertRaises(AttributeError):
+                writer.close()
+
+    def test_error_not_raised(self):
+        # while another error is raised
+        with ReportExport(['s1.vcf', 's2.vcf'], *self.paths) as export:
+            writer = ReportWriter(export)
+            writer.start()
+            writer.put([None])
+            writer.close(raiseError=False)
+        self.assertIsInstance(writer.error, AttributeError)
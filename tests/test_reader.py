@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+import io
+import os
+import shutil
+import tempfile
+
+import unittest2
+import vcf
+
+from pysvtools.filters import LoadFilter
+from pysvtools.reader import SVReader, MmapSVReader, parseAlt
+
+VCF_TEXT = u"""##fileformat=VCFv4.1
+##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of structural variant">
+##INFO=<ID=END,Number=1,Type=Integer,Description="End position of the variant">
+##INFO=<ID=SVLEN,Number=.,Type=Integer,Description="Difference in length between REF and ALT alleles">
+##INFO=<ID=CHR2,Number=1,Type=String,Description="Chromosome for END coordinate">
+##INFO=<ID=IMPRECISE,Number=0,Type=Flag,Description="Imprecise structural variation">
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Read depth">
+##contig=<ID=chr1,length=100000>
+##contig=<ID=chr2,length=100000>
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\ts1\ts2
+chr1\t1000\tdel1\tN\t<DEL>\t.\tPASS\tSVTYPE=DEL;END=1500;SVLEN=-500;IMPRECISE\tGT:DP\t0/1:12\t0/0:3
+chr1\t2000\t.\tN\t<DUP>\t.\tPASS\tSVTYPE=DUP;END=2600\tGT\t0/1\t0/1
+chr1\t3000\ttra1\tN\tN]chr2:5000]\t.\tPASS\tSVTYPE=BND;CHR2=chr2\tGT:DP\t0/1:.\t0/1:4
+"""
+
+# a record with an empty ALT, which only PyVCF parses, before the other records
+FALLBACK_TEXT = VCF_TEXT.replace(u"chr1\t2000", u"chr1\t1500\tempty1\tN\t\t.\tPASS\tSVTYPE=DEL;END=1600\tGT\t0/1\t0/1\n"
+                                                u"chr1\t2000")
+
+
+class TestReader(unittest2.TestCase):
+    def test_parsealt(self):
+        self.assertEqual(str(parseAlt("<DEL>")), "<DEL>")
+        self.assertEqual(str(parseAlt("N]chr2:5000]")), "N]chr2:5000]")
+        self.assertEqual(str(parseAlt("[chr2:5000[N")), "[chr2:5000[N")
+        self.assertIsNone(parseAlt("."))
+
+    def test_records_equal_pyvcf(self):
+        native = list(SVReader(io.StringIO(VCF_TEXT)))
+        pyvcf = list(vcf.Reader(io.StringIO(VCF_TEXT)))
+        self.assertEqual(len(native), len(pyvcf))
+        for a, b in zip(native, pyvcf):
+            self.assertEqual((a.CHROM, a.POS, a.ID), (b.CHROM, b.POS, b.ID))
+            self.assertEqual([str(alt) for alt in a.ALT], [str(alt) for alt in b.ALT])
+            self.assertEqual(a.FILTER, b.FILTER)
+            self.assertEqual(a.is_sv, b.is_sv)
+            for key in ('SVTYPE', 'END', 'SVLEN', 'CHR2'):
+                self.assertEqual(a.INFO.get(key), b.INFO.get(key))
+            self.assertEqual(getattr(a.samples[0].data, 'DP', None), getattr(b.samples[0].data, 'DP', None))
+
+    def test_header(self):
+        reader = SVReader(io.StringIO(VCF_TEXT))
+        self.assertEqual(reader.samples, ["s1", "s2"])
+        self.assertEqual(list(reader.contigs.keys()), ["chr1", "chr2"])
+
+    def test_prefilter(self):
+        reader = SVReader(io.StringIO(VCF_TEXT), prefilter=LoadFilter(svtypes=['DEL', 'INV']))
+        self.assertEqual([record.ID for record in reader], ["del1"])
+        self.assertEqual(reader.prefiltered, 2)
+
+    def test_pyvcf_fallback(self):
+        # the records after the one parsed by PyVCF are read as well
+        self.assertEqual([record.ID for record in SVReader(io.StringIO(FALLBACK_TEXT))],
+                         ["del1", "empty1", None, "tra1"])
+
+
+class TestMmapReader(unittest2.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def writeVCF(self, text):
+        path = os.path.join(self.directory, 'calls.vcf')
+        with io.open(path, 'w', newline='') as fh:
+            fh.write(text)
+        return path
+
+    def assertSameRecords(self, records, expected):
+        self.assertEqual(len(records), len(expected))
+        for a, b in zip(records, expected):
+            self.assertEqual((a.CHROM, a.POS, a.ID), (b.CHROM, b.POS, b.ID))
+            self.assertEqual([str(alt) for alt in a.ALT], [str(alt) for alt in b.ALT])
+            self.assertEqual(a.FILTER, b.FILTER)
+            self.assertEqual(a.INFO, b.INFO)
+            self.assertEqual([getattr(s.data, 'DP', None) for s in a.samples],
+                             [getattr(s.data, 'DP', None) for s in b.samples])
+
+    def test_records_equal_native(self):
+        reader = MmapSVReader(self.writeVCF(VCF_TEXT))
+        self.assertEqual(reader.samples, ["s1", "s2"])
+        self.assertSameRecords(list(reader), list(SVReader(io.StringIO(VCF_TEXT))))
+
+    def test_crlf_and_no_trailing_newline(self):
+        text = VCF_TEXT.rstrip('\n').replace('\n', '\r\n')
+        self.assertSameRecords(list(MmapSVReader(self.writeVCF(text))), list(SVReader(io.StringIO(VCF_TEXT))))
+
+    def test_sites_only(self):
+        lines = [line.split('\t')[:8] for line in VCF_TEXT.splitlines()]
+        text = u''.join(u'\t'.join(fields) + u'\n' for fields in lines)
+        records = list(MmapSVReader(self.writeVCF(text)))
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0].INFO, {'SVTYPE': 'DEL', 'END': 1500, 'SVLEN': [-500]})
+        self.assertEqual(records[0].samples, [])
+
+    def test_header_only(self):
+        reader = MmapSVReader(self.writeVCF(VCF_TEXT.split('chr1\t1000')[0]))
+        self.assertEqual(list(reader), [])
+        self.assertEqual(reader.samples, ["s1", "s2"])
+
+    def test_prefilter(self):
+        reader = MmapSVReader(self.writeVCF(VCF_TEXT), prefilter=LoadFilter(svtypes=['DUP']))
+        self.assertEqual([record.ID for record in reader], [None])
+        self.assertEqual(reader.prefiltered, 2)
+
+    def test_pyvcf_fallback(self):
+        self.assertEqual([record.ID for record in MmapSVReader(self.writeVCF(FALLBACK_TEXT))],
+                         ["del1", "empty1", None, "tra1"])
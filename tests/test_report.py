@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+import collections
+import os
+import shutil
+import tempfile
+
+import unittest2
+
+from pysvtools.merge import ReportExport
+from pysvtools.metrics import Metrics
+from pysvtools.models import Event
+
+
+class TestReportExport(unittest2.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.paths = [os.path.join(self.directory, name) for name in ('merged.tsv', 'merged.bed', 'merged.vcf',
+                                                                        'regions.bed')]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def readLines(self, path):
+        with open(path) as fh:
+            return fh.read().splitlines()
+
+    def cluster(self, pos, dp=10):
+        items = collections.OrderedDict()
+        items['s1.vcf'] = Event("chr1", pos, "chr1", pos + 100, sv_type="DEL", dp=dp)
+        items['s2.vcf'] = Event("chr1", pos + 10, "chr1", pos + 110, sv_type="DEL", dp=dp + 5)
+        return items
+
+    def test_write_chromosome(self):
+        metrics = Metrics()
+        with ReportExport(['s1.vcf', 's2.vcf', 's3.vcf'], *self.paths, metrics=metrics) as export:
+            hits = collections.OrderedDict([('b', self.cluster(5000)), ('a', self.cluster(1000))])
+            export.writeChromosome('chr1chr1', hits)
+        self.assertEqual(export.n_clusters, 2)
+        self.assertIn('write', metrics.phases)
+
+        tsv, bed, vcf, regions = [self.readLines(path) for path in self.paths]
+        self.assertEqual(tsv[0].split('\t')[:8], ['ChrA', 'ChrApos', 'ChrB', 'ChrBpos', 'SVTYPE', 'DP', 'Size', 's1'])
+        # ordered by position, the event with the highest DP is reported
+        self.assertEqual(tsv[1].split('\t')[:7], ['chr1', '1010', 'chr1', '1110', 'DEL', '15', '100'])
+        self.assertEqual(tsv[1].split('\t')[7:], ['chr1:1000-1100', '100', 'chr1:1010-1110', '100', '', ''])
+        self.assertEqual(len(tsv), 3)
+        self.assertEqual(len(bed), 2)
+        self.assertEqual(len([line for line in vcf if not line.startswith('#')]), 2)
+        self.assertEqual(regions, ["chr1\t1000\t1100\tindel", "chr1\t1010\t1110\tindel",
+                                   "chr1\t5000\t5100\tindel", "chr1\t5010\t5110\tindel"])
+
+    def test_batches(self):
+        export = ReportExport(['s1.vcf', 's2.vcf'], *self.paths, batch_lines=2)
+        export.writeCluster(self.cluster(1000))
+        # the header and the cluster fill a batch
+        self.assertEqual(export.tsv_lines, [])
+        export.writeCluster(self.cluster(2000))
+        self.assertEqual(len(export.tsv_lines), 1)
+        export.close()
+        self.assertEqual(len(self.readLines(self.paths[0])), 3)
+        self.assertEqual(len(self.readLines(self.paths[3])), 4)
+
+    def test_close_twice(self):
+        export = ReportExport(['s1.vcf', 's2.vcf'], *self.paths)
+        export.close()
+        export.close()
+        self.assertEqual(len(self.readLines(self.paths[0])), 1)
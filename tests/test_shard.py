@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+import array
+import os
+import shutil
+import tempfile
+
+import unittest2
+
+from pysvtools.merge import startMerge
+from pysvtools.models import EventTable
+from pysvtools.shard import Shard, chunkRows, gatherShards, mergeShard, scatterShards
+
+VCF_HEADER = u"""##fileformat=VCFv4.1
+##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of structural variant">
+##INFO=<ID=END,Number=1,Type=Integer,Description="End position of the variant">
+##INFO=<ID=CHR2,Number=1,Type=String,Description="Chromosome for END coordinate">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tsample
+"""
+
+
+class TestChunks(unittest2.TestCase):
+    def test_cut_at_gaps(self):
+        centerpoints = array.array('l', [0, 50, 100, 1000, 1050, 3000, 3100])
+        chunks = chunkRows(centerpoints, 100, 500)
+        self.assertEqual(chunks, [(0, 3, 0, 3), (3, 5, 3, 5), (5, 7, 5, 7)])
+
+    def test_gap_after_chunk_size(self):
+        centerpoints = array.array('l', [0, 400, 480, 560, 2000])
+        # the chunk is extended up to the gap after 560
+        self.assertEqual(chunkRows(centerpoints, 100, 450), [(0, 4, 0, 4), (4, 5, 4, 5)])
+
+    def test_overlap_without_gap(self):
+        centerpoints = array.array('l', range(0, 1000, 50))
+        chunks = chunkRows(centerpoints, 100, 200)
+        # the cores cover all rows once
+        self.assertEqual([(core_start, core_end) for start, end, core_start, core_end in chunks],
+                         [(0, 4), (4, 8), (8, 12), (12, 20)])
+        # and the events within the flanking of the cut are added on both sides
+        self.assertEqual(chunks[1][:2], (2, 10))
+
+    def test_empty(self):
+        self.assertEqual(chunkRows(array.array('l'), 100, 200), [])
+
+
+class TestShard(unittest2.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, '000000.shard')
+        self.table = EventTable()
+        self.table.append("chr1", 1000, "chr1", 1100, "DEL", 1, "s1")
+        self.table.append("chr1", 1020, "chr1", 1100, "DEL", 1, "s2")
+        self.table.append("chr1", 5000, "chr1", 5100, "DEL", 1, "s2")
+        self.info = {'chromosomes': [['chr1', 'chr1']], 'ends': [3], 'chunk': 0, 'core': [0, 1],
+                     'samples': ['s1', 's2'], 'flanking': 100, 'sizeFlanking': None,
+                     'breakends': False}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_take(self):
+        table = self.table.take([2, 0])
+        self.assertEqual(list(table.posA), [5000, 1000])
+        self.assertEqual(table.samples, ['s1', 's2'])
+        self.assertEqual(table.event(0).chrApos, 5000)
+
+    def test_dump_load(self):
+        Shard(self.table, self.info).dump(self.path)
+        self.assertEqual(Shard.loadInfo(self.path), (self.info, False))
+        shard = Shard.load(self.path)
+        self.assertIsNone(shard.labels)
+        self.assertEqual(list(shard.table.posA), [1000, 1020, 5000])
+
+        Shard(self.table, self.info, array.array('l', [0, 0, 1])).dump(self.path)
+        shard = Shard.load(self.path)
+        self.assertEqual(list(shard.labels), [0, 0, 1])
+        self.assertEqual(shard.core, (0, 1))
+
+    def test_load_other_file(self):
+        with open(self.path, 'wb') as fh:
+            fh.write(b'##fileformat=VCFv4.1\n')
+        with self.assertRaises(ValueError):
+            Shard.load(self.path)
+
+
+class TestScatter(unittest2.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_memory_budget(self):
+        vcf_files = []
+        for i in range(3):
+            path = os.path.join(self.directory, 's{}.vcf'.format(i))
+            with open(path, 'w') as fh:
+                fh.write(VCF_HEADER)
+                for chrom, pos, info in (("chr1", 1000, "SVTYPE=DEL;END=1500"),
+                                         ("chr1", 3000, "SVTYPE=CTX;CHR2=chr2;END=5000"),
+                                         ("chr2", 5000, "SVTYPE=DEL;END=5600")):
+                    fh.write("{}\t{}\t.\tN\t<SV>\t.\tPASS\t{}\tGT:DP\t0/1:{}\n".format(chrom, pos + i * 10, info, i))
+            vcf_files.append(path)
+
+        shards = []
+        # every file spilled, and all events in memory
+        for max_memory in (0, 1024 * 1024):
+            paths = scatterShards(vcf_files, [], os.path.join(self.directory, str(max_memory)), 100,
+                                  max_memory=max_memory, spill_dir=self.directory)
+            shards.append([Shard.load(path) for path in paths])
+        self.assertEqual([shard.info['chromosomes'] for shard in shards[0]],
+                         [[['chr1', 'chr1']], [['chr1', 'chr2']], [['chr2', 'chr2']]])
+        for spilled, shard in zip(*shards):
+            self.assertEqual(spilled.info, shard.info)
+            for name, typecode in EventTable.COLUMNS:
+                self.assertEqual(getattr(spilled.table, name), getattr(shard.table, name))
+        # the spill directory is removed
+        self.assertEqual(sorted(os.listdir(self.directory)), ['0', '1048576', 's0.vcf', 's1.vcf', 's2.vcf'])
+
+    def test_packed_translocations(self):
+        contigs = ['chr{}'.format(n) for n in range(1, 7)]
+        vcf_files = []
+        for i in range(3):
+            path = os.path.join(self.directory, 's{}.vcf'.format(i))
+            with open(path, 'w') as fh:
+                fh.write(VCF_HEADER)
+                for a, chrA in enumerate(contigs):
+                    fh.write("{}\t{}\t.\tN\t<SV>\t.\tPASS\tSVTYPE=DEL;END={}\tGT:DP\t0/1:{}\n".format(
+                        chrA, 1000 + i * 10, 1500 + i * 10, i))
+                    for chrB in contigs[a + 1:]:
+                        fh.write("{}\t{}\t.\tN\t<SV>\t.\tPASS\tSVTYPE=CTX;CHR2={};END=5000\tGT:DP\t0/1:{}\n".format(
+                            chrA, 3000 + i * 10, chrB, i))
+            vcf_files.append(path)
+
+        shard_dir = os.path.join(self.directory, 'shards')
+        paths = scatterShards(vcf_files, [], shard_dir, 100)
+        shards = [Shard.loadInfo(path)[0] for path in paths]
+        # the 15 pairs of contigs are packed between the 6 chromosomes within a contig
+        self.assertEqual(len(shards), 11)
+        self.assertEqual(shards[1]['chromosomes'], [['chr1', 'chr2'], ['chr1', 'chr3'], ['chr1', 'chr4'],
+                                                    ['chr1', 'chr5'], ['chr1', 'chr6']])
+        self.assertEqual(shards[1]['ends'], [3, 6, 9, 12, 15])
+        for path in paths:
+            mergeShard(path, path + '.merged')
+
+        reports = []
+        for name, merge in (('gather', lambda out: gatherShards([path + '.merged' for path in paths], *out)),
+                            ('merge', lambda out: startMerge(vcf_files, [], out[0], 100, out[1],
+                                                             vcf_output=out[2], regions_out=out[3]))):
+            out = [os.path.join(self.directory, '{}.{}'.format(name, ext))
+                   for ext in ('tsv', 'bed', 'vcf', 'regions.bed')]
+            merge(out)
+            reports.append([])
+            for path in out:
+                with open(path) as fh:
+                    reports[-1].append([line for line in fh if not line.startswith('##fileDate')])
+        self.assertEqual(len(reports[0][0]), 22)
+        self.assertEqual(reports[0], reports[1])
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+import argparse
+import os
+import shutil
+import tempfile
+
+import unittest2
+
+from pysvtools.merge import imapBounded, startMerge
+from pysvtools.models import EventTable
+from pysvtools.spill import EventSpill, addMemoryArguments
+
+VCF_HEADER = u"""##fileformat=VCFv4.1
+##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of structural variant">
+##INFO=<ID=END,Number=1,Type=Integer,Description="End position of the variant">
+##INFO=<ID=CHR2,Number=1,Type=String,Description="Chromosome for END coordinate">
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tsample
+"""
+
+
+class TestEventSpill(unittest2.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_table_nbytes_clear(self):
+        table = EventTable()
+        table.append("chr1", 1000, "chr1", 1100, "DEL", 1, "s1")
+        self.assertEqual(table.nbytes, sum(getattr(table, name).itemsize for name, typecode in table.COLUMNS))
+        table.clear()
+        self.assertEqual((len(table), table.nbytes, table.samples), (0, 0, []))
+
+    def test_runs_merge_in_table_order(self):
+        full = EventTable()
+        with EventSpill(0, self.directory) as spill:
+            table = EventTable()
+            for sample, positions in (("s1", [5000, 1000]), ("s2", [3000, 1000]), ("s3", [1000])):
+                for pos in positions:
+                    table.append("chr1", pos, "chr1", pos + 100, "DEL", 1, sample)
+                    full.append("chr1", pos, "chr1", pos + 100, "DEL", 1, sample)
+                table.append("chr1", 2000, "chr2", 2000, "TRA", 1, sample)
+                full.append("chr1", 2000, "chr2", 2000, "TRA", 1, sample)
+                self.assertTrue(spill.full(table))
+                spill.spill(table)
+                self.assertEqual(len(table), 0)
+            self.assertEqual((spill.n_runs, spill.n_events), (3, 8))
+            self.assertEqual(spill.chromosomes(), [('chr1', 'chr1'), ('chr1', 'chr2')])
+            # both contigs are complete after the last chromosome with events on these
+            self.assertEqual(list(spill.completedContigs().keys()), [('chr1', 'chr2')])
+            self.assertEqual(sorted(spill.completedContigs()[('chr1', 'chr2')]), ['chr1', 'chr2'])
+
+            loaded = spill.load(('chr1', 'chr1'))
+            rows = full.partitions()[('chr1', 'chr1')]
+            # ordered by centerpoint the rows are those of the table that was never spilled
+            self.assertEqual([(loaded.samples[loaded.sample[k]], loaded.posA[k])
+                              for k in loaded.partitions()[('chr1', 'chr1')]],
+                             [(full.samples[full.sample[k]], full.posA[k]) for k in rows])
+            self.assertEqual(len(spill.load(('chr1', 'chr2'))), 3)
+            directory = spill.directory
+        self.assertFalse(os.path.exists(directory))
+
+    def test_merge_with_memory_budget(self):
+        vcf_files = []
+        for i in range(3):
+            path = os.path.join(self.directory, 's{}.vcf'.format(i))
+            with open(path, 'w') as fh:
+                fh.write(VCF_HEADER)
+                for chrom, pos, info in (("chr2", 5000, "SVTYPE=DEL;END=5600"), ("chr1", 1000, "SVTYPE=DEL;END=1500"),
+                                         ("chr1", 3000, "SVTYPE=CTX;CHR2=chr2;END=5000")):
+                    fh.write("{}\t{}\t.\tN\t<SV>\t.\tPASS\t{}\tGT:DP\t0/1:{}\n".format(chrom, pos + i * 10, info, i))
+            vcf_files.append(path)
+
+        reports = []
+        # the spilled chromosomes are clustered in one worker pool with processes
+        for max_memory, processes in ((None, 1), (0, 1), (0, 2)):
+            paths = [os.path.join(self.directory, '{}.{}.{}'.format(name, max_memory, processes)) for name in
+                     ('merged.tsv', 'merged.bed', 'regions.bed', 'merged.vcf')]
+            startMerge(vcf_files, [], paths[0], 100, paths[1], regions_out=paths[2], vcf_output=paths[3],
+                       processes=processes, max_memory=max_memory, spill_dir=self.directory)
+            reports.append([])
+            for path in paths:
+                with open(path) as fh:
+                    reports[-1].append([line for line in fh if not line.startswith('##fileDate')])
+        self.assertEqual(len(reports[0][0]), 4)
+        self.assertEqual(reports[0], reports[1])
+        self.assertEqual(reports[0], reports[2])
+        # the spill directory is removed
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name.startswith('pysvtools-spill')]), 0)
+
+
+    def test_arguments(self):
+        # the merge has no budget by default, the scatter of a sharded merge spills each file
+        for default in (None, 0):
+            parser = argparse.ArgumentParser()
+            addMemoryArguments(parser, default)
+            self.assertEqual(parser.parse_args([]).max_memory, default)
+            args = parser.parse_args(['--max_memory', '64', '--spill_dir', self.directory])
+            self.assertEqual((args.max_memory, args.spill_dir), (64, self.directory))
+
+class _Result(object):
+    def __init__(self, pool, value):
+        self.pool = pool
+        self.value = value
+
+    def get(self):
+        self.pool.pending -= 1
+        return self.value
+
+
+class _Pool(object):
+    """
+        Synchronous stand-in of a `multiprocessing.Pool`, keeping the largest number of pending results
+    """
+
+    def __init__(self):
+        self.pending = 0
+        self.max_pending = 0
+
+    def apply_async(self, func, args):
+        self.pending += 1
+        self.max_pending = max(self.max_pending, self.pending)
+        return _Result(self, func(*args))
+
+
+class TestImapBounded(unittest2.TestCase):
+    def test_bounded(self):
+        pool = _Pool()
+        self.assertEqual(list(imapBounded(pool, lambda x: x * 2, range(10), 3)), [x * 2 for x in range(10)])
+        self.assertEqual(pool.max_pending, 3)
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+import array
+import os
+import shutil
+import tempfile
+
+import unittest2
+
+from pysvtools.models import EventTable
+from pysvtools.state import MergeState
+
+
+class TestState(unittest2.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'merge.state')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_dump_load(self):
+        table = EventTable()
+        table.append("chr1", 1000, "chr1", 1100, "DEL", 1, "s1")
+        table.append("chr1", 1020, "chr1", 1100, "DEL", 1, "s2")
+        state = MergeState(table, array.array('l', [0, 0]), {'flanking': 100}, 1)
+        state.dump(self.path)
+
+        loaded = MergeState.load(self.path)
+        self.assertEqual(loaded.samples, ["s1", "s2"])
+        self.assertEqual(list(loaded.labels), [0, 0])
+        self.assertEqual(loaded.settings, {'flanking': 100})
+        self.assertEqual(loaded.next_label, 1)
+
+    def test_labels_length(self):
+        table = EventTable()
+        table.append("chr1", 1000, "chr1", 1100, "DEL", 1, "s1")
+        with self.assertRaises(ValueError):
+            MergeState(table, array.array('l'), {}, 0)
+
+    def test_load_other_file(self):
+        with open(self.path, 'wb') as fh:
+            fh.write(b'##fileformat=VCFv4.1\n')
+        with self.assertRaises(ValueError):
+            MergeState.load(self.path)
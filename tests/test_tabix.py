@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+import gzip
+import os
+import shutil
+import tempfile
+
+import unittest2
+
+from pysvtools.bgzf import BgzfReader, BgzfWriter, openText, EOF_BLOCK
+from pysvtools.tabix import parseRegion, mergeRegions, recordSpan, iterIndexedRegions, iterFilteredRegions, \
+    openRegions, reg2bin, reg2bins, SortedIndexedWriter, MAX_POSITION
+
+DATA = os.path.join(os.path.dirname(__file__), 'data')
+PLAIN_VCF = os.path.join(DATA, 'calls.vcf')
+BGZF_VCF = os.path.join(DATA, 'calls.vcf.gz')
+
+
+def recordIds(lines):
+    return [line.split('\t')[2] for line in lines if not line.startswith('#')]
+
+
+class TestTabix(unittest2.TestCase):
+    def test_parseregion(self):
+        self.assertEqual(parseRegion("chr1:1,001-2000"), ("chr1", 1000, 2000))
+        self.assertEqual(parseRegion("chr1:1001"), ("chr1", 1000, MAX_POSITION))
+        self.assertEqual(parseRegion("chr1"), ("chr1", 0, MAX_POSITION))
+        with self.assertRaises(ValueError):
+            parseRegion("chr1:2000-1000")
+
+    def test_mergeregions(self):
+        merged = mergeRegions([("chr2", 10, 20), ("chr1", 50, 60), ("chr1", 0, 10), ("chr1", 5, 20)])
+        self.assertEqual(list(merged.items()), [("chr2", [(10, 20)]), ("chr1", [(0, 20), (50, 60)])])
+
+    def test_recordspan(self):
+        self.assertEqual(recordSpan("chr1\t1000\tdel1\tN\t<DEL>\t.\tPASS\tSVTYPE=DEL;END=1500\n"),
+                         ("chr1", 999, 1500))
+        self.assertEqual(recordSpan("chr1\t1000\tdel1\tNA\t<DEL>\t.\tPASS\tSVTYPE=DEL;SVEND=1500\n"),
+                         ("chr1", 999, 1001))
+
+    def test_bgzfreader_lines(self):
+        with BgzfReader(BGZF_VCF) as reader:
+            lines = []
+            line = reader.readline()
+            while line:
+                lines.append(line.decode('utf-8'))
+                line = reader.readline()
+        with open(PLAIN_VCF) as fh:
+            self.assertEqual(lines, fh.readlines())
+
+    def test_bgzfreader_seek(self):
+        with BgzfReader(BGZF_VCF) as reader:
+            reader.readline()
+            offset = reader.tell()
+            line = reader.readline()
+            reader.seek(offset)
+            self.assertEqual(reader.readline(), line)
+
+    def test_opentext_gzip(self):
+        with openText(BGZF_VCF) as fh:
+            self.assertEqual(recordIds(fh), ["del1", "del2", "dup1", "inv1", "del3", "tra1"])
+
+    def test_indexed_regions(self):
+        regions = [parseRegion("chr1:40000-60000"), parseRegion("chr2")]
+        lines = list(iterIndexedRegions(BGZF_VCF, regions))
+        self.assertTrue(lines[0].startswith("##fileformat"))
+        self.assertEqual(recordIds(lines), ["del2", "dup1", "del3", "tra1"])
+
+    def test_indexed_regions_no_duplicates(self):
+        regions = [parseRegion("chr1:30000-31000"), parseRegion("chr1:80000-85000")]
+        self.assertEqual(recordIds(iterIndexedRegions(BGZF_VCF, regions)), ["del2"])
+
+    def test_filtered_equals_indexed(self):
+        for region in ["chr1", "chr1:1-1000", "chr1:1501-19999", "chr1:89000-500000", "chr2:5601-700000", "chr3"]:
+            regions = [parseRegion(region)]
+            with open(PLAIN_VCF) as fh:
+                self.assertEqual(recordIds(iterFilteredRegions(fh, regions)),
+                                 recordIds(iterIndexedRegions(BGZF_VCF, regions)))
+
+    def test_openregions_whole_file(self):
+        with open(PLAIN_VCF) as fh:
+            self.assertEqual(list(openRegions(BGZF_VCF, None)), fh.readlines())
+
+
+class TestBgzfWriter(unittest2.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'out.vcf.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_gzip_readable(self):
+        data = "".join("line {}\n".format(i) for i in range(20000))
+        for threads in (1, 3):
+            with BgzfWriter(self.path, threads) as fh:
+                fh.write(data)
+            with gzip.open(self.path, 'rb') as fh:
+                self.assertEqual(fh.read().decode('utf-8'), data)
+            with open(self.path, 'rb') as fh:
+                self.assertTrue(fh.read().endswith(EOF_BLOCK))
+
+    def test_virtual_offsets(self):
+        writer = BgzfWriter(self.path, threads=2)
+        offsets = []
+        for i in range(20000):
+            offsets.append(writer.tell())
+            writer.write("line {}\n".format(i))
+        writer.close()
+        with BgzfReader(self.path) as reader:
+            for i in (0, 1, 7000, 19999):
+                reader.seek(writer.virtualOffset(offsets[i]))
+                self.assertEqual(reader.readline(), "line {}\n".format(i).encode('utf-8'))
+
+    def test_reg2bin(self):
+        self.assertEqual(reg2bin(0, 1), 4681)
+        self.assertEqual(reg2bin(0, 1 << 14), 4681)
+        self.assertEqual(reg2bin(0, (1 << 14) + 1), 585)
+        for start, end in [(0, 100), (16000, 17000), (1 << 20, 3 << 20)]:
+            self.assertIn(reg2bin(start, end), reg2bins(start, end))
+
+    def test_sorted_indexed_writer(self):
+        with open(PLAIN_VCF) as fh:
+            lines = fh.readlines()
+        header = [line for line in lines if line.startswith('#')]
+        records = [line for line in lines if not line.startswith('#')]
+        with SortedIndexedWriter(self.path, 'vcf') as writer:
+            writer.writelines(header)
+            writer.writelines(reversed(records))
+            writer.finishContigs(["chr1"])
+            with self.assertRaises(ValueError):
+                writer.write(records[0])
+
+        with openText(self.path) as fh:
+            self.assertEqual(fh.readlines(), lines)
+        for region in ["chr1", "chr1:40000-60000", "chr2:5601-700000", "chr3"]:
+            regions = [parseRegion(region)]
+            self.assertEqual(recordIds(iterIndexedRegions(self.path, regions)),
+                             recordIds(iterIndexedRegions(BGZF_VCF, regions)))